@@ -0,0 +1,380 @@
+"""
+This module benchmarks the phases of a playlist run on synthetic libraries (see make_library.py) of increasing size.
+Each phase is timed, then run again under tracemalloc to measure its peak memory, so the timings do not include the
+tracing overhead. The DB phases need a PostgreSQL database given with --dsn; with --load_db, its album and song tables
+are replaced by a fixture describing the synthetic library, so only use a scratch database.
+
+Usage: python benchmarks/bench.py [--sizes 1000 10000 100000] [--dsn "dbname=bench ..." --load_db] [--json out.json]
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from make_library import DEFAULT_LIST_CFG, make_library, write_list_cfg
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'xspf'))
+
+import handler  # noqa: E402  # pylint: disable=wrong-import-position
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+FIXTURE_BATCH_SIZE = 5000
+
+
+class QuietNotifier:  # pylint: disable=too-few-public-methods
+    """
+    This class replaces the desktop notifier, so the benchmarks do not post notifications
+    """
+
+    def notify(self, **kwargs):  # pylint: disable=missing-function-docstring
+        _ = kwargs
+
+
+def load_fixture_db(conn, albums):
+    """
+    Replace the album and song tables with rows describing a synthetic library, the way the library indexer would
+    fill them: one album row per folder with media files, its path relative to the library root, and one song row per
+    track.
+    :param conn: A psycopg2 connection to a scratch database
+    :param albums: The list returned by make_library()
+    :return: The number of song rows
+    """
+    from psycopg2.extras import execute_values  # pylint: disable=import-outside-toplevel
+
+    song_count = 0
+
+    with conn.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS public.song")
+        cursor.execute("DROP TABLE IF EXISTS public.album")
+        cursor.execute("CREATE TABLE public.album (id integer PRIMARY KEY, title text, artist text, date timestamp, "
+                       "comment text, label text, path text)")
+        cursor.execute("CREATE TABLE public.song (id serial PRIMARY KEY, title text, track_id integer, genre text, "
+                       "artist text, composer text, performer text, date timestamp, file text, comment text, "
+                       "album_id integer REFERENCES public.album (id))")
+
+        album_rows = [
+            (album_id, folder, folder.split(' - ')[0], datetime(2000, 1, 1), '', '', os.path.dirname(tracks[0]))
+            for album_id, (folder, _, tracks) in enumerate(albums) if tracks
+        ]
+        song_rows = [
+            (os.path.basename(track), track_no, ', '.join(genres), folder, os.path.basename(track), album_id)
+            for album_id, (folder, genres, tracks) in enumerate(albums)
+            for track_no, track in enumerate(tracks, start=1)
+        ]
+        execute_values(cursor, "INSERT INTO public.album (id, title, artist, date, comment, label, path) VALUES %s",
+                       album_rows, page_size=FIXTURE_BATCH_SIZE)
+        execute_values(cursor, "INSERT INTO public.song (title, track_id, genre, artist, file, album_id) VALUES %s",
+                       song_rows, page_size=FIXTURE_BATCH_SIZE)
+        cursor.execute("CREATE INDEX ON public.song (album_id)")
+        cursor.execute("ANALYZE public.album")
+        cursor.execute("ANALYZE public.song")
+        song_count = len(song_rows)
+
+    conn.commit()
+
+    return song_count
+
+
+def measure(run, setup=None, memory=True):
+    """
+    Time a phase, then run it again under tracemalloc to find its peak memory
+    :param run: The phase, a callable taking the value returned by setup
+    :param setup: A callable preparing a fresh state for each run of the phase (not measured), None for no set up
+    :param memory: False to skip the memory measurement
+    :return: A tuple (seconds, peak bytes), the peak is None if memory is False
+    """
+    setup = setup if setup else (lambda: None)
+
+    state = setup()
+    gc.collect()
+    start = time.perf_counter()
+    run(state)
+    seconds = time.perf_counter() - start
+
+    if not memory:
+        return seconds, None
+
+    state = setup()
+    gc.collect()
+    tracemalloc.start()
+    run(state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return seconds, peak
+
+
+class LibraryBench:
+    """
+    This class runs the phases of a playlist run on one synthetic library.
+    """
+
+    def __init__(self, work_dir, album_count, tracks=3, depth=1, jobs=1, dsn=None, load_db=False, soup=False,
+                 render_jobs=1):
+        lib_name = f"lib-{album_count}-t{tracks}-d{depth}"
+        self._lib_dir = os.path.join(work_dir, lib_name)
+        self._manifest = os.path.join(work_dir, f"{lib_name}.json")
+        self._out_dir = os.path.join(work_dir, f"out-{lib_name}")
+        self._cache_path = os.path.join(work_dir, f"scan-{lib_name}.db")
+        self._snapshot_path = os.path.join(work_dir, f"db-snapshot-{lib_name}")
+        self._list_cfg = os.path.join(work_dir, "xspf-gen.yml")
+        self._jobs = jobs
+        self._render_jobs = render_jobs
+        self._dsn = dsn
+        self._soup = soup
+
+        # A library generated by an earlier run in the same work directory is reused, it would be the same:
+        if os.path.isfile(self._manifest):
+            with open(self._manifest, 'r', encoding='UTF-8') as f_in:
+                albums = json.load(f_in)
+        else:
+            shutil.rmtree(self._lib_dir, ignore_errors=True)
+            start = time.perf_counter()
+            albums = make_library(self._lib_dir, album_count, tracks=tracks, depth=depth)
+            print(f"Generated {album_count} albums in {time.perf_counter() - start:.1f} s")
+
+            with open(self._manifest, 'w', encoding='UTF-8') as f_out:
+                json.dump(albums, f_out)
+
+        os.makedirs(self._out_dir, exist_ok=True)
+        write_list_cfg(self._list_cfg, DEFAULT_LIST_CFG)
+
+        if dsn and load_db:
+            conn = self.connect()
+
+            try:
+                print(f"Loaded {load_fixture_db(conn, albums)} songs into the DB fixture")
+            finally:
+                conn.close()
+
+    def connect(self):  # pylint: disable=missing-function-docstring
+        import psycopg2  # pylint: disable=import-outside-toplevel
+
+        return psycopg2.connect(self._dsn)
+
+    def make_handler(self, scan_cache='', streaming=True, genre_mode='first', render_jobs=1):
+        """
+        Create a handler for the library, with a quiet notifier
+        :param scan_cache: The path to the scan cache file, an empty string for no cache
+        :param streaming: False to build the playlists as soups
+        :param genre_mode: The genre mode of the handler
+        :param render_jobs: The number of processes rendering the genre playlists
+        :return: A PlaylistHandler instance
+        """
+        ph = handler.PlaylistHandler(source_dir=self._lib_dir, out_file=os.path.join(self._out_dir, 'all.xspf'),
+                                     multi=True, list_cfg=self._list_cfg, env_cfg=os.devnull,
+                                     scan_cache=scan_cache, jobs=self._jobs, streaming=streaming,
+                                     genre_mode=genre_mode, render_jobs=render_jobs)
+        ph.notifier = QuietNotifier()
+
+        return ph
+
+    def db_handler(self):
+        """
+        Create a handler connected to the --dsn database, the set up of the DB phases (the handler keeps the
+        connection open, as in watch mode; it is closed when the handler is discarded)
+        :return: A PlaylistHandler instance
+        """
+        ph = self.make_handler()
+        ph.conn = self.connect()
+
+        return ph
+
+    def snapshot_handler(self):
+        """
+        Create a handler connected to the --dsn database with an up-to-date DB snapshot, the set up of the phase
+        reading the folders from the snapshot
+        :return: A PlaylistHandler instance
+        """
+        ph = self.db_handler()
+        ph.db_snapshot = self._snapshot_path
+        ph.list_directories()
+
+        return ph
+
+    def scanned_handler(self, streaming=True, render_jobs=1):
+        """
+        Create a handler with the directories of the library listed, the set up of the phases that need them
+        :param streaming: False to build the playlists as soups
+        :param render_jobs: The number of processes rendering the genre playlists
+        :return: A PlaylistHandler instance
+        """
+        ph = self.make_handler(streaming=streaming, render_jobs=render_jobs)
+        ph.directories = ph.scan_directories(self._lib_dir)
+
+        return ph
+
+    def cold_cache_handler(self):  # pylint: disable=missing-function-docstring
+        if os.path.exists(self._cache_path):
+            os.unlink(self._cache_path)
+
+        return self.make_handler(scan_cache=self._cache_path)
+
+    def warm_cache_handler(self):  # pylint: disable=missing-function-docstring
+        ph = self.make_handler(scan_cache=self._cache_path)
+        ph.scan_directories(self._lib_dir)
+
+        return ph
+
+    def flat_soup_handler(self):
+        """
+        Create a handler holding the soup of a flat playlist of every folder, the set up of the save_playlist phase
+        :return: A tuple (PlaylistHandler instance, soup)
+        """
+        ph = self.scanned_handler(streaming=False)
+        soup = ph.get_soup('All')
+        tracklist = soup.find('trackList')
+        music_node = ph.get_vlc_node(soup)
+        last_id = -1
+
+        for folder in ph.directories.dirs:
+            new_track, last_id = ph.build_track(soup, os.path.join(self._lib_dir, folder.name), last_id)
+            tracklist.append(new_track)
+            music_node.append(soup.new_tag(name="vlc:item", tid=f"{last_id}"))
+
+        return ph, soup
+
+    def phases(self):
+        """
+        List the phases to measure
+        :return: A list of (phase name, run, setup) tuples
+        """
+        folder_names = sorted(entry.name for entry in os.scandir(self._lib_dir) if entry.is_dir())
+        phases = [
+            ("has_media", lambda ph: [ph.has_media(self._lib_dir, name) for name in folder_names], self.make_handler),
+            ("scan_directories (cold cache)", lambda ph: ph.scan_directories(self._lib_dir), self.cold_cache_handler),
+            ("scan_directories (warm cache)", lambda ph: ph.scan_directories(self._lib_dir), self.warm_cache_handler),
+            ("scan_directories (all genres)", lambda ph: ph.scan_directories(self._lib_dir),
+             lambda: self.make_handler(genre_mode='all')),
+        ]
+
+        if self._dsn:
+            phases += [
+                ("read_dir_genres_from_db", lambda ph: list(ph.read_dir_genres_from_db()), self.db_handler),
+                ("list_directories (DB)", lambda ph: ph.list_directories(), self.db_handler),
+                ("list_directories (DB snapshot)", lambda ph: ph.list_directories(), self.snapshot_handler),
+                ("build_track_playlists (DB)", lambda ph: ph.build_track_playlists(), self.db_handler),
+            ]
+
+        phases += [
+            ("route_folders", lambda ph: ph.route_folders(ph.directories.dirs), self.scanned_handler),
+            ("build_genre_playlists", lambda ph: ph.build_genre_playlists(), self.scanned_handler),
+            ("save_playlist (soup)", lambda state: state[0].save_playlist(state[1]), self.flat_soup_handler),
+        ]
+
+        if self._render_jobs > 1:
+            phases.append((f"build_genre_playlists ({self._render_jobs} processes)",
+                           lambda ph: ph.build_genre_playlists(),
+                           lambda: self.scanned_handler(render_jobs=self._render_jobs)))
+
+        if self._soup:
+            phases.append(("build_genre_playlists (soup)", lambda ph: ph.build_genre_playlists(),
+                           lambda: self.scanned_handler(streaming=False)))
+
+        if self._soup and self._render_jobs > 1:
+            phases.append((f"build_genre_playlists (soup, {self._render_jobs} processes)",
+                           lambda ph: ph.build_genre_playlists(),
+                           lambda: self.scanned_handler(streaming=False, render_jobs=self._render_jobs)))
+
+        return phases
+
+
+def main():  # pylint: disable=missing-function-docstring
+    parser = argparse.ArgumentParser(description="Benchmark the phases of xspf-gen on synthetic music libraries.")
+    parser.add_argument("--sizes", help="The numbers of albums of the libraries to benchmark.",
+                        type=int,
+                        nargs='+',
+                        dest='sizes',
+                        default=list(DEFAULT_SIZES),
+                        required=False)
+    parser.add_argument("-t", "--tracks", help="The number of tracks per album.",
+                        type=int,
+                        dest='tracks',
+                        default=3,
+                        required=False)
+    parser.add_argument("--depth", help="The directory level of the tracks below the album folder.",
+                        type=int,
+                        dest='depth',
+                        default=1,
+                        required=False)
+    parser.add_argument("-j", "--jobs", help="The number of directories to probe concurrently.",
+                        type=int,
+                        dest='jobs',
+                        default=1,
+                        required=False)
+    parser.add_argument("-w", "--work_dir", help="The directory holding the libraries and the output, reused by "
+                        "later runs (defaults to a temporary directory removed at the end).",
+                        type=str,
+                        dest='work_dir',
+                        default="",
+                        required=False)
+    parser.add_argument("--dsn", help="A libpq connection string of a PostgreSQL database for the DB phases.",
+                        type=str,
+                        dest='dsn',
+                        default="",
+                        required=False)
+    parser.add_argument("--load_db", help="Replace the album and song tables of the --dsn database with a fixture "
+                        "describing each library.",
+                        action='store_true',
+                        dest='load_db',
+                        required=False)
+    parser.add_argument("--render_jobs", help="Also benchmark rendering the genre playlists in this number of "
+                        "processes.",
+                        type=int,
+                        dest='render_jobs',
+                        default=1,
+                        required=False)
+    parser.add_argument("--soup", help="Also benchmark building the genre playlists as soups.",
+                        action='store_true',
+                        dest='soup',
+                        required=False)
+    parser.add_argument("--no_memory", help="Only measure the time of each phase.",
+                        action='store_false',
+                        dest='memory',
+                        required=False)
+    parser.add_argument("--json", help="The path of a JSON file to which to write the results.",
+                        type=str,
+                        dest='json_file',
+                        default="",
+                        required=False)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    work_dir = args.work_dir if args.work_dir else tempfile.mkdtemp(prefix="xspf-bench-")
+    os.makedirs(work_dir, exist_ok=True)
+    results = []
+
+    try:
+        for album_count in args.sizes:
+            print(f"\n{album_count} albums, {args.tracks} tracks per album")
+            bench = LibraryBench(work_dir, album_count, tracks=args.tracks, depth=args.depth, jobs=args.jobs,
+                                 dsn=args.dsn, load_db=args.load_db, soup=args.soup,
+                                 render_jobs=args.render_jobs)
+
+            for name, run, setup in bench.phases():
+                seconds, peak = measure(run, setup, memory=args.memory)
+                peak_str = f"{peak / 2 ** 20:10.1f} MiB" if peak is not None else ""
+                print(f"  {name:<42} {seconds:10.3f} s {peak_str}")
+                results.append({"albums": album_count, "phase": name, "seconds": seconds, "peak_bytes": peak})
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json_file:
+        with open(args.json_file, 'w', encoding='UTF-8') as f_out:
+            json.dump({"version": handler.__version__, "tracks": args.tracks, "depth": args.depth, "jobs": args.jobs,
+                       "render_jobs": args.render_jobs, "results": results}, f_out, indent=4)
+
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
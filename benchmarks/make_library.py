@@ -0,0 +1,315 @@
+"""
+This module generates synthetic music libraries for the benchmarks: album folders of tagged FLAC, MP3 and Ogg Vorbis
+stubs, with a configurable number of albums, nesting depth and mix of genres. The stubs hold valid tag structures
+(FLAC Vorbis comment, ID3v2.3 TCON, Ogg Vorbis comment header) and the minimum of audio structure mutagen needs to
+load them, optionally padded to a given size by a sparse section, so generating a large library costs little disk
+space. The same seed always generates the same library.
+"""
+import argparse
+import os
+import random
+import struct
+import sys
+
+# Genre mix as (genre, weight); an empty genre is an untagged album:
+DEFAULT_GENRE_MIX = (
+    ('Rock', 30), ('Pop', 25), ('Jazz', 12), ('Classical', 12), ('Folk', 6), ('Blues', 5), ('Soul', 4),
+    ('Electronic', 4), ('', 2),
+)
+
+# Genre playlists matching the default genre mix, in the !!set form read by PlaylistHandler.read_yaml:
+DEFAULT_LIST_CFG = """Classical: !!set
+  ? Classical
+Jazz: !!set
+  ? Jazz
+  ? Blues
+Pop_etc: !!set
+  ? Pop
+  ? Rock
+  ? Folk
+  ? Soul
+  ? Electronic
+"""
+
+MEDIA_TYPES = ('flac', 'mp3', 'ogg')
+
+
+def parse_genre_mix(mix_str):
+    """
+    Parse a genre mix given on the command line
+    :param mix_str: A string such as "Rock:3,Jazz:1,:1" (genre:weight pairs, an empty genre for untagged albums)
+    :return: A tuple of (genre, weight) tuples
+    """
+    mix = []
+
+    for item in mix_str.split(','):
+        genre, _, weight = item.rpartition(':')
+        mix.append((genre.strip(), float(weight)))
+
+    return tuple(mix)
+
+
+def vorbis_comments(genres):
+    """
+    Build a Vorbis comment structure
+    :param genres: A list of genres, each stored as a GENRE comment
+    :return: The structure as bytes
+    """
+    comments = [b'TITLE=Track'] + [f"GENRE={genre}".encode('UTF-8') for genre in genres]
+    vendor = b'xspf-gen benchmark'
+
+    return (struct.pack('<I', len(vendor)) + vendor + struct.pack('<I', len(comments)) +
+            b''.join(struct.pack('<I', len(comment)) + comment for comment in comments))
+
+
+def flac_stub(genres):
+    """
+    Build the metadata of a FLAC file: a STREAMINFO block and a VORBIS_COMMENT block, the audio frames are left out
+    :param genres: A list of genres
+    :return: A tuple (head, tail) of the bytes at the start and at the end of the file
+    """
+    comments = vorbis_comments(genres)
+    # Block sizes 4096, 44.1 kHz, 2 channels, 16 bits per sample:
+    stream_info = struct.pack('>HH', 4096, 4096) + bytes(6) + ((44100 << 44) | (1 << 41) | (15 << 36)).to_bytes(
+        8, 'big') + bytes(16)
+
+    return (b'fLaC' + struct.pack('>BBH', 0, 0, len(stream_info)) + stream_info +
+            struct.pack('>BBH', 0x84, len(comments) >> 16, len(comments) & 0xffff) + comments), b''
+
+
+def mp3_stub(genres):
+    """
+    Build the ID3v2.3 tag of an MP3 file, with a title, a genre (TCON) frame and padding, followed by two silent
+    MPEG-1 Layer III frames (128 kbit/s, 44.1 kHz)
+    :param genres: A list of genres
+    :return: A tuple (head, tail) of the bytes at the start and at the end of the file
+    """
+    frames = b''
+
+    for frame_id, text in ((b'TIT2', 'Track'), (b'TCON', '\x00'.join(genres))):
+        if not text:
+            continue
+
+        data = b'\x00' + text.encode('latin-1', errors='replace')
+        frames += frame_id + struct.pack('>I', len(data)) + b'\x00\x00' + data
+
+    body = frames + bytes(256)
+    size = len(body)
+    synchsafe = bytes((size >> shift) & 0x7f for shift in (21, 14, 7, 0))
+
+    mpeg_frame = b'\xff\xfb\x90\x00' + bytes(413)
+
+    return b'ID3\x03\x00\x00' + synchsafe + body + mpeg_frame * 2, b''
+
+
+def _ogg_crc_table():
+    table = []
+
+    for index in range(256):
+        crc = index << 24
+
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x04c11db7) & 0xffffffff if crc & 0x80000000 else (crc << 1) & 0xffffffff
+
+        table.append(crc)
+
+    return table
+
+
+OGG_CRC_TABLE = _ogg_crc_table()
+
+
+def ogg_crc(data):
+    """
+    Compute the CRC of an Ogg page (CRC-32, polynomial 0x04c11db7, not reflected, no final XOR)
+    :param data: The bytes of the page, with a zero CRC field
+    :return: The CRC as an int
+    """
+    crc = 0
+
+    for byte in data:
+        crc = ((crc << 8) & 0xffffffff) ^ OGG_CRC_TABLE[(crc >> 24) ^ byte]
+
+    return crc
+
+
+def ogg_page(packet, sequence, header_type=0, granule=0):
+    """
+    Build an Ogg page holding a whole packet
+    :param packet: The bytes of the packet
+    :param sequence: The page sequence number
+    :param header_type: The page header type flags (2 for the first page, 4 for the last page)
+    :param granule: The granule position (the sample count at the end of the page)
+    :return: The page as bytes
+    """
+    lacing = [255] * (len(packet) // 255) + [len(packet) % 255]
+    page = bytearray(b'OggS' + struct.pack('<BBqIII', 0, header_type, granule, 1, sequence, 0) +
+                     bytes([len(lacing)]) + bytes(lacing) + packet)
+    struct.pack_into('<I', page, 22, ogg_crc(page))
+
+    return bytes(page)
+
+
+def ogg_stub(genres):
+    """
+    Build an Ogg Vorbis file: the identification header page, the comment header page and a last, empty audio page
+    :param genres: A list of genres
+    :return: A tuple (head, tail) of the bytes at the start and at the end of the file
+    """
+    ident = b'\x01vorbis' + struct.pack('<IBIiiiB', 0, 2, 44100, 0, 128000, 0, 0xb8) + b'\x01'
+    head = ogg_page(ident, 0, header_type=2) + ogg_page(b'\x03vorbis' + vorbis_comments(genres) + b'\x01', 1)
+
+    return head, ogg_page(b'', 2, header_type=4, granule=44100)
+
+
+STUB_BUILDERS = {'flac': flac_stub, 'mp3': mp3_stub, 'ogg': ogg_stub}
+
+
+def write_stub(file_path, media_type, genres, file_size=0):
+    """
+    Write a media file stub
+    :param file_path: Path to the file to write
+    :param media_type: One of MEDIA_TYPES
+    :param genres: A list of genres
+    :param file_size: The size of the file, the part between the head and the tail of the stub is sparse (0 for no
+    sparse part)
+    :return: void
+    """
+    head, tail = STUB_BUILDERS[media_type](genres)
+
+    with open(file_path, 'wb') as f_out:
+        f_out.write(head)
+
+        if file_size > len(head) + len(tail):
+            f_out.seek(file_size - len(tail))
+
+        f_out.write(tail)
+        f_out.truncate()
+
+
+def album_genres(rnd, genre_mix, multi_genre_ratio):
+    """
+    Pick the genres of an album from the genre mix
+    :param rnd: A random.Random instance
+    :param genre_mix: A tuple of (genre, weight) tuples
+    :param multi_genre_ratio: The share of the albums that have two genres
+    :return: A list of genres, empty for an untagged album
+    """
+    names = [genre for genre, _ in genre_mix]
+    weights = [weight for _, weight in genre_mix]
+    genres = [rnd.choices(names, weights)[0]]
+
+    if genres[0] and rnd.random() < multi_genre_ratio:
+        second = rnd.choices(names, weights)[0]
+
+        if second and second != genres[0]:
+            genres.append(second)
+
+    return [genre for genre in genres if genre]
+
+
+def make_library(lib_dir, album_count, tracks=3, depth=1, genre_mix=DEFAULT_GENRE_MIX, multi_genre_ratio=0.1,
+                 empty_ratio=0.02, file_size=0, seed=1):
+    """
+    Generate a synthetic music library.
+    :param lib_dir: The directory in which to create the album folders
+    :param album_count: The number of top-level album folders
+    :param tracks: The number of tracks per album
+    :param depth: The directory level of the tracks below the album folder, 1 to put them in the album folder, 2 and
+    more to put them in nested disc folders
+    :param genre_mix: A tuple of (genre, weight) tuples
+    :param multi_genre_ratio: The share of the albums that have two genres
+    :param empty_ratio: The share of the folders that contain no media files
+    :param file_size: The size of each media file, the part after the tags is sparse
+    :param seed: The seed of the random generator
+    :return: A list of (folder name, [genre, ...], [relative track path, ...]) tuples, empty track lists for the
+    folders without media files
+    """
+    rnd = random.Random(seed)
+    albums = []
+    os.makedirs(lib_dir, exist_ok=True)
+
+    for album_no in range(album_count):
+        folder = f"Artist {album_no % 997:03d} - Album {album_no:06d}"
+        track_dir = os.path.join(folder, *(f"Disc {level}" for level in range(1, depth)))
+        os.makedirs(os.path.join(lib_dir, track_dir), exist_ok=True)
+
+        if rnd.random() < empty_ratio:
+            with open(os.path.join(lib_dir, track_dir, 'cover.txt'), 'w', encoding='UTF-8') as f_out:
+                f_out.write("no media\n")
+            albums.append((folder, [], []))
+            continue
+
+        genres = album_genres(rnd, genre_mix, multi_genre_ratio)
+        media_type = rnd.choice(MEDIA_TYPES)
+        track_paths = []
+
+        for track_no in range(1, tracks + 1):
+            track_path = os.path.join(track_dir, f"{track_no:02d} Track.{media_type}")
+            write_stub(os.path.join(lib_dir, track_path), media_type, genres, file_size)
+            track_paths.append(track_path)
+
+        albums.append((folder, genres, track_paths))
+
+    return albums
+
+
+def write_list_cfg(file_path, list_cfg=DEFAULT_LIST_CFG):
+    """
+    Write the genre playlist configuration used with the generated library
+    :param file_path: Path to the YAML file to write
+    :param list_cfg: The YAML contents
+    :return: void
+    """
+    with open(file_path, 'w', encoding='UTF-8') as f_out:
+        f_out.write(list_cfg)
+
+
+def main():  # pylint: disable=missing-function-docstring
+    parser = argparse.ArgumentParser(description="Generate a synthetic music library for the xspf-gen benchmarks.")
+    parser.add_argument("-d", "--directory", help="The directory in which to create the library.",
+                        type=str,
+                        dest='lib_dir',
+                        required=True)
+    parser.add_argument("-n", "--albums", help="The number of album folders.",
+                        type=int,
+                        dest='albums',
+                        default=1000,
+                        required=False)
+    parser.add_argument("-t", "--tracks", help="The number of tracks per album.",
+                        type=int,
+                        dest='tracks',
+                        default=3,
+                        required=False)
+    parser.add_argument("--depth", help="The directory level of the tracks below the album folder.",
+                        type=int,
+                        dest='depth',
+                        default=1,
+                        required=False)
+    parser.add_argument("--genres", help="The genre mix as genre:weight pairs, e.g. 'Rock:3,Jazz:1,:1' (an empty "
+                        "genre for untagged albums).",
+                        type=parse_genre_mix,
+                        dest='genre_mix',
+                        default=DEFAULT_GENRE_MIX,
+                        required=False)
+    parser.add_argument("--file_size", help="The size of each media file in bytes (sparse after the tags).",
+                        type=int,
+                        dest='file_size',
+                        default=0,
+                        required=False)
+    parser.add_argument("--seed", help="The seed of the random generator.",
+                        type=int,
+                        dest='seed',
+                        default=1,
+                        required=False)
+    args = parser.parse_args()
+
+    albums = make_library(args.lib_dir, args.albums, tracks=args.tracks, depth=args.depth,
+                          genre_mix=args.genre_mix, file_size=args.file_size, seed=args.seed)
+    print(f"Generated {len(albums)} album folders in {args.lib_dir}")
+
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
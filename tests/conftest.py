@@ -0,0 +1,53 @@
+"""
+Shared fixtures of the tests: the modules of the package are imported by their top-level names, as handler.py does
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'xspf'))
+
+from tests.helpers import GENRE_LISTS, flac_bytes  # noqa: E402
+
+
+@pytest.fixture
+def write_flac():
+    """
+    Write a FLAC file with a genre tag, creating its directory
+    :return: A function (path, genre) -> path
+    """
+    def _write_flac(path, genre='Jazz'):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with open(path, 'wb') as f_out:
+            f_out.write(flac_bytes(genre))
+
+        return str(path)
+
+    return _write_flac
+
+
+@pytest.fixture
+def make_handler(tmp_path):
+    """
+    Build playlist handlers writing to a temporary directory, with the test genre lists and no notifications
+    :return: A function (**options) -> PlaylistHandler
+    """
+    from handler import PlaylistHandler  # pylint: disable=import-outside-toplevel
+
+    class _Notifier:
+        def notify(self, select_key=None):  # pylint: disable=missing-function-docstring
+            pass
+
+    def _make_handler(**options):
+        options.setdefault('source_dir', str(tmp_path / 'music'))
+        options.setdefault('out_file', str(tmp_path / 'out' / 'all.xspf'))
+        options.setdefault('list_cfg', GENRE_LISTS)
+        options.setdefault('env_cfg', str(tmp_path / 'no.env_db'))
+        handler = PlaylistHandler(**options)
+        handler.notifier = _Notifier()
+
+        return handler
+
+    return _make_handler
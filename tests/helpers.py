@@ -0,0 +1,37 @@
+"""
+Helpers of the tests: test data and file changes
+"""
+import os
+import struct
+
+GENRE_LISTS = {
+    'Classical': ['Classical', 'Choral'],
+    'Jazz': ['Jazz', 'Bebop'],
+    'Pop_etc': ['Pop', 'Rock', 'Jazz'],
+}
+
+
+def flac_bytes(genre):
+    """
+    Build the smallest FLAC file the genre reader understands: the stream marker and a last Vorbis comment block
+    :param genre: The GENRE value, None for no genre comment
+    :return: The file contents
+    """
+    comments = [f"GENRE={genre}".encode('UTF-8')] if genre is not None else []
+    block = struct.pack('<I', 4) + b'test' + struct.pack('<I', len(comments))
+
+    for comment in comments:
+        block += struct.pack('<I', len(comment)) + comment
+
+    return b'fLaC' + struct.pack('>BBH', 0x84, len(block) >> 16, len(block) & 0xffff) + block
+
+
+def touch_later(path, seconds=5):
+    """
+    Move the modification time of a file or directory forward, as a later change would
+    :param path: The path
+    :param seconds: How far forward
+    :return: void
+    """
+    path_stat = os.stat(path)
+    os.utime(path, ns=(path_stat.st_atime_ns, path_stat.st_mtime_ns + seconds * 10 ** 9))
@@ -0,0 +1,60 @@
+"""
+Tests of the atomically replaced output file
+"""
+import os
+import stat
+
+import atomic_output
+from atomic_output import NEW_FILE_MODE, AtomicOutput
+
+
+def file_mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_new_file_mode_is_that_of_open(tmp_path):
+    with open(tmp_path / 'plain', 'w', encoding='UTF-8'):
+        pass
+
+    assert NEW_FILE_MODE == file_mode(tmp_path / 'plain')
+
+
+def test_writing_does_not_change_the_umask(tmp_path, monkeypatch):
+    def no_umask(mask):
+        raise AssertionError(f"umask set to {mask:o} while writing")
+
+    monkeypatch.setattr(atomic_output.os, 'umask', no_umask)
+
+    with AtomicOutput(str(tmp_path / 'new.xspf')) as out:
+        out.write('new')
+
+    assert file_mode(tmp_path / 'new.xspf') == NEW_FILE_MODE
+
+
+def test_mode_of_the_replaced_file_is_kept(tmp_path):
+    with AtomicOutput(str(tmp_path / 'private.json'), mode=0o600) as out:
+        out.write('1')
+
+    assert file_mode(tmp_path / 'private.json') == 0o600
+
+    os.chmod(tmp_path / 'private.json', 0o640)
+
+    with AtomicOutput(str(tmp_path / 'private.json')) as out:
+        out.write('2')
+
+    assert file_mode(tmp_path / 'private.json') == 0o640
+    assert (tmp_path / 'private.json').read_text() == '2'
+
+
+def test_unchanged_file_is_left_untouched(tmp_path):
+    with AtomicOutput(str(tmp_path / 'all.xspf')) as out:
+        out.write('same')
+
+    mtime = os.stat(tmp_path / 'all.xspf').st_mtime_ns
+
+    with AtomicOutput(str(tmp_path / 'all.xspf'), skip_unchanged=True) as out:
+        out.write('same')
+
+    assert not out.changed
+    assert os.stat(tmp_path / 'all.xspf').st_mtime_ns == mtime
+    assert os.listdir(tmp_path) == ['all.xspf']
@@ -0,0 +1,101 @@
+"""
+Tests of the locations of the cache files: their directories are created, and the default ones fail quietly
+"""
+import logging
+import os
+import sys
+
+import pytest
+
+import handler as handler_module
+import log_setup
+from config_cache import ConfigCache
+from db_snapshot import DbSnapshot
+from dir_catalogue import DirCatalogue
+from scan_cache import ScanCache
+
+
+def test_caches_create_their_directory(tmp_path):
+    cache_dir = tmp_path / 'scripts' / 'xspf-gen'
+    genre_lists = tmp_path / 'lists.yml'
+    genre_lists.write_text('Jazz: [Jazz]\n')
+
+    ScanCache(str(cache_dir / 'scan.db')).close()
+    assert DbSnapshot(str(cache_dir / 'snapshot')).save(['sig'], DirCatalogue([('Album', 'Jazz')]))
+    ConfigCache(str(cache_dir / 'config.json')).get(str(genre_lists), 'genre_lists', lambda path: {'Jazz': ['Jazz']})
+
+    assert sorted(os.listdir(cache_dir)) == ['config.json', 'scan.db', 'snapshot']
+
+
+def test_default_cache_directory_is_created(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+
+    assert handler_module.default_cache_path('.xspf-scan.db') == str(tmp_path / 'scripts' / 'xspf-gen' /
+                                                                     '.xspf-scan.db')
+    assert os.path.isdir(tmp_path / 'scripts' / 'xspf-gen')
+
+
+def test_default_cache_directory_is_that_of_the_genre_list_config(tmp_path, monkeypatch):
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+
+    assert handler_module.default_cache_path('.xspf-scan.db', '~/lists/list.yml') == \
+        str(tmp_path / 'lists' / '.xspf-scan.db')
+    assert handler_module.default_cache_path('.xspf-scan.db', 'list.yml') == str(tmp_path / '.xspf-scan.db')
+    assert os.path.isdir(tmp_path / 'lists')
+
+
+def test_main_puts_the_caches_beside_the_genre_list_config(tmp_path, monkeypatch):
+    options = {}
+
+    class _Handler:
+        stats = handler_module.RunStats()
+        source_dirs = []
+
+        def __init__(self, **kwargs):
+            options.update(kwargs)
+
+        def make_playlists(self):  # pylint: disable=missing-function-docstring
+            return 0
+
+        def close(self):  # pylint: disable=missing-function-docstring
+            pass
+
+    monkeypatch.setattr(handler_module, 'PlaylistHandler', _Handler)
+    monkeypatch.setattr(log_setup, '_configured', True)
+    monkeypatch.setattr(sys, 'argv', ['handler.py', '-c', str(tmp_path / 'cfg' / 'list.yml'), '-d', str(tmp_path),
+                                      '-o', str(tmp_path / 'out' / 'all.xspf'), '--db_snapshot', ''])
+
+    with pytest.raises(SystemExit):
+        handler_module.main()
+
+    assert options['scan_cache'] == str(tmp_path / 'cfg' / '.xspf-scan.db')
+    assert options['config_cache'] == str(tmp_path / 'cfg' / '.xspf-config-cache.json')
+    assert options['db_snapshot'] == ''
+
+
+def test_default_cache_is_off_without_warning_if_its_directory_cannot_be_created(tmp_path, monkeypatch, caplog):
+    (tmp_path / 'scripts').write_text('not a directory')
+    monkeypatch.setenv('HOME', str(tmp_path))
+
+    with caplog.at_level(logging.DEBUG):
+        assert handler_module.default_cache_path('.xspf-scan.db') == ''
+
+    assert not [record for record in caplog.records if record.levelno >= logging.WARNING]
+
+
+def test_handler_with_default_caches_does_not_warn(tmp_path, monkeypatch, make_handler, write_flac, caplog):
+    monkeypatch.setenv('HOME', str(tmp_path / 'home'))
+    write_flac(tmp_path / 'music' / 'Album' / '01.flac', 'Jazz')
+    options = {dest: handler_module.default_cache_path(file_name)
+               for dest, file_name in handler_module.DEFAULT_CACHE_FILES.items()}
+
+    with caplog.at_level(logging.INFO):
+        handler = make_handler(multi=True, **options)
+        handler.make_playlists()
+        handler.close()
+
+    # The only warnings are those of the missing DB configuration:
+    assert not [record.getMessage() for record in caplog.records if record.levelno >= logging.WARNING and
+                any(word in record.getMessage().lower() for word in ('cache', 'snapshot', 'database file'))]
+    assert os.path.isfile(tmp_path / 'home' / 'scripts' / 'xspf-gen' / '.xspf-scan.db')
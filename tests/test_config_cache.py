@@ -0,0 +1,113 @@
+"""
+Tests of the config cache: entries keyed by file and kind, valid while the file is unchanged, and no secrets kept
+"""
+import json
+import os
+import stat
+
+from config_cache import CONFIG_CACHE_VERSION, ConfigCache
+
+from tests.helpers import touch_later
+
+
+class _Compiler:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, path):
+        self.calls.append(path)
+
+        with open(path, encoding='UTF-8') as f_in:
+            return f_in.read().split()
+
+
+def test_entry_is_valid_while_the_file_is_unchanged(tmp_path):
+    src = tmp_path / 'lists.yml'
+    src.write_text('Jazz Rock')
+    compile_file = _Compiler()
+    cache = ConfigCache(str(tmp_path / 'cache.json'))
+
+    assert cache.get(str(src), 'genre_lists', compile_file) == ['Jazz', 'Rock']
+    assert cache.get(str(src), 'genre_lists', compile_file) == ['Jazz', 'Rock']
+    # Read again from the file by another run:
+    assert ConfigCache(str(tmp_path / 'cache.json')).get(str(src), 'genre_lists', compile_file) == ['Jazz', 'Rock']
+    assert len(compile_file.calls) == 1
+
+
+def test_touched_file_with_the_same_contents_is_not_compiled(tmp_path):
+    src = tmp_path / 'lists.yml'
+    src.write_text('Jazz Rock')
+    compile_file = _Compiler()
+    ConfigCache(str(tmp_path / 'cache.json')).get(str(src), 'genre_lists', compile_file)
+    touch_later(src)
+
+    assert ConfigCache(str(tmp_path / 'cache.json')).get(str(src), 'genre_lists', compile_file) == ['Jazz', 'Rock']
+    assert len(compile_file.calls) == 1
+
+    # The new modification time was saved, so the next run does not hash the file again:
+    with open(tmp_path / 'cache.json', encoding='UTF-8') as f_in:
+        entry = json.load(f_in)["entries"][f"genre_lists:{src}"]
+
+    assert entry["mtime_ns"] == os.stat(src).st_mtime_ns
+
+
+def test_changed_file_is_compiled_again(tmp_path):
+    src = tmp_path / 'lists.yml'
+    src.write_text('Jazz Rock')
+    compile_file = _Compiler()
+    ConfigCache(str(tmp_path / 'cache.json')).get(str(src), 'genre_lists', compile_file)
+    src.write_text('Jazz Pop')
+    touch_later(src)
+
+    assert ConfigCache(str(tmp_path / 'cache.json')).get(str(src), 'genre_lists', compile_file) == ['Jazz', 'Pop']
+    assert len(compile_file.calls) == 2
+
+
+def test_entries_are_keyed_by_path_and_kind(tmp_path):
+    src, other_src = tmp_path / 'a.yml', tmp_path / 'b.yml'
+    src.write_text('Jazz')
+    other_src.write_text('Rock')
+    cache = ConfigCache(str(tmp_path / 'cache.json'))
+
+    assert cache.get(str(src), 'genre_lists', _Compiler()) == ['Jazz']
+    assert cache.get(str(other_src), 'genre_lists', _Compiler()) == ['Rock']
+    assert cache.get(str(src), 'other_kind', lambda path: 'other') == 'other'
+    assert cache.get(str(src), 'genre_lists', _Compiler()) == ['Jazz']
+
+
+def test_uncompilable_file_is_not_cached(tmp_path):
+    src = tmp_path / 'lists.yml'
+    src.write_text('not a mapping')
+    cache = ConfigCache(str(tmp_path / 'cache.json'))
+
+    assert cache.get(str(src), 'genre_lists', lambda path: None) is None
+    assert not os.path.exists(tmp_path / 'cache.json')
+
+
+def test_cache_is_private_and_holds_no_db_password(tmp_path, make_handler):
+    lists = tmp_path / 'lists.yml'
+    lists.write_text('Jazz:\n  - Jazz\n  - Bebop\n')
+    env = tmp_path / '.env_db'
+    env.write_text('DB_HOST=localhost\nDB_NAME=music\nDB_USER=music\nDB_PASS=s3cret\n')
+    handler = make_handler(list_cfg=str(lists), env_cfg=str(env), config_cache=str(tmp_path / 'cache.json'))
+
+    assert dict(handler.genre_lists) == {'Jazz': ['Jazz', 'Bebop']}
+    assert handler.db.configured
+
+    assert stat.S_IMODE(os.stat(tmp_path / 'cache.json').st_mode) == 0o600
+    assert 's3cret' not in (tmp_path / 'cache.json').read_text()
+
+
+def test_cache_of_an_older_version_is_replaced(tmp_path):
+    src = tmp_path / 'lists.yml'
+    src.write_text('Jazz')
+    src_stat = os.stat(src)
+    with open(tmp_path / 'cache.json', 'w', encoding='UTF-8') as f_out:
+        json.dump({"version": CONFIG_CACHE_VERSION - 1, "entries": {
+            f"genre_lists:{src}": {"size": src_stat.st_size, "mtime_ns": src_stat.st_mtime_ns, "sha256": "",
+                                   "data": ['Stale']},
+            f"name_val:{tmp_path / '.env_db'}": {"size": 0, "mtime_ns": 0, "sha256": "", "data": {"DB_PASS": "x"}},
+        }}, f_out)
+
+    assert ConfigCache(str(tmp_path / 'cache.json')).get(str(src), 'genre_lists', _Compiler()) == ['Jazz']
+    assert 'DB_PASS' not in (tmp_path / 'cache.json').read_text()
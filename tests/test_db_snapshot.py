@@ -0,0 +1,122 @@
+"""
+Tests of the DB snapshot: used while the signature of the DB is unchanged, and whatever it is when the DB is down
+"""
+import pytest
+
+from db_snapshot import SNAPSHOT_MAGIC, DbSnapshot
+from db_source import DbUnavailable
+from dir_catalogue import DirCatalogue
+
+CATALOGUE = DirCatalogue([('Abba', 'Pop'), ('Bach', 'Choral'), ('Coltrane', 'Jazz, Pop'), ('Zé', '')])
+
+
+class _Db:
+    """
+    A stand-in for the DB of a handler, counting the queries of the folders
+    """
+
+    def __init__(self, signature, catalogue):
+        self.signature = signature
+        self.catalogue = catalogue
+        self.fetches = 0
+        self.available = True
+
+    def read_signature(self):  # pylint: disable=missing-function-docstring
+        if not self.available:
+            raise DbUnavailable("DB down")
+
+        return list(self.signature)
+
+    def fetch(self):  # pylint: disable=missing-function-docstring
+        if not self.available:
+            raise DbUnavailable("DB down")
+
+        self.fetches += 1
+        return self.catalogue
+
+
+@pytest.fixture
+def db_handler(tmp_path, make_handler):
+    """
+    Build a handler with a DB snapshot, reading its DB from a _Db instance
+    :return: A tuple (handler, _Db instance)
+    """
+    env = tmp_path / '.env_db'
+    env.write_text('DB_HOST=localhost\nDB_NAME=music\n')
+    handler = make_handler(multi=True, env_cfg=str(env), db_snapshot=str(tmp_path / 'snapshot'))
+    db = _Db(['music', 1, 4], CATALOGUE)
+    handler.read_db_signature = db.read_signature
+    handler.fetch_db_catalogue = db.fetch
+
+    return handler, db
+
+
+def test_snapshot_round_trip(tmp_path):
+    snapshot = DbSnapshot(str(tmp_path / 'snapshot'))
+
+    assert snapshot.load() is None
+    assert snapshot.save(['music', 1, 4], CATALOGUE)
+
+    loaded = snapshot.load(['music', 1, 4])
+
+    assert loaded.signature == ['music', 1, 4]
+    assert loaded.catalogue == CATALOGUE
+    assert [(folder.name, folder.genre) for folder in loaded.catalogue] == [
+        ('Abba', 'Pop'), ('Bach', 'Choral'), ('Coltrane', 'Jazz, Pop'), ('Zé', '')
+    ]
+
+
+def test_snapshot_of_another_signature_is_not_loaded(tmp_path):
+    snapshot = DbSnapshot(str(tmp_path / 'snapshot'))
+    snapshot.save(['music', 1, 4], CATALOGUE)
+
+    assert snapshot.load(['music', 1, 5]) is None
+    assert snapshot.load().catalogue == CATALOGUE
+
+
+def test_damaged_snapshot_is_ignored(tmp_path, caplog):
+    snapshot = DbSnapshot(str(tmp_path / 'snapshot'))
+    snapshot.save(['music', 1, 4], CATALOGUE)
+    data = (tmp_path / 'snapshot').read_bytes()
+    (tmp_path / 'snapshot').write_bytes(data[:-4])
+
+    assert snapshot.load() is None
+    assert 'Truncated snapshot' in caplog.text
+
+    (tmp_path / 'snapshot').write_bytes(data.replace(SNAPSHOT_MAGIC, b'XSPF-DB-SNAPSHOT 0\n'))
+
+    assert snapshot.load() is None
+
+
+def test_folders_queried_only_when_the_signature_changes(db_handler):
+    # pylint: disable=redefined-outer-name
+    handler, db = db_handler
+
+    assert handler.read_db_catalogue() == CATALOGUE
+    assert handler.read_db_catalogue() == CATALOGUE
+    assert db.fetches == 1
+    assert handler.stats.as_dict()["counters"]["db_snapshot_hits"] == 1
+
+    db.signature, db.catalogue = ['music', 2, 5], DirCatalogue([('Abba', 'Pop')])
+
+    assert handler.read_db_catalogue() == db.catalogue
+    assert db.fetches == 2
+
+
+def test_stale_snapshot_used_when_the_db_is_down(db_handler):
+    # pylint: disable=redefined-outer-name
+    handler, db = db_handler
+    handler.read_db_catalogue()
+    db.available = False
+
+    assert handler.read_db_catalogue() == CATALOGUE
+    assert handler.stats.as_dict()["counters"]["db_snapshot_stale"] == 1
+
+
+def test_db_down_without_snapshot(db_handler):
+    # pylint: disable=redefined-outer-name
+    handler, db = db_handler
+    db.available = False
+
+    with pytest.raises(DbUnavailable):
+        handler.read_db_catalogue()
@@ -0,0 +1,167 @@
+"""
+Tests of the DB access layer with a stub connection pool: the connection retries, the fast failure once the DB could
+not be reached, and the connections kept in the pool
+"""
+import psycopg2
+import pytest
+from psycopg2.extensions import QueryCanceledError
+
+from db_source import DbSource, DbUnavailable
+
+DB_CFG = {'DB_NAME': 'music', 'DB_RETRIES': '2', 'DB_RETRY_DELAY': '0', 'DB_RETRY_AFTER': '60'}
+
+
+class _Cursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.itersize = 0
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, _query):  # pylint: disable=missing-function-docstring
+        if self.conn.error is not None:
+            error, self.conn.error = self.conn.error, None
+
+            if error is not QueryCanceledError:
+                self.conn.closed = 2
+
+            raise error("query failed")
+
+        self._rows = [('Abba', 'Pop'), ('Bach', 'Choral'), ('Coltrane', 'Jazz')]
+
+    def fetchmany(self, size):  # pylint: disable=missing-function-docstring
+        rows, self._rows = self._rows[:size], self._rows[size:]
+
+        return rows
+
+
+class _Conn:
+    def __init__(self):
+        self.closed = 0
+        self.error = None
+
+    def cursor(self, name=None):  # pylint: disable=missing-function-docstring,unused-argument
+        return _Cursor(self)
+
+    def rollback(self):  # pylint: disable=missing-function-docstring
+        pass
+
+
+class _Pool:
+    """
+    A stand-in for ThreadedConnectionPool, failing the given number of connection attempts
+    """
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.attempts = 0
+        self.idle = []
+        self.closed = []
+
+    def getconn(self):  # pylint: disable=missing-function-docstring
+        self.attempts += 1
+
+        if self.failures:
+            self.failures -= 1
+            raise psycopg2.OperationalError("could not connect to server")
+
+        return self.idle.pop() if self.idle else _Conn()
+
+    def putconn(self, conn, close=False):  # pylint: disable=missing-function-docstring
+        if close:
+            conn.closed = 1
+            self.closed.append(conn)
+        else:
+            self.idle.append(conn)
+
+
+def make_db(pool, **settings):
+    db = DbSource(dict(DB_CFG, **settings))
+    db._get_pool = lambda: pool  # pylint: disable=protected-access
+
+    return db
+
+
+def run_query(db):
+    return [row for rows in db.query('test_cursor', 'SELECT', 2) for row in rows]
+
+
+def test_only_the_db_name_is_required():
+    socket_db = DbSource({'DB_NAME': 'music'})
+
+    assert socket_db.configured
+    assert 'host' not in socket_db._connect_kwargs()  # pylint: disable=protected-access
+    assert DbSource({'DB_HOST': 'localhost', 'DB_NAME': 'music'})._connect_kwargs()['host'] == 'localhost'
+    assert not DbSource({'DB_HOST': 'localhost'}).configured
+    assert not DbSource().configured
+
+
+def test_connection_attempts_are_retried():
+    pool = _Pool(failures=2)
+
+    assert len(run_query(make_db(pool))) == 3
+    assert pool.attempts == 3
+
+
+def test_unreachable_db_fails_fast():
+    pool = _Pool(failures=3)
+    db = make_db(pool)
+
+    with pytest.raises(DbUnavailable):
+        run_query(db)
+
+    assert pool.attempts == 3
+    assert not db.available
+
+    with pytest.raises(DbUnavailable, match="recently unreachable"):
+        run_query(db)
+
+    assert pool.attempts == 3
+
+    db._down_until = 0.0  # pylint: disable=protected-access
+
+    assert len(run_query(db)) == 3
+
+
+def test_connection_kept_in_the_pool():
+    pool = _Pool()
+    db = make_db(pool)
+    run_query(db)
+    conn = pool.idle[0]
+    run_query(db)
+
+    assert pool.idle == [conn]
+    assert not pool.closed
+
+
+def test_cancelled_query_keeps_the_db_available():
+    pool = _Pool()
+    db = make_db(pool)
+    run_query(db)
+    pool.idle[0].error = QueryCanceledError
+
+    with pytest.raises(DbUnavailable):
+        run_query(db)
+
+    assert db.available
+    assert len(pool.idle) == 1 and not pool.closed
+    assert len(run_query(db)) == 3
+
+
+def test_lost_connection_marks_the_db_down():
+    pool = _Pool()
+    db = make_db(pool)
+    run_query(db)
+    conn = pool.idle[0]
+    conn.error = psycopg2.OperationalError
+
+    with pytest.raises(DbUnavailable):
+        run_query(db)
+
+    assert not db.available
+    assert pool.closed == [conn] and not pool.idle
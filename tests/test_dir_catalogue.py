@@ -0,0 +1,132 @@
+"""
+Tests of the compact catalogue of the album folders: the folders merged when built, the views and the search by name
+"""
+from array import array
+
+import pytest
+
+from dir_catalogue import DirCatalogue, DirItem, merge_genres
+
+IN_ORDER = [('Abba', 'Pop'), ('Bach', 'Choral'), ('Coltrane', 'Jazz, Bebop'), ('Davis', 'Jazz'), ('Zé', '')]
+
+
+def items(catalogue):
+    return [tuple(item) for item in catalogue]
+
+
+def test_merge_genres():
+    assert merge_genres('Jazz, Pop', 'Pop, Rock') == 'Jazz, Pop, Rock'
+    assert merge_genres('', 'Jazz') == 'Jazz'
+    assert merge_genres('Jazz', '') == 'Jazz'
+
+
+def test_folders_in_order():
+    catalogue = DirCatalogue(IN_ORDER)
+
+    assert items(catalogue) == IN_ORDER
+    assert list(catalogue.names()) == [name for name, _ in IN_ORDER]
+    assert catalogue[-1] == DirItem('Zé', '')
+    assert catalogue[1:3] == [DirItem('Bach', 'Choral'), DirItem('Coltrane', 'Jazz, Bebop')]
+    assert catalogue.genre_strings == ('Pop', 'Choral', 'Jazz, Bebop', 'Jazz', '')
+    assert catalogue.genres == ('Pop', 'Choral', 'Jazz', 'Bebop')
+
+    with pytest.raises(IndexError):
+        catalogue[5]  # pylint: disable=pointless-statement
+
+
+def test_duplicate_folders_are_merged():
+    catalogue = DirCatalogue([('Abba', 'Pop'), ('Coltrane', 'Jazz'), ('Coltrane', 'Bebop'), ('Davis', 'Jazz')])
+
+    assert items(catalogue) == [('Abba', 'Pop'), ('Coltrane', 'Jazz, Bebop'), ('Davis', 'Jazz')]
+
+
+def test_folders_out_of_order_keep_their_order():
+    catalogue = DirCatalogue([('Davis', 'Jazz'), ('Abba', 'Pop'), ('Coltrane', 'Jazz'), ('Abba', 'Rock'),
+                              ('Davis', 'Jazz')])
+
+    assert items(catalogue) == [('Davis', 'Jazz'), ('Abba', 'Pop, Rock'), ('Coltrane', 'Jazz')]
+    assert catalogue.get('Abba') == DirItem('Abba', 'Pop, Rock')
+    assert catalogue.find_row('Davis') == 0
+    assert catalogue.find_row('Bach') is None
+    assert catalogue == DirCatalogue(catalogue)
+
+
+def test_membership_and_get():
+    catalogue = DirCatalogue(IN_ORDER)
+
+    assert 'Zé' in catalogue
+    assert DirItem('Davis', 'Jazz') in catalogue
+    assert DirItem('Davis', 'Pop') not in catalogue
+    assert 'Ellington' not in catalogue
+    assert catalogue.get('Bach') == DirItem('Bach', 'Choral')
+    assert catalogue.get('Ellington') is None
+    assert catalogue.get('Ellington', 'none') == 'none'
+
+
+def test_view_membership_and_get():
+    for catalogue in (DirCatalogue(IN_ORDER), DirCatalogue(reversed(IN_ORDER))):
+        view = catalogue.take([index for index, item in enumerate(catalogue) if 'Jazz' in item.genre])
+
+        assert sorted(view.names()) == ['Coltrane', 'Davis']
+        assert 'Davis' in view and 'Abba' not in view
+        assert view.get('Coltrane') == DirItem('Coltrane', 'Jazz, Bebop')
+        assert view.get('Abba') is None
+        assert view.find_row('Abba') is None
+        assert view.find_row('Davis') == catalogue.find_row('Davis')
+
+
+def test_view_of_a_view():
+    view = DirCatalogue(IN_ORDER).take([1, 2, 3])
+    sub_view = view.take([0, 2])
+
+    assert items(sub_view) == [('Bach', 'Choral'), ('Davis', 'Jazz')]
+    assert sub_view.find_row('Coltrane') is None
+    assert sub_view.find_row('Davis') == 3
+
+
+def test_select():
+    catalogue = DirCatalogue(IN_ORDER)
+
+    assert list(catalogue.select(['Jazz']).names()) == ['Coltrane', 'Davis']
+    assert list(catalogue.select(['Bebop', 'Pop']).names()) == ['Abba', 'Coltrane']
+    assert not catalogue.select(['Blues'])
+    assert list(catalogue.select(['Jazz']).select(['Bebop']).names()) == ['Coltrane']
+
+
+def test_take_genre_strings_of_a_catalogue_and_of_a_view():
+    catalogue = DirCatalogue([('Abba', 'Pop'), ('Bach', 'Jazz'), ('Coltrane', 'Pop'), ('Davis', 'Jazz'),
+                              ('Ellis', 'Rock')])
+    pop, jazz, rock = catalogue.genre_strings.index('Pop'), catalogue.genre_strings.index('Jazz'), \
+        catalogue.genre_strings.index('Rock')
+
+    # From the catalogue, through the rows grouped by genre string:
+    assert list(catalogue.take_genre_strings([jazz, pop]).names()) == ['Abba', 'Bach', 'Coltrane', 'Davis']
+    assert list(catalogue.take_genre_strings([rock, rock]).names()) == ['Ellis']
+    assert not catalogue.take_genre_strings([])
+
+    # From a view, through a pass over its rows:
+    view = catalogue.take([1, 2, 4])
+
+    assert list(view.take_genre_strings([jazz, rock]).names()) == ['Bach', 'Ellis']
+    assert list(view.take_genre_strings([pop]).names()) == ['Coltrane']
+
+
+def test_storage_round_trip():
+    catalogue = DirCatalogue([('Davis', 'Jazz'), ('Abba', 'Pop')])
+    rebuilt = DirCatalogue.from_storage(*catalogue.storage())
+
+    assert rebuilt == catalogue
+    assert rebuilt.get('Abba') == DirItem('Abba', 'Pop')
+    assert DirCatalogue.from_storage(*catalogue.take([1]).storage()) == [DirItem('Abba', 'Pop')]
+
+
+@pytest.mark.parametrize('storage', [
+    (b'AbbaBach', array('I', [0, 4]), ['Pop'], array('I', [0, 0])),
+    (b'AbbaBach', array('I', [1, 4, 8]), ['Pop'], array('I', [0, 0])),
+    (b'AbbaBach', array('I', [0, 4, 9]), ['Pop'], array('I', [0, 0])),
+    (b'AbbaBach', array('I', [0, 4, 8]), ['Pop', 'Pop'], array('I', [0, 1])),
+    (b'AbbaBach', array('I', [0, 4, 8]), ['Pop'], array('I', [0, 1])),
+])
+def test_from_storage_rejects_bad_storage(storage):
+    with pytest.raises(ValueError):
+        DirCatalogue.from_storage(*storage)
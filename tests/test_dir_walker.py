@@ -0,0 +1,79 @@
+"""
+Tests of the directory walker
+"""
+import os
+
+import pytest
+
+import dir_walker
+from dir_walker import find_first_media, list_media_files
+
+EXTENSIONS = ['flac', 'mp3']
+
+_scandir = os.scandir
+
+
+class _ReversedScandir:
+    """
+    A stand-in for os.scandir returning the entries in reverse name order, as a file system may
+    """
+
+    def __init__(self, path):
+        with _scandir(path) as entries:
+            self._entries = sorted(entries, key=lambda entry: entry.name, reverse=True)
+
+    def __enter__(self):
+        return iter(self._entries)
+
+    def __exit__(self, *_):
+        return False
+
+
+@pytest.fixture
+def reversed_scandir(monkeypatch):
+    monkeypatch.setattr(dir_walker.os, 'scandir', _ReversedScandir)
+
+
+def test_media_files_are_listed_in_name_order(tmp_path, write_flac, reversed_scandir):
+    # pylint: disable=redefined-outer-name,unused-argument
+    for name in ('CD2/01.flac', 'CD2/02.flac', 'CD1/02.flac', 'CD1/01.flac', '03.flac', '01.flac', '02.flac'):
+        write_flac(tmp_path / 'Album' / name)
+
+    (tmp_path / 'Album' / 'cover.jpg').write_bytes(b'')
+
+    media_files = list_media_files(str(tmp_path / 'Album'), EXTENSIONS)
+
+    assert [os.path.relpath(path, tmp_path / 'Album') for path in media_files.paths] == [
+        '01.flac', '02.flac', '03.flac', 'CD1/01.flac', 'CD1/02.flac', 'CD2/01.flac', 'CD2/02.flac'
+    ]
+    assert media_files.dirs_scanned == 3
+
+
+def test_scanned_tracks_are_in_album_order(tmp_path, make_handler, write_flac, reversed_scandir):
+    # pylint: disable=redefined-outer-name,unused-argument
+    music_dir = tmp_path / 'music'
+
+    for name in ('03.flac', '01.flac', '02.flac'):
+        write_flac(music_dir / 'Album' / name, 'Jazz')
+
+    handler = make_handler(multi=True)
+    tracks = list(handler.scan_tracks(str(music_dir)))
+
+    assert [os.path.basename(track.location) for track in tracks] == ['01.flac', '02.flac', '03.flac']
+    assert {track.genre for track in tracks} == {'Jazz'}
+
+
+def test_first_media_respects_max_depth(tmp_path, write_flac):
+    write_flac(tmp_path / 'Album' / 'CD1' / '01.flac')
+
+    assert find_first_media(str(tmp_path / 'Album'), EXTENSIONS, max_depth=0).path is None
+    assert find_first_media(str(tmp_path / 'Album'), EXTENSIONS).path == str(tmp_path / 'Album' / 'CD1' / '01.flac')
+
+
+def test_walked_directories_are_recorded(tmp_path, write_flac):
+    write_flac(tmp_path / 'Album' / 'CD1' / '01.flac')
+    dir_mtimes = {}
+
+    list_media_files(str(tmp_path / 'Album'), EXTENSIONS, dir_mtimes=dir_mtimes)
+
+    assert dir_mtimes == {str(tmp_path / 'Album' / 'CD1'): os.stat(tmp_path / 'Album' / 'CD1').st_mtime_ns}
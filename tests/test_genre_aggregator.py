@@ -0,0 +1,67 @@
+"""
+Tests of the aggregation of the genres of the tracks of an album: the sample of tracks read, the shares of the genres
+and the genres kept
+"""
+import pytest
+
+from genre_aggregator import GenreAggregator, sample_evenly, weigh_genres
+
+
+@pytest.mark.parametrize('size, expected', [
+    (0, list(range(10))),
+    (10, list(range(10))),
+    (20, list(range(10))),
+    (1, [5]),
+    (2, [2, 7]),
+    (3, [1, 5, 8]),
+    (5, [1, 3, 5, 7, 9]),
+])
+def test_sample_evenly(size, expected):
+    assert sample_evenly(range(10), size) == expected
+
+
+def test_sample_covers_every_disc():
+    tracks = [f"CD{disc}/{track:02d}.flac" for disc in (1, 2, 3) for track in range(1, 13)]
+
+    assert {track[:3] for track in sample_evenly(tracks, 3)} == {'CD1', 'CD2', 'CD3'}
+
+
+def test_shares_of_the_tagged_tracks():
+    assert weigh_genres(['Jazz', 'Jazz, Bebop', '', None, 'Bebop, Jazz', 'Pop']) == [
+        ('Jazz', 0.75), ('Bebop', 0.5), ('Pop', 0.25)
+    ]
+
+
+def test_ties_ordered_by_name():
+    assert weigh_genres(['Rock', 'Pop', 'Blues, Rock', 'Pop']) == [('Pop', 0.5), ('Rock', 0.5), ('Blues', 0.25)]
+
+
+def test_genres_below_the_min_share_dropped():
+    assert weigh_genres(['Jazz'] * 8 + ['Pop', 'Rock'], min_share=0.2) == [('Jazz', 0.8)]
+    assert weigh_genres(['Jazz'] * 8 + ['Pop', 'Rock'], min_share=0.1) == [('Jazz', 0.8), ('Pop', 0.1), ('Rock', 0.1)]
+
+
+def test_most_common_genres_kept_when_none_reaches_the_min_share():
+    assert weigh_genres(['Jazz', 'Pop', 'Rock', 'Jazz', 'Blues', 'Soul'], min_share=0.5) == [('Jazz', 2 / 6)]
+    assert weigh_genres(['Jazz', 'Pop', 'Rock'], min_share=0.5) == [('Jazz', 1 / 3), ('Pop', 1 / 3), ('Rock', 1 / 3)]
+
+
+def test_no_tagged_track():
+    assert not weigh_genres(['', None])
+    assert not weigh_genres([])
+
+
+def test_aggregate_keeps_the_order_of_the_shares(tmp_path):
+    genres = {'01.flac': 'Pop', '02.flac': 'Rock, Pop', '03.flac': 'Rock', '04.flac': 'Pop', '05.flac': 'Jazz'}
+
+    def read_file_genre(file_path):
+        if file_path.endswith('05.flac'):
+            raise ValueError("Unreadable tag")
+
+        return genres[file_path[-7:]]
+
+    paths = [str(tmp_path / name) for name in sorted(genres)]
+
+    assert GenreAggregator(read_file_genre).aggregate(str(tmp_path), paths) == 'Pop, Rock'
+    assert GenreAggregator(read_file_genre, min_share=0.6).aggregate(str(tmp_path), paths) == 'Pop'
+    assert GenreAggregator(read_file_genre, sample_size=1).aggregate(str(tmp_path), paths) == 'Rock'
@@ -0,0 +1,279 @@
+"""
+Tests of the fast genre reader: per format, the genre read is the one music_tag reads, or None where the tag is in a
+form left to music_tag
+"""
+import struct
+import uuid
+import zlib
+from pathlib import Path
+
+import music_tag
+import pytest
+from mutagen.apev2 import APEv2, APEValue, BINARY
+from mutagen.asf import ASF, ASFByteArrayAttribute, ASFUnicodeAttribute
+from mutagen.flac import FLAC, Picture
+from mutagen.id3 import APIC, ID3, TCON
+from mutagen.ogg import OggPage
+
+from genre_reader import ASF_HEADER, read_genre
+
+ASF_FILE_PROPERTIES = uuid.UUID("8CABDCA1-A947-11CF-8EE4-00C00C205365").bytes_le
+ASF_DATA = uuid.UUID("75B22636-668E-11CF-A6D9-00AA0062CE6C").bytes_le
+
+# Larger than the longest value the reader reads, and than an Ogg page:
+PICTURE = b'\x89PNG' + b'p' * 100000
+
+
+def mpeg_frames(count=10):
+    """
+    Build silent MPEG-1 layer III frames, the audio music_tag expects after an ID3v2 tag
+    """
+    return (b'\xff\xfb\x90\x64' + b'\x00' * 413) * count
+
+
+def id3_frame(version, frame_id, data, flags=b'\x00\x00'):
+    """
+    Build an ID3v2 frame
+    :param version: The ID3v2 minor version, 2, 3 or 4
+    :param frame_id: The frame ID, 3 characters for version 2
+    :param data: The frame data
+    :param flags: The 2 bytes of the frame flags, ignored for version 2
+    :return: The frame bytes
+    """
+    if version == 2:
+        return frame_id + len(data).to_bytes(3, 'big') + data
+
+    size = synchsafe(len(data)) if version == 4 else struct.pack('>I', len(data))
+
+    return frame_id + size + flags + data
+
+
+def synchsafe(value):
+    return bytes((value >> shift) & 0x7f for shift in (21, 14, 7, 0))
+
+
+def id3_tag(version, frames, flags=0, extended=b'', padding=64):
+    """
+    Build an ID3v2 tag followed by MPEG audio
+    :param version: The ID3v2 minor version
+    :param frames: The frame bytes
+    :param flags: The tag header flags
+    :param extended: The extended header, with the 0x40 flag
+    :param padding: The number of padding bytes after the frames
+    :return: The file contents
+    """
+    body = extended + frames + b'\x00' * padding
+
+    return b'ID3' + bytes((version, 0, flags)) + synchsafe(len(body)) + body + mpeg_frames()
+
+
+def write(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+
+    return str(path)
+
+
+def music_tag_genre(path):
+    return music_tag.load_file(path)['genre'].value
+
+
+def flac_file(tmp_path, name='test.flac', **tags):
+    """
+    Write a FLAC file with a STREAMINFO block and, through mutagen, its tags and an embedded picture
+    """
+    stream_info = struct.pack('>HH', 4096, 4096) + bytes(6) + bytes((0x0a, 0xc4, 0x42, 0xf0)) + bytes(20)
+    path = write(tmp_path, name, b'fLaC' + b'\x80' + len(stream_info).to_bytes(3, 'big') + stream_info)
+    flac = FLAC(path)
+    flac.update(tags)
+    picture = Picture()
+    picture.mime, picture.data = 'image/png', PICTURE
+    flac.add_picture(picture)
+    flac.save()
+
+    return path
+
+
+def vorbis_comments(comments):
+    packet = struct.pack('<I', 4) + b'test' + struct.pack('<I', len(comments))
+
+    for comment in comments:
+        packet += struct.pack('<I', len(comment.encode())) + comment.encode()
+
+    return packet
+
+
+def ogg_file(tmp_path, name, ident, comment_packet, setup_packet):
+    """
+    Write an Ogg stream: the identification header on its own page, then the comment header split over pages
+    """
+    first = OggPage()
+    first.packets, first.first, first.serial = [ident], True, 1
+    pages = [first] + OggPage.from_packets([comment_packet, setup_packet], sequence=1, default_size=4096)
+
+    for page in pages:
+        page.serial = 1
+
+    pages[-1].last, pages[-1].position = True, 4800
+
+    return write(tmp_path, name, b''.join(page.write() for page in pages))
+
+
+def ape_file(tmp_path, genres, id3v1=False):
+    """
+    Write a Monkey's Audio file with an APEv2 tag holding the genres and a binary cover, and maybe an ID3v1 tag
+    """
+    header = b'MAC ' + struct.pack('<H', 3990) + bytes(50) + struct.pack('<IIIHHI', 73728, 0, 0, 16, 2, 44100)
+    path = write(tmp_path, 'test.ape', header + bytes(100))
+    tag = APEv2()
+    tag['Cover Art (Front)'] = APEValue(b'cover.png\x00' + PICTURE, BINARY)
+    tag['Genre'] = genres
+    tag.save(path)
+
+    if id3v1:
+        with open(path, 'ab') as f_out:
+            f_out.write(b'TAG' + bytes(124) + b'\x08')
+
+    return path
+
+
+def asf_file(tmp_path, genres):
+    """
+    Write an ASF file from a minimal header, with the genres and a picture saved by mutagen
+    """
+    def asf_object(guid, body):
+        return guid + struct.pack('<Q', 24 + len(body)) + body
+
+    header_body = struct.pack('<IBB', 1, 1, 2) + asf_object(ASF_FILE_PROPERTIES, bytes(16) + bytes(64))
+    data = asf_object(ASF_DATA, bytes(16) + struct.pack('<QBB', 0, 1, 1))
+    path = write(tmp_path, 'test.wma', ASF_HEADER + struct.pack('<Q', 24 + len(header_body)) + header_body + data)
+    asf = ASF(path)
+    asf['WM/Picture'] = [ASFByteArrayAttribute(PICTURE)]
+    asf['WM/Genre'] = genres
+    asf.save()
+
+    return path
+
+
+@pytest.mark.parametrize('genres', [['Jazz'], ['Jazz', 'Rock'], []])
+def test_flac(tmp_path, genres):
+    path = flac_file(tmp_path, genre=genres) if genres else flac_file(tmp_path, title='No genre')
+
+    assert read_genre(path) == music_tag_genre(path) == ', '.join(genres)
+
+
+def test_flac_with_id3v2_prefix(tmp_path):
+    path = flac_file(tmp_path, genre=['Choral'])
+    tag = ID3()
+    tag.add(TCON(encoding=3, text=['Pop']))
+    tag.save(path, v2_version=4)
+
+    assert read_genre(path) == music_tag_genre(path) == 'Choral'
+
+
+@pytest.mark.parametrize('version, encoding', [(3, 0), (3, 1), (4, 0), (4, 1), (4, 2), (4, 3)])
+def test_id3_saved_by_mutagen(tmp_path, version, encoding):
+    path = write(tmp_path, 'test.mp3', mpeg_frames())
+    tag = ID3()
+    tag.add(APIC(encoding=0, mime='image/png', data=PICTURE))
+    tag.add(TCON(encoding=encoding, text=['Jazz', 'Rock', 'Zoé']))
+    tag.save(path, v2_version=version)
+
+    assert read_genre(path) == music_tag_genre(path)
+    assert '\ufeff' not in read_genre(path)
+
+
+@pytest.mark.parametrize('data', [
+    b'\x00Bebop',
+    b'\x01\xff\xfeJ\x00a\x00z\x00z\x00\x00\x00\xfe\xff\x00R\x00o\x00c\x00k\x00\x00',
+    b'\x01\xff\xfe\x00\x01\x00\x00\xff\xfeR\x00\x00\x01',
+])
+def test_id3v22(tmp_path, data):
+    path = write(tmp_path, 'test.mp3', id3_tag(2, id3_frame(2, b'PIC', b'\x00PNG\x00\x00' + PICTURE) +
+                                               id3_frame(2, b'TCO', data)))
+
+    assert read_genre(path) == music_tag_genre(path)
+
+
+def test_id3_extended_headers_and_frame_status_flags(tmp_path):
+    tcon = b'\x00Jazz\x00Bebop'
+    v3_path = write(tmp_path, 'v3.mp3', id3_tag(3, id3_frame(3, b'TCON', tcon, b'\xc0\x00'), flags=0x40,
+                                                extended=struct.pack('>IHI', 6, 0, 0)))
+    v4_path = write(tmp_path, 'v4.mp3', id3_tag(4, id3_frame(4, b'TCON', tcon, b'\x60\x00'), flags=0x40,
+                                                extended=synchsafe(6) + b'\x01\x00'))
+
+    assert read_genre(v3_path) == music_tag_genre(v3_path) == 'Jazz, Bebop'
+    assert read_genre(v4_path) == music_tag_genre(v4_path) == 'Jazz, Bebop'
+
+
+def test_id3_without_genre(tmp_path):
+    path = write(tmp_path, 'test.mp3', id3_tag(4, id3_frame(4, b'TIT2', b'\x03Title')))
+
+    assert read_genre(path) == music_tag_genre(path) == ''
+
+
+def test_id3_left_to_music_tag(tmp_path):
+    tcon = id3_frame(3, b'TCON', b'\x00Jazz')
+    unsync_tag = write(tmp_path, 'unsync.mp3', id3_tag(3, tcon, flags=0x80))
+    unsync_frame = write(tmp_path, 'unsync4.mp3', id3_tag(4, id3_frame(4, b'TCON', b'\x00Jazz', b'\x00\x02')))
+    compressed = write(tmp_path, 'zlib.mp3', id3_tag(3, id3_frame(
+        3, b'TCON', struct.pack('>I', 5) + zlib.compress(b'\x00Jazz'), b'\x00\x80')))
+    genre_ref = write(tmp_path, 'ref.mp3', id3_tag(3, id3_frame(3, b'TCON', b'\x00(8)')))
+
+    for path in (unsync_tag, unsync_frame, compressed):
+        assert read_genre(path) is None
+        assert music_tag_genre(path) == 'Jazz'
+
+    assert read_genre(genre_ref) is None
+    assert music_tag_genre(genre_ref) == 'Jazz'
+
+
+@pytest.mark.parametrize('name, ident', [
+    ('test.ogg', b'\x01vorbis' + struct.pack('<IBIiiiBB', 0, 2, 44100, 0, 128000, 0, 0xb8, 1)),
+    ('test.opus', b'OpusHead' + struct.pack('<BBHIhB', 1, 2, 312, 48000, 0, 0)),
+])
+def test_ogg_comment_header_over_pages(tmp_path, name, ident):
+    picture = 'METADATA_BLOCK_PICTURE=' + 'A' * 20000
+    comments = vorbis_comments(['GENRE=Jazz', picture, 'GENRE=Rock'])
+
+    if name == 'test.ogg':
+        path = ogg_file(tmp_path, name, ident, b'\x03vorbis' + comments + b'\x01', b'\x05vorbis' + bytes(20))
+    else:
+        path = ogg_file(tmp_path, name, ident, b'OpusTags' + comments, b'\xf8\xff\xfe')
+
+    assert read_genre(path) == music_tag_genre(path) == 'Jazz, Rock'
+
+
+@pytest.mark.parametrize('id3v1', [False, True])
+def test_apev2_footer(tmp_path, id3v1):
+    path = ape_file(tmp_path, ['Jazz'], id3v1=id3v1)
+
+    assert read_genre(path) == music_tag_genre(path) == 'Jazz'
+
+
+def test_apev2_multiple_values(tmp_path):
+    path = ape_file(tmp_path, ['Jazz', 'Rock'])
+
+    # music_tag keeps the null separator of APEv2 values, mutagen splits them:
+    assert read_genre(path) == ', '.join(APEv2(path)['Genre']) == 'Jazz, Rock'
+
+
+def test_asf_header_objects(tmp_path):
+    path = asf_file(tmp_path, ['Jazz', ASFUnicodeAttribute('Rock', language=1)])
+
+    # music_tag does not read ASF, compare with mutagen; the second value is in the header extension:
+    assert read_genre(path) == ', '.join(str(value) for value in ASF(path)['WM/Genre']) == 'Jazz, Rock'
+
+
+def test_truncated_files(tmp_path):
+    flac = Path(flac_file(tmp_path, genre=['Jazz'])).read_bytes()
+    mp3 = id3_tag(3, id3_frame(3, b'TCON', b'\x00Jazz'), padding=0)
+    mp3 = mp3[:len(mp3) - len(mpeg_frames()) - 2]
+    ogg = Path(ogg_file(tmp_path, 'test.ogg', b'\x01vorbis' + bytes(23),
+                        b'\x03vorbis' + vorbis_comments(['GENRE=Jazz']) + b'\x01', b'\x05vorbis')).read_bytes()
+
+    assert read_genre(write(tmp_path, 'cut.flac', flac[:flac.index(b'genre=') + 2])) is None
+    assert read_genre(write(tmp_path, 'cut.mp3', mp3)) is None
+    assert read_genre(write(tmp_path, 'cut.ogg', ogg[:ogg.index(b'GENRE') + 2])) is None
+    assert read_genre(write(tmp_path, 'cut.wma', ASF_HEADER + struct.pack('<Q', 1000) + bytes(20))) is None
+    assert read_genre(str(tmp_path / 'missing.flac')) is None
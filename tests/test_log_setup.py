@@ -0,0 +1,154 @@
+"""
+Tests of the logging set-up: the rate limit of the records logged from a call site, and the records handed to the
+background thread through a queue
+"""
+import logging
+import types
+from logging.handlers import QueueHandler
+
+import pytest
+
+import log_setup
+from log_setup import RateLimitFilter, configure_logging, logging_configured, stop_logging
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(self.format(record))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Replace the clock of log_setup
+    :return: A namespace whose `now` attribute is the time
+    """
+    fake_clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(log_setup, 'time', types.SimpleNamespace(monotonic=lambda: fake_clock.now))
+
+    return fake_clock
+
+
+@pytest.fixture
+def rate_limited():
+    """
+    Build a logger writing its records to a list through a RateLimitFilter of 3 records per 10 s
+    :return: A tuple (logger, list of the formatted messages)
+    """
+    out = _ListHandler()
+    out.addFilter(RateLimitFilter(burst=3, interval=10.0))
+    logger = logging.getLogger('tests.rate_limited')
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(out)
+
+    yield logger, out.records
+
+    logger.removeHandler(out)
+
+
+def log_folders(logger, count, level=logging.WARNING):
+    for number in range(count):
+        logger.log(level, "Cannot read folder %s", number)
+
+
+def test_burst_then_dropped(clock, rate_limited):
+    # pylint: disable=redefined-outer-name
+    logger, records = rate_limited
+    log_folders(logger, 5)
+
+    assert records == ["Cannot read folder 0", "Cannot read folder 1", "Cannot read folder 2"]
+
+    clock.now += 9.9
+    log_folders(logger, 1)
+
+    assert len(records) == 3
+
+
+def test_dropped_count_logged_with_the_next_record(clock, rate_limited):
+    # pylint: disable=redefined-outer-name
+    logger, records = rate_limited
+    log_folders(logger, 5)
+    clock.now += 10.0
+    log_folders(logger, 2)
+
+    assert records[3:] == ["Cannot read folder 0 (2 similar messages dropped)", "Cannot read folder 1"]
+
+
+def test_call_sites_and_levels_limited_apart(clock, rate_limited):
+    # pylint: disable=redefined-outer-name
+    logger, records = rate_limited
+    log_folders(logger, 4)
+    log_folders(logger, 4, level=logging.INFO)
+    logger.warning("Another call site")
+
+    assert len(records) == 7
+    assert clock.now == 1000.0
+
+
+def test_errors_never_dropped(clock, rate_limited):
+    # pylint: disable=redefined-outer-name
+    logger, records = rate_limited
+    log_folders(logger, 10, level=logging.ERROR)
+    log_folders(logger, 10, level=logging.CRITICAL)
+
+    assert len(records) == 20
+    assert clock.now == 1000.0
+
+
+def test_no_limit_with_a_burst_of_0():
+    record = logging.LogRecord('tests', logging.INFO, __file__, 1, "message", None, None)
+    no_limit = RateLimitFilter(burst=0)
+
+    assert all(no_limit.filter(record) for _ in range(100))
+
+
+@pytest.fixture
+def unconfigured(monkeypatch):
+    """
+    Undo the logging set-up of the process for a test, and the handlers the test adds to the root logger
+    """
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    monkeypatch.setattr(log_setup, '_configured', False)
+    monkeypatch.setattr(log_setup, '_listener', None)
+
+    yield root
+
+    stop_logging()
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+
+def test_records_written_through_the_queue(unconfigured):
+    # pylint: disable=redefined-outer-name
+    out = _ListHandler()
+
+    assert configure_logging('debug', use_queue=True, handler=out)
+    assert logging_configured()
+    assert isinstance(unconfigured.handlers[-1], QueueHandler)
+    assert unconfigured.level == logging.DEBUG
+    assert not configure_logging('error', use_queue=True, handler=_ListHandler())
+
+    logging.getLogger('tests.queue').debug("Scanned %s folders", 3)
+    stop_logging()
+
+    assert out.records == ["DEBUG:tests.queue:Scanned 3 folders"]
+    assert log_setup._listener is None  # pylint: disable=protected-access
+
+    stop_logging()
+
+
+def test_handlers_of_the_embedding_program_kept(unconfigured):
+    # pylint: disable=redefined-outer-name
+    unconfigured.addHandler(logging.NullHandler())
+    handlers = list(unconfigured.handlers)
+
+    assert not configure_logging('debug', use_queue=True)
+    assert logging_configured()
+    assert unconfigured.handlers == handlers
+    assert log_setup._listener is None  # pylint: disable=protected-access
@@ -0,0 +1,112 @@
+"""
+Tests of the in-process API: the playlists returned as bytes, the sources of the folders and the resources it owns
+"""
+import os
+
+import pytest
+
+from dir_catalogue import DirCatalogue
+from handler import Result
+from playlist_api import (CatalogueSource, FallbackSource, NullNotifier, PlaylistGenerator, ScanSource,
+                          SnapshotSource, SourceUnavailable)
+
+from tests.helpers import GENRE_LISTS
+
+
+class _Notifier:
+    def __init__(self):
+        self.results = []
+
+    def notify(self, select_key=None):  # pylint: disable=missing-function-docstring
+        self.results.append(select_key)
+
+
+class _Conn:
+    closed = 0
+
+    def close(self):  # pylint: disable=missing-function-docstring
+        self.closed = 1
+
+
+def make_generator(tmp_path, **options):
+    options.setdefault('out_dir', str(tmp_path / 'out'))
+    options.setdefault('env_cfg', str(tmp_path / 'no.env_db'))
+
+    return PlaylistGenerator(genre_lists=GENRE_LISTS, **options)
+
+
+def test_playlists_are_those_written_by_make_playlists(tmp_path, make_handler, write_flac):
+    for name, genre in (('Bach', 'Choral'), ('Coltrane', 'Jazz'), ('[Live]', 'Rock')):
+        write_flac(tmp_path / 'music' / name / '01.flac', genre)
+
+    handler = make_handler(multi=True)
+    handler.read_db_catalogue = DirCatalogue
+    handler.make_playlists()
+    playlists = make_generator(tmp_path).generate(ScanSource(str(tmp_path / 'music')))
+
+    assert list(playlists) == ['classical.xspf', 'jazz.xspf', 'pop_etc.xspf', 'all.xspf']
+    assert playlists == {file_name: (tmp_path / 'out' / file_name).read_bytes()
+                         for file_name in os.listdir(tmp_path / 'out')}
+
+
+def test_parent_playlist_references_the_out_dir(tmp_path):
+    playlists = make_generator(tmp_path, out_dir='/srv/playlists').generate(CatalogueSource('/music', []))
+
+    assert b'file:////srv/playlists/jazz.xspf' in playlists['all.xspf']
+
+
+def test_out_dir_is_required_for_genre_playlists(tmp_path):
+    with pytest.raises(ValueError):
+        make_generator(tmp_path, out_dir='')
+
+    flat = make_generator(tmp_path, out_dir='', multi=False).generate(CatalogueSource('/music', [('Album', 'Jazz')]))
+
+    assert list(flat) == ['all.xspf']
+    assert b'file:////music/Album' in flat['all.xspf']
+
+
+def test_playlists_generated_one_at_a_time(tmp_path):
+    generator = make_generator(tmp_path)
+    playlists = generator.iter_playlists(CatalogueSource('/music', [('Album', 'Jazz')]))
+
+    assert next(playlists)[0] == 'classical.xspf'
+    assert generator.stats.as_dict()["counters"]["playlist_tracks"] == 0
+    assert [file_name for file_name, _ in playlists] == ['jazz.xspf', 'pop_etc.xspf', 'all.xspf']
+
+
+def test_fallback_source_uses_the_first_source_listing_folders(tmp_path, caplog):
+    generator = make_generator(tmp_path)
+    source = FallbackSource(SnapshotSource('/music', str(tmp_path / 'missing')), CatalogueSource('/empty', []),
+                            CatalogueSource('/music', [('Album', 'Jazz')]), CatalogueSource('/other', [('X', 'Rock')]))
+
+    assert b'/music/Album' in generator.generate(source)['jazz.xspf']
+    assert 'SnapshotSource not available' in caplog.text
+
+
+def test_fallback_source_without_any_source_available(tmp_path):
+    generator = make_generator(tmp_path)
+
+    with pytest.raises(SourceUnavailable):
+        generator.generate(FallbackSource(SnapshotSource('/music', str(tmp_path / 'missing'))))
+
+    assert generator.generate(FallbackSource(CatalogueSource('/empty', [])))['jazz.xspf']
+
+
+def test_notifications(tmp_path):
+    assert isinstance(make_generator(tmp_path).handler.notifier, NullNotifier)
+
+    notifier = _Notifier()
+    make_generator(tmp_path, notifier=notifier).generate(CatalogueSource('/music', []))
+
+    assert notifier.results == [Result.PROCESSING] + [Result.PLAYLIST_GENERATED] * 4
+
+
+def test_given_connection_is_left_open(tmp_path):
+    conn = _Conn()
+    generator = make_generator(tmp_path, conn=conn)
+
+    assert generator.handler.conn is conn
+
+    generator.close()
+
+    assert not conn.closed
@@ -0,0 +1,45 @@
+"""
+Tests of the rendering of the genre playlists on a pool of processes
+"""
+import logging
+import os
+
+from dir_catalogue import DirCatalogue
+
+
+def write_playlists(tmp_path, make_handler, write_flac, out_name, **options):
+    for name, genre in (('Bach', 'Choral'), ('Coltrane', 'Jazz'), ('Parker', 'Bebop'), ('Zappa', 'Rock')):
+        write_flac(tmp_path / 'music' / name / '01.flac', genre)
+
+    handler = make_handler(multi=True, out_file=str(tmp_path / out_name / 'all.xspf'), **options)
+    handler.read_db_catalogue = DirCatalogue
+    count = handler.make_playlists()
+
+    return count, {file_name: (tmp_path / out_name / file_name).read_text().replace(out_name, 'OUT')
+                   for file_name in sorted(os.listdir(tmp_path / out_name))}
+
+
+def test_worker_processes_write_the_same_playlists(tmp_path, make_handler, write_flac):
+    assert write_playlists(tmp_path, make_handler, write_flac, 'out2', render_jobs=3) == \
+        write_playlists(tmp_path, make_handler, write_flac, 'out1')
+
+
+def test_worker_processes_write_the_same_shards(tmp_path, make_handler, write_flac):
+    count, playlists = write_playlists(tmp_path, make_handler, write_flac, 'out1', shard_size=1)
+
+    assert 'jazz.002.xspf' in playlists
+    assert write_playlists(tmp_path, make_handler, write_flac, 'out2', render_jobs=3, shard_size=1) == \
+        (count, playlists)
+
+
+def test_worker_processes_log_at_the_level_of_the_parent(tmp_path, make_handler, write_flac, capfd):
+    logging.getLogger().setLevel(logging.DEBUG)
+
+    try:
+        write_playlists(tmp_path, make_handler, write_flac, 'out', render_jobs=2, skip_unchanged=True)
+        capfd.readouterr()
+        write_playlists(tmp_path, make_handler, write_flac, 'out', render_jobs=2, skip_unchanged=True)
+    finally:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    assert capfd.readouterr().err.count("Unchanged, not written") == 3
@@ -0,0 +1,35 @@
+"""
+Tests of the routing of the album folders to the genre playlists
+"""
+from dir_catalogue import DirCatalogue, DirItem
+
+
+def routed_names(routed):
+    return {list_name: [folder.name for folder in folders] for list_name, folders in routed.items()}
+
+
+def test_jazz_genres_only_go_to_jazz_playlists(make_handler):
+    handler = make_handler(multi=True)
+    folders = [DirItem('Coltrane', 'Jazz'), DirItem('Zed', 'Rock'), DirItem('Bach', 'Choral')]
+
+    assert routed_names(handler.route_folders(folders)) == {
+        'Classical': ['Bach'], 'Jazz': ['Coltrane'], 'Pop_etc': ['Zed']
+    }
+
+
+def test_mixed_genre_folder_goes_to_jazz_and_other_playlists(make_handler):
+    handler = make_handler(multi=True)
+    # One row per genre of the songs, as the DB listed them, merged into one entry per folder by the catalogue:
+    catalogue = DirCatalogue([('Mixed', 'Jazz'), ('Mixed', 'Rock'), ('Solo', 'Bebop')])
+
+    assert routed_names(handler.route_folders(catalogue)) == {
+        'Classical': [], 'Jazz': ['Mixed', 'Solo'], 'Pop_etc': ['Mixed']
+    }
+    assert routed_names(handler.route_folders(list(catalogue))) == routed_names(handler.route_folders(catalogue))
+
+
+def test_folder_listed_once_per_playlist(make_handler):
+    handler = make_handler(multi=True)
+    folders = [DirItem('Album', 'Pop'), DirItem('Album', 'Rock')]
+
+    assert routed_names(handler.route_folders(folders))['Pop_etc'] == ['Album']
@@ -0,0 +1,146 @@
+"""
+Tests of the run statistics: the phases timed by @timed, generators included, and the JSON report of --stats_json
+"""
+import argparse
+import json
+import types
+
+import pytest
+
+import run_stats
+from handler import __version__, write_stats
+from run_stats import RunStats, timed
+
+
+class _Clock:
+    """
+    A stand-in for the time module of run_stats, whose perf_counter() only moves when told to
+    """
+
+    def __init__(self):
+        self.now = 100.0
+
+    def perf_counter(self):  # pylint: disable=missing-function-docstring
+        return self.now
+
+
+class _Phases:
+    def __init__(self, clock):
+        self.stats = RunStats()
+        self.clock = clock
+
+    @timed("work")
+    def work(self, seconds, fail=False):  # pylint: disable=missing-function-docstring
+        self.clock.now += seconds
+
+        if fail:
+            raise ValueError("failed")
+
+        return seconds
+
+    @timed("items")
+    def items(self, count, seconds):  # pylint: disable=missing-function-docstring
+        for item in range(count):
+            self.clock.now += seconds
+            yield item
+
+        self.clock.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Replace the clock of run_stats
+    :return: A _Clock instance
+    """
+    fake_clock = _Clock()
+    monkeypatch.setattr(run_stats, 'time', types.SimpleNamespace(perf_counter=fake_clock.perf_counter))
+
+    return fake_clock
+
+
+def phases(stats):
+    return stats.as_dict()["phases"]
+
+
+def test_timed_method(clock):
+    # pylint: disable=redefined-outer-name
+    timed_phases = _Phases(clock)
+
+    assert timed_phases.work(2.0) == 2.0
+    assert timed_phases.work.__name__ == 'work'
+
+    with pytest.raises(ValueError):
+        timed_phases.work(0.5, fail=True)
+
+    assert phases(timed_phases.stats) == {"work": {"calls": 2, "seconds": 2.5}}
+
+
+def test_timed_generator_counts_only_the_time_producing_items(clock):
+    # pylint: disable=redefined-outer-name
+    timed_phases = _Phases(clock)
+    items = timed_phases.items(3, 1.0)
+
+    assert not phases(timed_phases.stats)
+
+    for _ in items:
+        clock.now += 10.0
+
+    # Three items and the end of the loop, not the time the caller spent between them:
+    assert phases(timed_phases.stats) == {"items": {"calls": 1, "seconds": 4.0}}
+
+
+def test_timed_generator_closed_early(clock):
+    # pylint: disable=redefined-outer-name
+    timed_phases = _Phases(clock)
+    items = timed_phases.items(3, 1.0)
+    next(items)
+    clock.now += 10.0
+    items.close()
+
+    assert phases(timed_phases.stats) == {"items": {"calls": 1, "seconds": 1.0}}
+
+
+def test_counters():
+    stats = RunStats()
+    stats.count("tags_read")
+    stats.count("bytes_written", 10)
+    stats.count_output(types.SimpleNamespace(bytes_written=5, changed=True))
+    stats.count_output(types.SimpleNamespace(bytes_written=5, changed=False))
+
+    assert stats.as_dict()["counters"] == {"bytes_written": 20, "files_unchanged": 1, "files_written": 1,
+                                           "tags_read": 1}
+
+
+def test_write_json(tmp_path):
+    stats = RunStats()
+    stats.add_phase_time("scan", 1.5, calls=3)
+    stats.count("folders", 7)
+    stats.write_json(str(tmp_path / 'stats.json'), version='1.0', items=7)
+    report = json.loads((tmp_path / 'stats.json').read_text())
+
+    assert report["version"] == '1.0'
+    assert report["items"] == 7
+    assert report["phases"] == {"scan": {"calls": 3, "seconds": 1.5}}
+    assert report["counters"] == {"folders": 7}
+    assert set(report) == {"version", "items", "started", "run_time", "phases", "counters"}
+
+
+def test_stats_json_option(tmp_path, caplog):
+    stats = RunStats()
+    stats.count("folders", 2)
+    args = argparse.Namespace(stats_json=str(tmp_path / 'stats.json'), multi=True)
+    write_stats(stats, args, items=2)
+    report = json.loads((tmp_path / 'stats.json').read_text())
+
+    assert report["version"] == __version__
+    assert report["options"] == {"stats_json": str(tmp_path / 'stats.json'), "multi": True}
+    assert report["items"] == 2
+
+    write_stats(stats, argparse.Namespace(stats_json=str(tmp_path / 'missing' / 'stats.json')))
+
+    assert "Cannot write the run statistics" in caplog.text
+
+    write_stats(stats, argparse.Namespace(stats_json=None))
+
+    assert [path.name for path in tmp_path.iterdir()] == ['stats.json']
@@ -0,0 +1,81 @@
+"""
+Tests of the scan cache: an entry must not outlive a change below its album directory
+"""
+import os
+
+from tests.helpers import touch_later
+
+
+def probe(handler, music_dir, name):
+    hits = handler.stats.as_dict()["counters"].get("scan_cache_hits", 0)
+    result = handler.probe_dir(str(music_dir), name)
+
+    return result, handler.stats.as_dict()["counters"].get("scan_cache_hits", 0) > hits
+
+
+def test_unchanged_directory_is_a_hit(tmp_path, make_handler, write_flac):
+    music_dir = tmp_path / 'music'
+    write_flac(music_dir / 'Album' / '01.flac', 'Jazz')
+    handler = make_handler(multi=True, scan_cache=str(tmp_path / 'scan.db'))
+
+    assert probe(handler, music_dir, 'Album') == ((True, 'Jazz'), False)
+    assert probe(handler, music_dir, 'Album') == ((True, 'Jazz'), True)
+
+
+def test_media_added_to_nested_folder_invalidates(tmp_path, make_handler, write_flac):
+    music_dir = tmp_path / 'music'
+    os.makedirs(music_dir / 'Artist' / 'Album' / 'CD1')
+    handler = make_handler(multi=True, scan_cache=str(tmp_path / 'scan.db'))
+
+    assert probe(handler, music_dir, 'Artist') == ((False, ''), False)
+
+    top_mtime = os.stat(music_dir / 'Artist').st_mtime_ns
+    write_flac(music_dir / 'Artist' / 'Album' / 'CD1' / '01.flac', 'Rock')
+    touch_later(music_dir / 'Artist' / 'Album' / 'CD1')
+    assert os.stat(music_dir / 'Artist').st_mtime_ns == top_mtime
+
+    assert probe(handler, music_dir, 'Artist') == ((True, 'Rock'), False)
+    assert probe(handler, music_dir, 'Artist') == ((True, 'Rock'), True)
+
+
+def test_retagged_track_invalidates(tmp_path, make_handler, write_flac):
+    music_dir = tmp_path / 'music'
+    track = write_flac(music_dir / 'Album' / '01.flac', 'Jazz')
+    handler = make_handler(multi=True, scan_cache=str(tmp_path / 'scan.db'))
+
+    assert probe(handler, music_dir, 'Album') == ((True, 'Jazz'), False)
+
+    dir_mtime = os.stat(music_dir / 'Album').st_mtime_ns
+    write_flac(track, 'Rock')
+    touch_later(track)
+    assert os.stat(music_dir / 'Album').st_mtime_ns == dir_mtime
+
+    assert probe(handler, music_dir, 'Album') == ((True, 'Rock'), False)
+
+
+def test_entries_without_dependencies_are_not_trusted(tmp_path, make_handler, write_flac):
+    music_dir = tmp_path / 'music'
+    write_flac(music_dir / 'Album' / '01.flac', 'Jazz')
+    handler = make_handler(multi=True, scan_cache=str(tmp_path / 'scan.db'))
+    probe(handler, music_dir, 'Album')
+    # As written by a version of the cache that did not record the dependencies:
+    handler.scan_cache._conn.execute("UPDATE dirs SET deps = ''")  # pylint: disable=protected-access
+
+    assert probe(handler, music_dir, 'Album') == ((True, 'Jazz'), False)
+
+
+def test_retagged_track_invalidates_aggregated_genre(tmp_path, make_handler, write_flac):
+    music_dir = tmp_path / 'music'
+    write_flac(music_dir / 'Album' / '01.flac', 'Jazz')
+    track = write_flac(music_dir / 'Album' / '02.flac', 'Jazz')
+    handler = make_handler(multi=True, genre_mode='all', scan_cache=str(tmp_path / 'scan.db'))
+
+    assert probe(handler, music_dir, 'Album') == ((True, 'Jazz'), False)
+    assert probe(handler, music_dir, 'Album') == ((True, 'Jazz'), True)
+
+    write_flac(track, 'Rock')
+    touch_later(track)
+
+    assert probe(handler, music_dir, 'Album') == ((True, 'Jazz, Rock'), False)
+    # Only the re-tagged track is read again:
+    assert handler.stats.as_dict()["counters"]["tag_cache_hits"] == 1
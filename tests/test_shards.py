@@ -0,0 +1,93 @@
+"""
+Tests of the sharding of large playlists: the shards planned, and the shard files written and removed
+"""
+import os
+
+import pytest
+
+from dir_catalogue import DirCatalogue, DirItem
+from handler import MediaDirs
+
+
+def shard_names(shards):
+    return [(key, [folder.name for folder in folders]) for key, folders in shards]
+
+
+def set_folders(handler, names):
+    handler.directories = MediaDirs(parent='/music', dirs=DirCatalogue([(name, 'Jazz') for name in sorted(names)]))
+
+
+def out_files(tmp_path):
+    return sorted(os.listdir(tmp_path / 'out'))
+
+
+def test_folders_that_fit_are_not_sharded(make_handler):
+    folders = [DirItem(name, 'Jazz') for name in 'abc']
+
+    assert make_handler(shard_size=3).shard_folders(folders) == []
+    assert make_handler().shard_folders(folders) == []
+
+
+def test_shards_by_count(make_handler):
+    folders = [DirItem(name, 'Jazz') for name in 'abcdefg']
+
+    assert shard_names(make_handler(shard_size=3).shard_folders(folders)) == [
+        ('001', ['a', 'b', 'c']), ('002', ['d', 'e', 'f']), ('003', ['g'])
+    ]
+
+
+def test_shards_by_initial_keep_an_initial_together(make_handler):
+    names = ('10cc', 'Abba', 'Air', 'Alan', 'Ash', 'Bach', 'Cream', 'Zappa', '¡Forward')
+    folders = [DirItem(name, 'Jazz') for name in names]
+
+    assert shard_names(make_handler(shard_size=3, shard_by='alpha').shard_folders(folders)) == [
+        ('0', ['10cc']), ('a', ['Abba', 'Air', 'Alan', 'Ash']), ('b-z', ['Bach', 'Cream', 'Zappa']), ('_', ['¡Forward'])
+    ]
+
+
+def test_unknown_shard_mode_is_refused(make_handler):
+    with pytest.raises(ValueError):
+        make_handler(shard_by='size')
+
+
+def test_playlist_that_fits_is_written_without_tasks(tmp_path, make_handler, monkeypatch):
+    os.makedirs(tmp_path / 'out')
+    handler = make_handler(shard_size=3)
+    set_folders(handler, 'abc')
+    monkeypatch.setattr(handler, 'playlist_tasks', lambda *args: pytest.fail("Tasks planned for a single file"))
+
+    assert handler.build_flat_playlist() == 3
+    assert out_files(tmp_path) == ['all.xspf']
+
+
+def test_stale_shards_are_removed(tmp_path, make_handler):
+    os.makedirs(tmp_path / 'out')
+    (tmp_path / 'out' / 'all.notes.xspf').write_text('not a shard')
+    handler = make_handler(shard_size=2)
+
+    set_folders(handler, 'abcde')
+    assert handler.build_flat_playlist() == 5
+    assert out_files(tmp_path) == ['all.001.xspf', 'all.002.xspf', 'all.003.xspf', 'all.notes.xspf', 'all.xspf']
+    assert 'all.003.xspf' in (tmp_path / 'out' / 'all.xspf').read_text()
+
+    set_folders(handler, 'abc')
+    assert handler.build_flat_playlist() == 3
+    assert out_files(tmp_path) == ['all.001.xspf', 'all.002.xspf', 'all.notes.xspf', 'all.xspf']
+
+    set_folders(handler, 'ab')
+    assert handler.build_flat_playlist() == 2
+    assert out_files(tmp_path) == ['all.notes.xspf', 'all.xspf']
+    assert '/music/b' in (tmp_path / 'out' / 'all.xspf').read_text()
+
+
+def test_alpha_shards_removed_when_the_ranges_move(tmp_path, make_handler):
+    os.makedirs(tmp_path / 'out')
+    handler = make_handler(shard_size=2, shard_by='alpha')
+
+    set_folders(handler, ['Abba', 'Bach', 'Cream'])
+    handler.build_flat_playlist()
+    assert out_files(tmp_path) == ['all.a-b.xspf', 'all.c.xspf', 'all.xspf']
+
+    set_folders(handler, ['Abba', 'Air', 'Bach', 'Cream'])
+    handler.build_flat_playlist()
+    assert out_files(tmp_path) == ['all.a.xspf', 'all.b-c.xspf', 'all.xspf']
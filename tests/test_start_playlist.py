@@ -0,0 +1,139 @@
+"""
+Tests of the start playlist extended with new tracks: the ids it continues from, the elements it reuses, and the
+playlist the soup path builds from the same start file
+"""
+import pytest
+from lxml import etree
+
+from dir_catalogue import DirCatalogue
+from handler import PlaylistHandler
+from start_playlist import VLC_NS, StartPlaylist
+from xspf_writer import indent_xml
+
+# The ids are not in order and the last track is not in the music node:
+RADIO = """<?xml version="1.0" encoding="UTF-8"?>
+<playlist xmlns="http://xspf.org/ns/0/" xmlns:vlc="http://www.videolan.org/vlc/playlist/ns/0/" version="1">
+\t<title>Radio &amp; more</title>
+\t<trackList>
+\t\t<track>
+\t\t\t<location>http://radio.example/jazz</location>
+\t\t\t<title>Jazz FM</title>
+\t\t\t<extension application="http://www.videolan.org/vlc/playlist/0">
+\t\t\t\t<vlc:id>7</vlc:id>
+\t\t\t</extension>
+\t\t</track>
+\t\t<track>
+\t\t\t<location>http://radio.example/rock</location>
+\t\t\t<extension application="http://www.videolan.org/vlc/playlist/0">
+\t\t\t\t<vlc:id>3</vlc:id>
+\t\t\t</extension>
+\t\t</track>
+\t</trackList>
+\t<extension application="http://www.videolan.org/vlc/playlist/0">
+\t\t<vlc:node title="music">
+\t\t\t<vlc:item tid="7"/>
+\t\t</vlc:node>
+\t\t<vlc:item tid="3"/>
+\t</extension>
+</playlist>
+"""
+
+NO_MUSIC_NODE = """<?xml version="1.0" encoding="UTF-8"?>
+<playlist xmlns="http://xspf.org/ns/0/" xmlns:vlc="http://www.videolan.org/vlc/playlist/ns/0/" version="1">
+<title>Radio</title><trackList><track><location>http://radio.example/jazz</location>
+<extension application="http://www.videolan.org/vlc/playlist/0"><vlc:id>0</vlc:id></extension></track></trackList>
+</playlist>
+"""
+
+LOCATIONS = ['Coltrane & Davis/<Live>', 'Zoé/Début']
+
+
+@pytest.fixture
+def start_file(tmp_path):
+    """
+    Write a start file
+    :return: A function (contents) -> path
+    """
+    def _start_file(contents=RADIO):
+        path = tmp_path / 'radio.xspf'
+        path.write_text(contents, encoding='UTF-8')
+
+        return str(path)
+
+    return _start_file
+
+
+def extended(path, locations=LOCATIONS):
+    start_playlist = StartPlaylist(path)
+
+    return start_playlist, [start_playlist.add_track("file:///" + location) for location in locations]
+
+
+def find_all(start_playlist, path):
+    return etree.fromstring(str(start_playlist).encode('UTF-8')).findall(
+        path, {'x': 'http://xspf.org/ns/0/', 'vlc': VLC_NS})
+
+
+def test_ids_continue_from_the_highest_id(start_file):
+    # pylint: disable=redefined-outer-name
+    start_playlist, ids = extended(start_file())
+
+    assert ids == [8, 9]
+    assert start_playlist.last_id == 9
+    assert extended(start_file(NO_MUSIC_NODE))[1] == [1, 2]
+
+
+def test_track_list_and_music_node_are_reused(start_file):
+    # pylint: disable=redefined-outer-name
+    start_playlist, _ = extended(start_file())
+
+    assert len(find_all(start_playlist, 'x:trackList')) == 1
+    assert [location.text for location in find_all(start_playlist, 'x:trackList/x:track/x:location')] == [
+        'http://radio.example/jazz', 'http://radio.example/rock', 'file:///Coltrane & Davis/<Live>',
+        'file:///Zoé/Début'
+    ]
+    assert len(find_all(start_playlist, 'x:extension/vlc:node')) == 1
+    assert [item.get('tid') for item in find_all(start_playlist, 'x:extension/vlc:node/vlc:item')] == ['7', '8', '9']
+    assert [item.get('tid') for item in find_all(start_playlist, 'x:extension/vlc:item')] == ['3']
+
+
+def test_music_node_created_when_missing(start_file):
+    # pylint: disable=redefined-outer-name
+    start_playlist, _ = extended(start_file(NO_MUSIC_NODE))
+
+    # In the last extension element, as PlaylistHandler.create_vlc_node adds it:
+    assert [item.get('tid') for item in find_all(
+        start_playlist, 'x:trackList/x:track[1]/x:extension/x:vlc_node/vlc:item')] == ['1', '2']
+
+
+@pytest.mark.parametrize('contents', [RADIO, NO_MUSIC_NODE])
+def test_same_playlist_as_the_soup(start_file, make_handler, contents):
+    # pylint: disable=redefined-outer-name
+    start_playlist, _ = extended(start_file(contents))
+    handler = make_handler(start_file=start_file(contents))
+    soup = handler.get_soup()
+
+    assert PlaylistHandler.add_soup_tracks(soup, LOCATIONS) == start_playlist.last_id
+    # The soup drops the whitespace of the start file, the documents are the same once indented:
+    assert indent_xml(str(start_playlist)) == indent_xml(str(soup))
+
+
+@pytest.mark.parametrize('pretty', [True, False])
+def test_same_file_as_the_soup_path(tmp_path, start_file, make_handler, write_flac, pretty):
+    # pylint: disable=redefined-outer-name
+    for name in ('Coltrane & Davis', 'Zoé'):
+        write_flac(tmp_path / 'music' / name / '01.flac')
+
+    for out_name, streaming in (('streamed', True), ('soup', False)):
+        handler = make_handler(start_file=start_file(), streaming=streaming, pretty=pretty,
+                               out_file=str(tmp_path / out_name / 'all.xspf'))
+        handler.read_db_catalogue = DirCatalogue
+
+        assert handler.make_playlists() == 10
+
+    streamed, soup = ((tmp_path / out_name / 'all.xspf').read_text() for out_name in ('streamed', 'soup'))
+
+    if pretty:
+        assert streamed == soup
+    else:
+        assert indent_xml(streamed) == indent_xml(soup)
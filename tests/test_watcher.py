@@ -0,0 +1,148 @@
+"""
+Tests of the watch mode: the folders the watchers report, and the playlists updated after the changes
+"""
+import os
+
+import pytest
+
+import handler as handler_module
+from dir_catalogue import DirCatalogue
+from watcher import InotifyWatcher, PollingWatcher, collect_changes, fs_type, on_network_fs
+
+from tests.helpers import touch_later
+
+MOUNTS = """\
+sysfs /sys sysfs rw 0 0
+/dev/sda1 / ext4 rw,relatime 0 0
+nas:/export/music /home/user/lan\\040mount nfs4 rw,relatime 0 0
+/dev/sdb1 /home/user/lan\\040mount/local ext4 rw 0 0
+//nas/share /mnt/share cifs rw 0 0
+"""
+
+
+@pytest.fixture
+def mounts_file(tmp_path):
+    path = tmp_path / 'mounts'
+    path.write_text(MOUNTS)
+
+    return str(path)
+
+
+def test_fs_type_of_the_longest_mount_point(mounts_file):
+    # pylint: disable=redefined-outer-name
+    assert fs_type('/home/user/lan mount/music/Album', mounts_file) == 'nfs4'
+    assert fs_type('/home/user/lan mount/local/Album', mounts_file) == 'ext4'
+    assert fs_type('/home/user/lan mountain', mounts_file) == 'ext4'
+    assert fs_type('/mnt/share', mounts_file) == 'cifs'
+    assert fs_type('/', str(mounts_file) + '.missing') is None
+
+
+def test_network_file_systems(mounts_file):
+    # pylint: disable=redefined-outer-name
+    assert on_network_fs('/home/user/lan mount/music', mounts_file)
+    assert on_network_fs('/mnt/share/music', mounts_file)
+    assert not on_network_fs('/home/user/music', mounts_file)
+
+
+def test_watcher_polls_network_file_systems(make_handler, monkeypatch, tmp_path):
+    os.makedirs(tmp_path / 'music')
+    monkeypatch.setattr(handler_module, 'on_network_fs', lambda path: True)
+    watcher = make_handler().make_watcher()
+
+    assert isinstance(watcher, PollingWatcher)
+    assert watcher.interval == handler_module.DEFAULT_POLL_INTERVAL
+
+
+def test_polling_watcher_reports_top_level_folders(tmp_path, write_flac):
+    write_flac(tmp_path / 'music' / 'Album' / 'CD1' / '01.flac')
+    write_flac(tmp_path / 'music' / 'Other' / '01.flac')
+    watcher = PollingWatcher(str(tmp_path / 'music'), 0.0)
+
+    assert watcher.read_changes() == set()
+
+    touch_later(write_flac(tmp_path / 'music' / 'Album' / 'CD1' / '02.flac'))
+    write_flac(tmp_path / 'music' / 'New' / '01.flac')
+    os.remove(tmp_path / 'music' / 'Other' / '01.flac')
+    os.rmdir(tmp_path / 'music' / 'Other')
+
+    assert watcher.read_changes() == {'Album', 'New', 'Other'}
+    assert watcher.read_changes() == set()
+
+
+def test_watchers_name_folders_relative_to_base(tmp_path, write_flac):
+    roots = [str(tmp_path / 'nas1' / 'music'), str(tmp_path / 'nas2' / 'music')]
+
+    for root in roots:
+        os.makedirs(os.path.join(root, 'Abba'))
+
+    watcher = PollingWatcher(roots, 0.0, str(tmp_path))
+    write_flac(tmp_path / 'nas2' / 'music' / 'Abba' / '01.flac')
+
+    assert watcher.read_changes() == {os.path.join('nas2', 'music', 'Abba')}
+
+
+def test_inotify_watcher_reports_nested_changes(tmp_path, write_flac):
+    os.makedirs(tmp_path / 'music' / 'Album')
+
+    try:
+        watcher = InotifyWatcher(str(tmp_path / 'music'))
+    except OSError as e:
+        pytest.skip(f"inotify not available: {e}")
+
+    try:
+        # Files written in a directory created after the watcher started are seen:
+        write_flac(tmp_path / 'music' / 'Album' / 'CD1' / '01.flac')
+        write_flac(tmp_path / 'music' / 'New' / '01.flac')
+
+        assert collect_changes(watcher, 0.2, 5.0) == {'Album', 'New'}
+        assert watcher.read_changes(0.0) == set()
+
+        write_flac(tmp_path / 'music' / 'Album' / 'CD1' / '02.flac')
+
+        assert watcher.read_changes(5.0) == {'Album'}
+    finally:
+        watcher.close()
+
+
+class _ScriptedWatcher:
+    def __init__(self, *changes):
+        self._changes = list(changes)
+
+    def read_changes(self, timeout=None):  # pylint: disable=missing-function-docstring,unused-argument
+        return self._changes.pop(0) if self._changes else set()
+
+
+def test_burst_of_changes_is_collected_once():
+    watcher = _ScriptedWatcher(set(), {'A'}, {'B'}, set(), {'C'})
+
+    assert collect_changes(watcher, 0.1, 10.0) == {'A', 'B'}
+    assert collect_changes(watcher, 0.1, 10.0) == {'C'}
+    assert collect_changes(_ScriptedWatcher({'A'}, None), 0.1, 10.0) is None
+
+
+def test_update_keeps_the_genres_of_the_db(tmp_path, make_handler, write_flac):
+    music_dir = tmp_path / 'music'
+    write_flac(music_dir / 'Album' / '01.flac', 'Rock')
+    write_flac(music_dir / 'Bach' / '01.flac', 'Choral')
+    handler = make_handler(multi=True)
+    db_catalogue = DirCatalogue([('Album', 'Jazz'), ('Bach', 'Choral')])
+    handler.read_db_catalogue = lambda: db_catalogue
+    handler.make_playlists()
+
+    # A track added to a folder the DB lists as Jazz, whose first file is tagged Rock:
+    write_flac(music_dir / 'Album' / '02.flac', 'Rock')
+
+    assert handler.update_playlists(['Album']) == []
+    assert handler.directories.dirs.get('Album').genre == 'Jazz'
+
+    # The DB lists the new genre once it has imported the change:
+    db_catalogue = DirCatalogue([('Album', 'Jazz, Rock'), ('Bach', 'Choral')])
+
+    assert handler.update_playlists(['Album']) == ['Jazz', 'Pop_etc']
+    assert 'Album' in (tmp_path / 'out' / 'pop_etc.xspf').read_text()
+
+    # A folder the DB does not list yet gets the genre of its first file:
+    write_flac(music_dir / 'New' / '01.flac', 'Rock')
+
+    assert handler.update_playlists(['New']) == ['Pop_etc']
+    assert handler.directories.dirs.get('New').genre == 'Rock'
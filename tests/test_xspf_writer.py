@@ -0,0 +1,97 @@
+"""
+Tests of the streaming XSPF writer: the document written is the one serialised from the BeautifulSoup tree, and
+indented in pretty mode as xmllint indents it
+"""
+import io
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from dir_catalogue import DirCatalogue
+from handler import PlaylistHandler
+from xspf_writer import indent_xml
+
+LOCATIONS = ['Abba/Gold', 'Simon & Garfunkel/<Live>', 'Zoé/Ünïcode "quoted" \'s\'', 'Björk/Début/01 — Human.flac']
+
+
+def soup_playlist(title, locations):
+    soup = PlaylistHandler.make_soup(title)
+    last_id = PlaylistHandler.add_soup_tracks(soup, locations)
+
+    return str(soup), last_id
+
+
+def streamed_playlist(title, locations, pretty=False):
+    out = io.StringIO()
+    last_id = PlaylistHandler.stream_tracks(out, title, locations, pretty=pretty)
+
+    return out.getvalue(), last_id
+
+
+def xmllint_format(xml_text):
+    return subprocess.run(['xmllint', '-format', '-'], input=xml_text.encode('UTF-8'), capture_output=True, check=True,
+                          env=dict(os.environ, XMLLINT_INDENT='    ')).stdout.decode('UTF-8')
+
+
+needs_xmllint = pytest.mark.skipif(not shutil.which('xmllint'), reason="xmllint is not installed")
+
+
+@pytest.mark.parametrize('title, locations', [
+    ('All', LOCATIONS),
+    ('Rock & <Roll> Café', LOCATIONS[1:3]),
+    ('Empty', []),
+])
+def test_writer_matches_the_soup(title, locations):
+    assert streamed_playlist(title, locations) == soup_playlist(title, locations)
+
+
+def test_escaping():
+    playlist, _ = streamed_playlist('R&B <live>', ['Simon & Garfunkel/<Live>'])
+
+    assert '<title>R&amp;B &lt;live&gt;</title>' in playlist
+    assert '<location>file:///Simon &amp; Garfunkel/&lt;Live&gt;</location>' in playlist
+
+
+def test_streamed_files_match_the_soup_files(tmp_path, make_handler, write_flac):
+    for name, genre in (('Bach & Sons', 'Choral'), ('Coltrane <Live>', 'Jazz'), ('Zoé', 'Rock')):
+        write_flac(tmp_path / 'music' / name / '01.flac', genre)
+
+    for out_name, streaming in (('streamed', True), ('soup', False)):
+        handler = make_handler(multi=True, streaming=streaming, out_file=str(tmp_path / out_name / 'all.xspf'))
+        handler.read_db_catalogue = DirCatalogue
+        handler.make_playlists()
+
+    for file_name in ('all.xspf', 'classical.xspf', 'jazz.xspf', 'pop_etc.xspf'):
+        assert (tmp_path / 'streamed' / file_name).read_text().replace(str(tmp_path / 'streamed'), 'OUT') == \
+            (tmp_path / 'soup' / file_name).read_text().replace(str(tmp_path / 'soup'), 'OUT')
+
+
+@needs_xmllint
+@pytest.mark.parametrize('locations', [LOCATIONS, []])
+def test_pretty_layout_is_the_xmllint_layout(locations):
+    playlist, _ = streamed_playlist('Rock & <Roll>', locations)
+    expected = xmllint_format(playlist)
+
+    assert streamed_playlist('Rock & <Roll>', locations, pretty=True)[0] == expected
+    assert indent_xml(playlist) == expected
+    assert indent_xml(soup_playlist('Rock & <Roll>', locations)[0]) == expected
+
+
+@needs_xmllint
+def test_start_file_copied_indented(tmp_path, make_handler, write_flac):
+    write_flac(tmp_path / 'music' / 'Coltrane' / '01.flac', 'Jazz')
+    start_file = tmp_path / 'radio.xspf'
+    start_file.write_text(streamed_playlist('Radio', ['http://radio.example/stream'])[0])
+
+    for out_name, pretty in (('pretty', True), ('plain', False)):
+        handler = make_handler(multi=True, pretty=pretty, start_file=str(start_file),
+                               out_file=str(tmp_path / out_name / 'all.xspf'))
+        handler.read_db_catalogue = DirCatalogue
+        handler.make_playlists()
+
+    assert (tmp_path / 'pretty' / 'radio.xspf').read_text() == xmllint_format(start_file.read_text())
+    assert (tmp_path / 'pretty' / 'jazz.xspf').read_text() == \
+        xmllint_format((tmp_path / 'plain' / 'jazz.xspf').read_text()).replace('/plain/', '/pretty/')
+    assert (tmp_path / 'plain' / 'radio.xspf').read_text() == start_file.read_text()
@@ -132,24 +132,6 @@ else
     input_dir="$music_path"
 fi
 
-temp_output_file="$playlist_path"/unformatted.xspf
-
 ## Use path appropriate to the host system in the directive below:
 # shellcheck source=/home/adam/scripts/xspf-gen/.venv/bin/activate
-. "$activate_path" && python "$python_pkg" "${f_option[@]}" -d "$input_dir" -o "$output_file" -m "$imulti" -c "$icfg" -e "$ienvcfg" && deactivate
-
-reformat_output() {
-    export XMLLINT_INDENT="    "
-    
-    for output_file in "${ofile%/*}"/*.xspf; do
-        mv "$output_file"  "$temp_output_file"
-
-        xmllint -format -recover "$temp_output_file" > "$output_file"
-
-        if [[ -f "$temp_output_file" ]]; then
-            rm "$temp_output_file"
-        fi
-    done
-}
-
-reformat_output
+. "$activate_path" && python "$python_pkg" "${f_option[@]}" -d "$input_dir" -o "$output_file" -m "$imulti" -c "$icfg" -e "$ienvcfg" --pretty && deactivate
@@ -0,0 +1,170 @@
+"""
+This module contains an output file that is replaced atomically and only when its contents change
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(file_path):
+    """
+    Compute the SHA-256 digest of a file
+    :param file_path: Path to the file
+    :return: The digest as bytes, None if the file cannot be read
+    """
+    digest = hashlib.sha256()
+
+    try:
+        with open(file_path, 'rb') as f_in:
+            while chunk := f_in.read(CHUNK_SIZE):
+                digest.update(chunk)
+    except OSError:
+        return None
+
+    return digest.digest()
+
+
+def _read_umask():
+    """
+    Read the umask of the process: from /proc on Linux, which leaves it untouched, otherwise by setting it and setting
+    it back, which is only safe before other threads create files, hence done once, when the module is imported
+    :return: The umask
+    """
+    try:
+        with open('/proc/self/status', encoding='ascii') as f_in:
+            for line in f_in:
+                if line.startswith('Umask:'):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError, IndexError):
+        pass
+
+    umask = os.umask(0o077)
+    os.umask(umask)
+
+    return umask
+
+
+# The permissions of a new file, as open() would create it:
+NEW_FILE_MODE = 0o666 & ~_read_umask()
+
+
+class AtomicOutput:
+    """
+    This class is a text file that is written to a temporary file beside its destination and moved into place with
+    os.replace when it is closed, so readers of the destination never see a partly written file. With
+    skip_unchanged, the contents are hashed as they are written and the destination is left untouched (no new
+    mtime, no reload by players or file sync) if it already holds the same contents.
+    """
+
+    def __init__(self, file_path, skip_unchanged=False, encoding='UTF-8', mode=None):
+        """
+        :param file_path: The path to the destination file
+        :param skip_unchanged: True to leave the destination untouched if it already has the same contents
+        :param encoding: The encoding of the text written
+        :param mode: The permissions of the file, e.g. 0o600 for a private file; by default, those of the destination
+        it replaces, or those of a new file, see NEW_FILE_MODE (0o666 less the umask the process had when this module
+        was imported)
+        """
+        self._file_path = os.path.abspath(file_path)
+        self._skip_unchanged = skip_unchanged
+        self._encoding = encoding
+        self._mode = mode
+        self._digest = hashlib.sha256()
+        self._bytes_written = 0
+        self._changed = None
+
+        fd, self._tmp_path = tempfile.mkstemp(
+            prefix=f".{os.path.basename(self._file_path)}.", suffix=".tmp", dir=os.path.dirname(self._file_path)
+        )
+        self._tmp_file = os.fdopen(fd, 'wb')
+
+    @property
+    def file_path(self):  # pylint: disable=missing-function-docstring
+        return self._file_path
+
+    @property
+    def bytes_written(self):  # pylint: disable=missing-function-docstring
+        return self._bytes_written
+
+    @property
+    def changed(self):
+        """
+        Tells whether the destination file was replaced.
+        :return: True if it was replaced, False if it already had the same contents, None until the file is closed
+        """
+        return self._changed
+
+    def write(self, data):
+        """
+        Write text or bytes to the file.
+        :param data: A string (encoded with the file encoding) or bytes
+        :return: The number of bytes written
+        """
+        if isinstance(data, str):
+            data = data.encode(self._encoding)
+
+        self._digest.update(data)
+        self._bytes_written += len(data)
+
+        return self._tmp_file.write(data)
+
+    def _is_unchanged(self):
+        try:
+            if os.path.getsize(self._file_path) != self._bytes_written:
+                return False
+        except OSError:
+            return False
+
+        return file_digest(self._file_path) == self._digest.digest()
+
+    def close(self):
+        """
+        Close the file and move it into place, unless skip_unchanged is set and the destination has the same contents.
+        :return: True if the destination file was replaced, otherwise False
+        """
+        if self._changed is not None:
+            return self._changed
+
+        self._tmp_file.close()
+
+        if self._skip_unchanged and self._is_unchanged():
+            os.unlink(self._tmp_path)
+            self._changed = False
+            return self._changed
+
+        if self._mode is not None:
+            os.chmod(self._tmp_path, self._mode)
+        elif os.path.exists(self._file_path):
+            shutil.copymode(self._file_path, self._tmp_path)
+        else:
+            os.chmod(self._tmp_path, NEW_FILE_MODE)
+
+        os.replace(self._tmp_path, self._file_path)
+        self._changed = True
+
+        return self._changed
+
+    def discard(self):
+        """
+        Close the file and remove it, leaving the destination untouched.
+        :return: void
+        """
+        self._tmp_file.close()
+
+        if os.path.exists(self._tmp_path):
+            os.unlink(self._tmp_path)
+
+        self._changed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.discard()
+            return
+
+        self.close()
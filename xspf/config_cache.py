@@ -0,0 +1,100 @@
+"""
+This module contains the cache of the compiled configuration files
+"""
+import json
+import logging
+import os
+
+from atomic_output import AtomicOutput, file_digest
+
+logger = logging.getLogger(__name__)
+
+# Changes when the layout of the cache file, or the way a configuration file is compiled, changes; version 1 also
+# kept the environment config, with the DB password, so its files are replaced:
+CONFIG_CACHE_VERSION = 2
+
+
+class ConfigCache:
+    """
+    This class keeps configuration files compiled into plain data (e.g. the genre playlist lists parsed from YAML) in a
+    JSON file, so a run in which they have not changed does not parse them again, nor import their parser. An entry is
+    valid while its source file has the same size and modification time, or, if these changed, the same SHA-256 hash.
+    Files holding secrets (the environment config with the DB password) are not meant to be cached; the cache file is
+    private (mode 0600) all the same.
+    """
+
+    def __init__(self, file_path):
+        self._file_path = os.path.abspath(os.path.expanduser(file_path))
+        self._entries = None
+
+    @property
+    def file_path(self):  # pylint: disable=missing-function-docstring
+        return self._file_path
+
+    def _load(self):
+        if self._entries is not None:
+            return self._entries
+
+        self._entries = {}
+
+        try:
+            with open(self._file_path, encoding='UTF-8') as f_in:
+                contents = json.load(f_in)
+        except FileNotFoundError:
+            return self._entries
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring the config cache %s: %s", self._file_path, e)
+            return self._entries
+
+        if isinstance(contents, dict) and contents.get("version") == CONFIG_CACHE_VERSION:
+            self._entries = contents.get("entries", {})
+
+        return self._entries
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self._file_path), exist_ok=True)
+
+            with AtomicOutput(self._file_path, mode=0o600) as out:
+                out.write(json.dumps({"version": CONFIG_CACHE_VERSION, "entries": self._entries},
+                                     separators=(',', ':')))
+        except OSError as e:
+            logger.warning("Cannot save the config cache %s: %s", self._file_path, e)
+
+    def get(self, src_path, kind, compile_file):
+        """
+        Get the compiled contents of a configuration file, compiling and caching them if the file changed
+        :param src_path: The path to the configuration file
+        :param kind: The name of the way the file is compiled, e.g. 'genre_lists'
+        :param compile_file: A function taking the path to the file and returning its compiled contents as data that
+        can be saved as JSON, or None if the file cannot be compiled (returned, but not cached)
+        :return: The compiled contents
+        :raise OSError: If the configuration file cannot be read
+        """
+        src_path = os.path.abspath(src_path)
+        src_stat = os.stat(src_path)
+        key = f"{kind}:{src_path}"
+        entry = self._load().get(key)
+
+        if entry and entry["size"] == src_stat.st_size and entry["mtime_ns"] == src_stat.st_mtime_ns:
+            return entry["data"]
+
+        digest = file_digest(src_path)
+
+        if digest is None:
+            raise OSError(f"Cannot read {src_path}")
+
+        if entry and entry["sha256"] == digest.hex():
+            entry.update(size=src_stat.st_size, mtime_ns=src_stat.st_mtime_ns)
+            self._save()
+            return entry["data"]
+
+        logger.debug("Compiling %s (%s)", src_path, kind)
+        data = compile_file(src_path)
+
+        if data is not None:
+            self._entries[key] = {"size": src_stat.st_size, "mtime_ns": src_stat.st_mtime_ns,
+                                  "sha256": digest.hex(), "data": data}
+            self._save()
+
+        return data
@@ -0,0 +1,124 @@
+"""
+This module contains the local snapshot of the album folders and genres read from the DB
+"""
+import json
+import logging
+import os
+import sys
+from array import array
+from datetime import datetime
+from typing import NamedTuple
+
+from atomic_output import AtomicOutput
+from dir_catalogue import DirCatalogue
+
+logger = logging.getLogger(__name__)
+
+# The first line of a snapshot file; the number changes when the layout or the contents of the file change:
+SNAPSHOT_MAGIC = b'XSPF-DB-SNAPSHOT 1\n'
+
+
+class Snapshot(NamedTuple):
+    """
+    This class represents the contents of a snapshot file
+    """
+    signature: list
+    saved: str
+    catalogue: DirCatalogue
+
+
+class DbSnapshot:
+    """
+    This class keeps the album folders and genres last read from the DB in a file, with the signature of the DB at
+    the time (see PlaylistHandler.read_db_signature()), so a run in which the signature has not changed skips the
+    query of the folders, and a run in which the DB cannot be reached uses the last snapshot instead of scanning the
+    directory. The file holds the storage of the DirCatalogue as it is in memory: a short JSON header (the signature,
+    the genre strings and the sizes), then the folder names buffer, the name offsets and the genre string IDs, so it
+    is read without parsing a row per folder.
+    """
+
+    def __init__(self, file_path):
+        self._file_path = os.path.abspath(os.path.expanduser(file_path))
+
+    @property
+    def file_path(self):  # pylint: disable=missing-function-docstring
+        return self._file_path
+
+    @staticmethod
+    def _read_array(f_in, count):
+        values = array('I')
+        values.frombytes(f_in.read(count * values.itemsize))
+
+        if len(values) != count:
+            raise ValueError("Truncated snapshot")
+
+        return values
+
+    def load(self, signature=None):
+        """
+        Read the snapshot
+        :param signature: The current signature of the DB, the snapshot is only read if it was saved with the same
+        signature; None to read it whatever its signature
+        :return: A Snapshot instance, None if there is no valid snapshot (with the signature)
+        """
+        try:
+            with open(self._file_path, 'rb') as f_in:
+                if f_in.readline() != SNAPSHOT_MAGIC:
+                    raise ValueError("Not a snapshot file")
+
+                header = json.loads(f_in.readline())
+
+                if signature is not None and header["signature"] != list(signature):
+                    return None
+
+                if header["byteorder"] != sys.byteorder:
+                    raise ValueError("Snapshot saved on another platform")
+
+                names = f_in.read(header["names_size"])
+
+                if len(names) != header["names_size"]:
+                    raise ValueError("Truncated snapshot")
+
+                offsets = self._read_array(f_in, header["folders"] + 1)
+                genre_ids = self._read_array(f_in, header["folders"])
+                catalogue = DirCatalogue.from_storage(names, offsets, header["genre_strings"], genre_ids)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("Ignoring the DB snapshot %s: %s", self._file_path, e)
+            return None
+
+        return Snapshot(signature=header["signature"], saved=header["saved"], catalogue=catalogue)
+
+    def save(self, signature, catalogue):
+        """
+        Replace the snapshot, atomically
+        :param signature: The signature of the DB the folders were read from, a list of values that can be saved as
+        JSON
+        :param catalogue: A DirCatalogue instance
+        :return: True if the snapshot was saved
+        """
+        names, offsets, genre_strings, genre_ids = catalogue.storage()
+        header = {
+            "signature": list(signature),
+            "saved": datetime.now().isoformat(timespec='seconds'),
+            "byteorder": sys.byteorder,
+            "folders": len(genre_ids),
+            "names_size": len(names),
+            "genre_strings": genre_strings,
+        }
+
+        try:
+            os.makedirs(os.path.dirname(self._file_path), exist_ok=True)
+
+            with AtomicOutput(self._file_path) as out:
+                out.write(SNAPSHOT_MAGIC)
+                out.write(json.dumps(header, separators=(',', ':')) + '\n')
+                out.write(names)
+                out.write(offsets.tobytes())
+                out.write(genre_ids.tobytes())
+        except OSError as e:
+            logger.warning("Cannot save the DB snapshot %s: %s", self._file_path, e)
+            return False
+
+        return True
@@ -0,0 +1,229 @@
+"""
+This module contains the access layer of the PostgreSQL database the album folders and songs are read from
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Defaults of the settings that can be added to the environment config file (.env_db):
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_STATEMENT_TIMEOUT = 30.0
+DEFAULT_RETRIES = 1
+DEFAULT_RETRY_DELAY = 0.5
+DEFAULT_RETRY_AFTER = 60.0
+DEFAULT_POOL_SIZE = 2
+
+# TCP keepalives, so a connection kept open by a long-lived process notices a DB host that went away:
+KEEPALIVE_SETTINGS = {"keepalives": 1, "keepalives_idle": 60, "keepalives_interval": 10, "keepalives_count": 3}
+
+
+class DbUnavailable(Exception):
+    """
+    This exception is raised when the DB cannot be used: not configured, not reachable within the connect timeout,
+    recently found unreachable, or a query failed or timed out
+    """
+
+
+def _cfg_value(db_cfg, name, convert, default):
+    value = str(db_cfg.get(name, '')).strip()
+
+    if not value:
+        return default
+
+    try:
+        return convert(value)
+    except ValueError:
+        logger.warning("Ignoring %s=%s, not a valid value", name, value)
+        return default
+
+
+class DbSource:
+    """
+    This class hands out DB connections from a small pool and runs the queries of the playlist handler through named
+    (server-side) cursors. The connections are opened on first use and kept open between queries, so a long-lived
+    process (watch mode) does not reconnect for each update. The settings are read from the environment config
+    file: besides DB_HOST (the local Unix socket when it is not set), DB_PORT, DB_NAME, DB_USER and DB_PASS,
+
+    * DB_CONNECT_TIMEOUT: seconds to wait for a connection (libpq waits at least 2 s)
+    * DB_STATEMENT_TIMEOUT: seconds after which the server cancels a query, 0 for no limit
+    * DB_RETRIES: the number of times a failed connection attempt is retried
+    * DB_RETRY_DELAY: seconds between connection attempts
+    * DB_RETRY_AFTER: seconds during which the DB is not tried again after it could not be reached
+    * DB_POOL_SIZE: the largest number of connections kept open
+
+    Any failure is raised as DbUnavailable, so the caller can fall back to scanning the file system; once the DB
+    could not be reached or a connection was lost, later queries fail at once until DB_RETRY_AFTER has passed, so the
+    fallback starts without waiting for the connect timeout again. A query that failed on a working connection (e.g.
+    cancelled by the statement timeout) does not keep the DB from being tried by the next query.
+    """
+
+    def __init__(self, db_cfg=None, conn=None):
+        """
+        :param db_cfg: A dict of the settings, see get_config(), None if a connection is given
+        :param conn: An open connection to use instead of the pool, e.g. when embedding the handler; it is not closed
+        by close()
+        """
+        db_cfg = db_cfg if db_cfg else {}
+        self._conn = conn
+        self._pool = None
+        self._lock = threading.Lock()
+        self._down_until = 0.0
+        self._connect_timeout = _cfg_value(db_cfg, 'DB_CONNECT_TIMEOUT', int, DEFAULT_CONNECT_TIMEOUT)
+        self._statement_timeout = _cfg_value(db_cfg, 'DB_STATEMENT_TIMEOUT', float, DEFAULT_STATEMENT_TIMEOUT)
+        self._retries = max(0, _cfg_value(db_cfg, 'DB_RETRIES', int, DEFAULT_RETRIES))
+        self._retry_delay = _cfg_value(db_cfg, 'DB_RETRY_DELAY', float, DEFAULT_RETRY_DELAY)
+        self._retry_after = _cfg_value(db_cfg, 'DB_RETRY_AFTER', float, DEFAULT_RETRY_AFTER)
+        self._pool_size = max(1, _cfg_value(db_cfg, 'DB_POOL_SIZE', int, DEFAULT_POOL_SIZE))
+        self._connect_args = {
+            "host": str(db_cfg.get('DB_HOST', '')).strip() or None,
+            "port": _cfg_value(db_cfg, 'DB_PORT', int, None),
+            "database": str(db_cfg.get('DB_NAME', '')).strip(),
+            "user": db_cfg.get('DB_USER'),
+            "password": db_cfg.get('DB_PASS'),
+        }
+
+    @property
+    def conn(self):  # pylint: disable=missing-function-docstring
+        return self._conn
+
+    @property
+    def configured(self):
+        """
+        Check if there is a DB to connect to
+        :return: True if a connection was given or the DB name is set
+        """
+        return self._conn is not None or bool(self._connect_args["database"])
+
+    @property
+    def available(self):
+        """
+        Check if the DB may be tried
+        :return: False if the DB is not configured or could not be reached less than DB_RETRY_AFTER seconds ago
+        """
+        return self.configured and time.monotonic() >= self._down_until
+
+    def _connect_kwargs(self):
+        kwargs = dict(self._connect_args, connect_timeout=max(1, self._connect_timeout), **KEEPALIVE_SETTINGS)
+
+        if self._statement_timeout > 0:
+            kwargs["options"] = f"-c statement_timeout={int(self._statement_timeout * 1000)}"
+
+        return {name: value for name, value in kwargs.items() if value is not None}
+
+    def _get_pool(self):
+        if self._pool is None:
+            from psycopg2.pool import ThreadedConnectionPool  # pylint: disable=import-outside-toplevel
+
+            # One connection is opened now and kept open between queries, the others are closed when given back:
+            self._pool = ThreadedConnectionPool(1, self._pool_size, **self._connect_kwargs())
+
+        return self._pool
+
+    def _mark_down(self, error):
+        self._down_until = time.monotonic() + self._retry_after
+        logger.warning("DB not available, not trying it again for %s s: %s", self._retry_after,
+                       str(error).strip())
+
+    def _get_conn(self):
+        """
+        Take a connection from the pool, connecting with retries
+        :return: A psycopg2 connection
+        """
+        import psycopg2  # pylint: disable=import-outside-toplevel
+        from psycopg2.pool import PoolError  # pylint: disable=import-outside-toplevel
+
+        if not self.available:
+            raise DbUnavailable("DB not configured" if not self.configured else "DB recently unreachable")
+
+        for attempt in range(self._retries + 1):
+            try:
+                with self._lock:
+                    conn = self._get_pool().getconn()
+
+                if not conn.closed:
+                    return conn
+
+                self._get_pool().putconn(conn, close=True)
+                raise psycopg2.OperationalError("connection closed")
+            except PoolError as e:
+                raise DbUnavailable(f"No DB connection left in the pool: {e}") from e
+            except psycopg2.OperationalError as e:
+                if attempt == self._retries:
+                    self._mark_down(e)
+                    raise DbUnavailable(str(e).strip()) from e
+
+                logger.debug("DB connection attempt %s failed, retrying: %s", attempt + 1, str(e).strip())
+                time.sleep(self._retry_delay)
+
+        raise DbUnavailable("DB not available")
+
+    @contextmanager
+    def connection(self):
+        """
+        Use a connection: the given connection, or one taken from the pool and given back afterwards, closed if it
+        broke. The transaction of a pooled connection is ended, so the connection is idle between queries; the
+        transaction of the given connection is left to its owner.
+        :return: A context manager yielding a psycopg2 connection
+        """
+        import psycopg2  # pylint: disable=import-outside-toplevel
+
+        if self._conn is not None:
+            yield self._conn
+            return
+
+        conn = self._get_conn()
+
+        try:
+            yield conn
+        finally:
+            broken = bool(conn.closed)
+
+            if not broken:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
+
+            self._get_pool().putconn(conn, close=broken)
+
+    def query(self, cursor_name, q_obj, batch_size):
+        """
+        Run a query through a named (server-side) cursor, fetching its rows in batches
+        :param cursor_name: The name of the cursor
+        :param q_obj: The query, a string or a psycopg2.sql.Composable
+        :param batch_size: The number of rows fetched per round trip
+        :return: A generator of lists of rows
+        """
+        import psycopg2  # pylint: disable=import-outside-toplevel
+
+        conn = None
+
+        try:
+            with self.connection() as conn:
+                with conn.cursor(name=cursor_name) as cursor:
+                    cursor.itersize = batch_size
+                    cursor.execute(q_obj)
+
+                    while fetch_results := cursor.fetchmany(batch_size):
+                        yield fetch_results
+        except psycopg2.OperationalError as e:
+            # Only a lost connection means the DB went away, a cancelled query (statement timeout) leaves it usable:
+            if conn is None or conn.closed:
+                self._mark_down(e)
+
+            raise DbUnavailable(str(e).strip()) from e
+        except psycopg2.Error as e:
+            raise DbUnavailable(str(e).strip()) from e
+
+    def close(self):
+        """
+        Close the connections of the pool, a later query opens new ones
+        :return: void
+        """
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
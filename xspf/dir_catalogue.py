@@ -0,0 +1,345 @@
+"""
+This module contains the compact, array-backed catalogue of the album directories listed for the playlists
+"""
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from collections.abc import Sequence
+from itertools import accumulate, chain, compress
+from typing import NamedTuple
+
+
+class DirItem(NamedTuple):
+    """
+    This class represents a single media directory
+    """
+    name: str
+    genre: str
+
+
+def merge_genres(genre, other_genre):
+    """
+    Merge two genre strings, keeping the order of the first one
+    :param genre: The genres of a folder, separated by ', '
+    :param other_genre: More genres of the folder, separated by ', '
+    :return: The genres of both strings without duplicates, separated by ', '
+    """
+    return ', '.join(dict.fromkeys(value for value in genre.split(', ') + other_genre.split(', ') if value))
+
+
+class DirCatalogue(Sequence):
+    """
+    This class is a read-only sequence of DirItem instances, stored compactly instead of as one tuple and two strings
+    per folder: the folder names are encoded once into a single buffer indexed by an array of offsets, and the genre
+    strings are interned, each folder holding the small integer ID of its genre string, with the genres of each genre
+    string as a bitset. A folder listed more than once (e.g. once per genre) is stored once, with the genres merged.
+    DirItem instances are built when the folders are read, the catalogue keeps none.
+
+    Folders listed in name order, as the DB and the file system scan list them, are searched by name with a binary
+    search of the catalogue itself; otherwise an index of the rows sorted by name is built. Routing and filtering
+    work on the genre string IDs, so a genre string is split once however many folders share it. take(),
+    take_genre_strings() and select() return views of the catalogue, sharing its storage, that hold the rows they
+    include as an array of integers.
+    """
+    __slots__ = ('_names', '_offsets', '_genre_strings', '_genre_masks', '_genres', '_genre_ids', '_by_name',
+                 '_string_rows', '_rows')
+
+    def __init__(self, folders=()):
+        """
+        Build the catalogue
+        :param folders: An iterable of DirItem instances or (name, genre) tuples, in the order to keep
+        """
+        names = bytearray()
+        self._offsets = array('I', [0])
+        self._genre_ids = array('I')
+        self._genre_strings = []
+        self._genre_masks = []
+        self._genres = {}
+        self._rows = None
+        self._by_name = None
+        self._string_rows = None
+        # Only used while the catalogue is built, the rows by name once the folders are found not to be in order:
+        string_ids = {}
+        rows = None
+        last_name = b''
+
+        for name, genre in folders:
+            name_bytes = name.encode('UTF-8', errors='surrogateescape')
+
+            if rows is None and name_bytes <= last_name and self._genre_ids:
+                offsets = self._offsets
+                rows = {bytes(names[offsets[row]:offsets[row + 1]]): row for row in range(len(self._genre_ids))}
+
+            row = (len(self._genre_ids) - 1 if name_bytes == last_name and self._genre_ids else None) \
+                if rows is None else rows.get(name_bytes)
+
+            if row is not None:
+                genre = merge_genres(self._genre_strings[self._genre_ids[row]], genre)
+                self._genre_ids[row] = self._intern_genre(genre, string_ids)
+                continue
+
+            if rows is not None:
+                rows[name_bytes] = len(self._genre_ids)
+
+            names += name_bytes
+            self._offsets.append(len(names))
+            self._genre_ids.append(self._intern_genre(genre, string_ids))
+            last_name = name_bytes
+
+        self._names = bytes(names)
+
+        if rows is not None:
+            self._by_name = array('I', (row for _, row in sorted(rows.items())))
+
+    @classmethod
+    def from_storage(cls, names, offsets, genre_strings, genre_ids):
+        """
+        Rebuild a catalogue from its storage, e.g. read from a file, see storage()
+        :param names: The UTF-8 encoded folder names, one after another, as bytes
+        :param offsets: An array('I') of the offset of each name in names, followed by the length of names
+        :param genre_strings: A list of the distinct genre strings
+        :param genre_ids: An array('I') of the genre string ID of each folder
+        :return: A DirCatalogue instance
+        :raise ValueError: If the parts do not fit together
+        """
+        if len(offsets) != len(genre_ids) + 1 or offsets[0] != 0 or offsets[-1] != len(names) or \
+                len(set(genre_strings)) != len(genre_strings) or (genre_ids and max(genre_ids) >= len(genre_strings)):
+            raise ValueError("Inconsistent DirCatalogue storage")
+
+        catalogue = cls()
+        catalogue._names = bytes(names)  # pylint: disable=protected-access
+        catalogue._offsets = offsets  # pylint: disable=protected-access
+        catalogue._genre_ids = genre_ids  # pylint: disable=protected-access
+        string_ids = {}
+
+        for genre in genre_strings:
+            catalogue._intern_genre(genre, string_ids)  # pylint: disable=protected-access
+
+        by_name = sorted(range(len(genre_ids)), key=catalogue._name_bytes)  # pylint: disable=protected-access
+
+        if any(row != position for position, row in enumerate(by_name)):
+            catalogue._by_name = array('I', by_name)  # pylint: disable=protected-access
+
+        return catalogue
+
+    def storage(self):
+        """
+        The storage of the catalogue, to save it, see from_storage(); a view is copied into a catalogue of its own
+        first
+        :return: A tuple (names as bytes, array of the name offsets, list of the genre strings, array of the genre
+        string IDs)
+        """
+        if self._rows is not None:
+            return DirCatalogue(self).storage()
+
+        return self._names, self._offsets, self._genre_strings, self._genre_ids
+
+    def _intern_genre(self, genre, string_ids):
+        string_id = string_ids.get(genre)
+
+        if string_id is None:
+            string_id = string_ids[genre] = len(self._genre_strings)
+            self._genre_strings.append(genre)
+            self._genre_masks.append(self.genre_mask(value for value in genre.split(', ') if value))
+
+        return string_id
+
+    def _name_bytes(self, row):
+        return self._names[self._offsets[row]:self._offsets[row + 1]]
+
+    def _view(self, rows):
+        view = object.__new__(DirCatalogue)
+
+        for slot in self.__slots__:
+            setattr(view, slot, getattr(self, slot))
+
+        view._rows = rows  # pylint: disable=protected-access
+
+        return view
+
+    def _all_rows(self):
+        return self._rows if self._rows is not None else range(len(self._genre_ids))
+
+    def _row(self, index):
+        return self._rows[index] if self._rows is not None else index
+
+    def _item(self, row):
+        return DirItem(name=self._name_bytes(row).decode('UTF-8', errors='surrogateescape'),
+                       genre=self._genre_strings[self._genre_ids[row]])
+
+    def __len__(self):
+        return len(self._rows) if self._rows is not None else len(self._genre_ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+
+        if not 0 <= index < len(self):
+            raise IndexError("DirCatalogue index out of range")
+
+        return self._item(self._row(index))
+
+    def __iter__(self):
+        genre_ids, genre_strings = self._genre_ids, self._genre_strings
+
+        return (DirItem(name=name, genre=genre_strings[genre_ids[row]])
+                for row, name in zip(self._all_rows(), self.names()))
+
+    def names(self):
+        """
+        Iterate over the names of the folders, without building DirItem instances
+        :return: A generator of folder names
+        """
+        names, offsets = self._names, self._offsets
+
+        return (names[offsets[row]:offsets[row + 1]].decode('UTF-8', errors='surrogateescape')
+                for row in self._all_rows())
+
+    def __contains__(self, item):
+        """
+        Check if a folder is in the catalogue, with a binary search of the names
+        :param item: A folder name or a DirItem instance, which must have the same genre string
+        :return: True if the folder is in the catalogue
+        """
+        name = item.name if isinstance(item, DirItem) else item
+        row = self.find_row(name)
+
+        if row is None:
+            return False
+
+        return not isinstance(item, DirItem) or self._genre_strings[self._genre_ids[row]] == item.genre
+
+    def find_row(self, name):
+        """
+        Find the storage row of a folder of this catalogue or view
+        :param name: The name of the folder
+        :return: The row, None if the folder is not in the catalogue
+        """
+        name_bytes = name.encode('UTF-8', errors='surrogateescape')
+        by_name = self._by_name if self._by_name is not None else range(len(self._genre_ids))
+        position = bisect_left(by_name, name_bytes, key=self._name_bytes)
+
+        if position == len(by_name) or self._name_bytes(by_name[position]) != name_bytes:
+            return None
+
+        row = by_name[position]
+
+        if self._rows is None:
+            return row
+
+        # The rows of a view are in ascending order:
+        position = bisect_left(self._rows, row)
+
+        return row if position < len(self._rows) and self._rows[position] == row else None
+
+    def get(self, name, default=None):
+        """
+        Get a folder by name
+        :param name: The name of the folder
+        :param default: The value to return if the folder is not in the catalogue
+        :return: A DirItem instance
+        """
+        row = self.find_row(name)
+
+        return self._item(row) if row is not None else default
+
+    def genre_mask(self, genres):
+        """
+        Build the bitset of genres, adding the genres not seen yet to the genre vocabulary of the catalogue
+        :param genres: An iterable of genres
+        :return: An int with the bit of each genre set
+        """
+        mask = 0
+
+        for genre in genres:
+            bit = self._genres.setdefault(genre, len(self._genres))
+            mask |= 1 << bit
+
+        return mask
+
+    @property
+    def genres(self):
+        """
+        The genres of the folders of the catalogue (and of the catalogue it is a view of)
+        :return: A tuple of the genres, in the order they were first seen
+        """
+        return tuple(self._genres)
+
+    @property
+    def genre_strings(self):
+        """
+        The distinct genre strings of the folders of the catalogue (and of the catalogue it is a view of)
+        :return: A tuple of genre strings, indexed by genre string ID
+        """
+        return tuple(self._genre_strings)
+
+    def take(self, indexes):
+        """
+        Build a view of some of the folders
+        :param indexes: An iterable of indexes in this catalogue or view, in ascending order
+        :return: A DirCatalogue instance sharing the storage of this catalogue
+        """
+        return self._view(array('I', (self._row(index) for index in indexes)))
+
+    def take_genre_strings(self, string_ids):
+        """
+        Build a view of the folders with some genre strings, filtering the folders in a single pass in C
+        :param string_ids: An iterable of genre string IDs, see genre_strings
+        :return: A DirCatalogue instance sharing the storage of this catalogue
+        """
+        if self._rows is None:
+            rows, starts = self._group_rows()
+
+            # The rows of each genre string are in ascending order, sorting merges them:
+            return self._view(array('I', sorted(chain.from_iterable(
+                rows[starts[string_id]:starts[string_id + 1]] for string_id in set(string_ids)
+            ))))
+
+        flags = bytearray(len(self._genre_strings))
+
+        for string_id in string_ids:
+            flags[string_id] = 1
+
+        row_flags = map(flags.__getitem__, map(self._genre_ids.__getitem__, self._rows))
+
+        return self._view(array('I', compress(self._rows, row_flags)))
+
+    def _group_rows(self):
+        """
+        Group the rows of the catalogue by genre string, once
+        :return: A tuple (array of the rows ordered by genre string ID, then by row; array of the position of the
+        first row of each genre string ID in it, followed by the number of rows)
+        """
+        if self._string_rows is None:
+            counts = Counter(self._genre_ids)
+            starts = array('I', accumulate((counts[string_id] for string_id in range(len(self._genre_strings))),
+                                           initial=0))
+            self._string_rows = (array('I', sorted(range(len(self._genre_ids)), key=self._genre_ids.__getitem__)),
+                                 starts)
+
+        return self._string_rows
+
+    def select(self, genres):
+        """
+        Filter the folders by genre
+        :param genres: An iterable of genres
+        :return: A view of the folders that have any of the genres, see take_genre_strings()
+        """
+        mask = sum(1 << self._genres[genre] for genre in set(genres) if genre in self._genres)
+
+        return self.take_genre_strings(string_id for string_id, string_mask in enumerate(self._genre_masks)
+                                       if string_mask & mask)
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence) or len(self) != len(other):
+            return False
+
+        return all(item == other_item for item, other_item in zip(self, other))
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"DirCatalogue({len(self)} folders, {len(self._genre_strings)} genre strings)"
@@ -0,0 +1,204 @@
+"""
+This module contains the lazy directory walker that looks for the first media file below an album directory
+"""
+import os
+from typing import NamedTuple
+
+
+class FirstMedia(NamedTuple):
+    """
+    This class represents the result of a search for the first media file below a directory
+    """
+    path: str | None
+    dirs_scanned: int
+    entries_examined: int
+
+
+class MediaFiles(NamedTuple):
+    """
+    This class represents the media files found below a directory
+    """
+    paths: list
+    dirs_scanned: int
+    entries_examined: int
+
+
+def has_media_extension(name, extensions):
+    """
+    Check the extension of a file name, the way has_media always has (case-sensitive, the text after the last dot)
+    :param name: The file name
+    :param extensions: A collection of extensions without the dot
+    :return: True if the name has one of the extensions
+    """
+    return name.rsplit(".", maxsplit=1)[-1] in extensions
+
+
+def _is_dir(entry):
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
+def _scan_dir(dir_path, extensions, keep_dirs, media_paths=None):
+    """
+    Read a directory until a media file is found, or to the end to collect all its media files
+    :param dir_path: Path to the directory
+    :param extensions: A collection of the media file extensions, without the dot
+    :param keep_dirs: True to collect the subdirectories to visit
+    :param media_paths: A list to which to append the paths of all the media files, sorted by name, None to stop at
+    the first one; the subdirectories are then sorted by name too
+    :return: A tuple (path to the first media file or None, list of the DirEntry of the subdirectories to visit,
+    number of entries examined)
+    """
+    sub_dirs = []
+    entries_examined = 0
+    first_new = len(media_paths) if media_paths is not None else 0
+
+    try:
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                entries_examined += 1
+
+                if not _is_dir(entry):
+                    if not has_media_extension(entry.name, extensions):
+                        continue
+
+                    if media_paths is None:
+                        return entry.path, [], entries_examined
+
+                    media_paths.append(entry.path)
+                elif keep_dirs and not entry.is_symlink():
+                    sub_dirs.append(entry)
+    except OSError:
+        pass
+
+    if media_paths is not None:
+        media_paths[first_new:] = sorted(media_paths[first_new:])
+        sub_dirs.sort(key=lambda entry: entry.name)
+
+    return None, sub_dirs, entries_examined
+
+
+def _record_mtime(dir_mtimes, dir_path):
+    """
+    Record the modification time of a directory about to be read, so a change to its entries after it was read is
+    seen, see ScanCache
+    :param dir_mtimes: A dict of directory path -> modification time (ns) to update, None not to record it
+    :param dir_path: Path to the directory
+    :return: void
+    """
+    if dir_mtimes is None:
+        return
+
+    try:
+        dir_mtimes[dir_path] = os.stat(dir_path).st_mtime_ns
+    except OSError:
+        dir_mtimes[dir_path] = None
+
+
+def find_first_media(dir_path, extensions, max_depth=None, dir_mtimes=None):
+    """
+    Find the first media file below a directory, in the order os.walk would list it (top-down, the files of a
+    directory before those of its subdirectories), with os.scandir. The search stops at the first media file, reads
+    each directory at most once and keeps only the subdirectories still to visit: file names are checked as they are
+    read, and the type of each entry comes from the directory listing (DirEntry), so no file is stat'ed on file
+    systems that report entry types. Like os.walk, symbolic links to directories are not followed and unreadable
+    directories are skipped.
+    :param dir_path: Path to the directory
+    :param extensions: A collection of the media file extensions, without the dot
+    :param max_depth: The deepest directory level to search, 0 for the directory itself only, None for no limit
+    :param dir_mtimes: A dict to which to add the modification time of each subdirectory read, taken before it is
+    read, None not to stat them
+    :return: A FirstMedia instance, with a None path if there is no media file
+    """
+    dirs_scanned = 0
+    entries_examined = 0
+    # A stack of iterators over the directories still to visit at each level, with the depth of the level:
+    pending = [(iter((dir_path,)), 0)]
+
+    while pending:
+        level_dirs, depth = pending[-1]
+        curr_dir = next(level_dirs, None)
+
+        if curr_dir is None:
+            pending.pop()
+            continue
+
+        if depth:
+            _record_mtime(dir_mtimes, curr_dir)
+
+        media_path, sub_dirs, examined = _scan_dir(curr_dir, extensions, max_depth is None or depth < max_depth)
+        dirs_scanned += 1
+        entries_examined += examined
+
+        if media_path:
+            return FirstMedia(media_path, dirs_scanned, entries_examined)
+
+        if sub_dirs:
+            pending.append(((entry.path for entry in sub_dirs), depth + 1))
+
+    return FirstMedia(None, dirs_scanned, entries_examined)
+
+
+def list_media_files(dir_path, extensions, max_depth=None, dir_mtimes=None):
+    """
+    List all the media files below a directory, top-down like os.walk, but with the files and the subdirectories of
+    each directory sorted by name, so the tracks of an album (01, 02, 03...) and its discs are listed in order
+    whatever order the file system returns them in; each directory is read once with os.scandir, taking the type of
+    each entry from the directory listing, like find_first_media()
+    :param dir_path: Path to the directory
+    :param extensions: A collection of the media file extensions, without the dot
+    :param max_depth: The deepest directory level to search, 0 for the directory itself only, None for no limit
+    :param dir_mtimes: A dict to which to add the modification time of each subdirectory read, taken before it is
+    read, None not to stat them
+    :return: A MediaFiles instance
+    """
+    media_paths = []
+    dirs_scanned = 0
+    entries_examined = 0
+    pending = [(iter((dir_path,)), 0)]
+
+    while pending:
+        level_dirs, depth = pending[-1]
+        curr_dir = next(level_dirs, None)
+
+        if curr_dir is None:
+            pending.pop()
+            continue
+
+        if depth:
+            _record_mtime(dir_mtimes, curr_dir)
+
+        _, sub_dirs, examined = _scan_dir(curr_dir, extensions, max_depth is None or depth < max_depth, media_paths)
+        dirs_scanned += 1
+        entries_examined += examined
+
+        if sub_dirs:
+            pending.append(((entry.path for entry in sub_dirs), depth + 1))
+
+    return MediaFiles(media_paths, dirs_scanned, entries_examined)
+
+
+def list_sub_dirs(dir_path):
+    """
+    List the names of the subdirectories of a directory, as os.walk lists them (including symbolic links to
+    directories), without listing its files
+    :param dir_path: Path to the directory
+    :return: A tuple (list of subdirectory names, number of entries examined), an empty list if the directory cannot
+    be read
+    """
+    names = []
+    entries_examined = 0
+
+    try:
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                entries_examined += 1
+
+                if _is_dir(entry):
+                    names.append(entry.name)
+    except OSError:
+        return [], entries_examined
+
+    return names, entries_examined
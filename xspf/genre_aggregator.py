@@ -0,0 +1,174 @@
+"""
+This module contains the aggregation of the genres of the tracks of an album directory into the genres of the album
+"""
+import logging
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+def sample_evenly(items, size):
+    """
+    Pick items spread evenly over a sequence, so a sample of a box set covers all its discs
+    :param items: A sequence
+    :param size: The number of items to pick, 0 for all of them
+    :return: A list of the items picked, in their order in the sequence
+    """
+    if not size or len(items) <= size:
+        return list(items)
+
+    step = len(items) / size
+
+    return [items[int(index * step + step / 2)] for index in range(size)]
+
+
+def weigh_genres(file_genres, min_share=0.0):
+    """
+    Build the weighted genre set of an album from the genres of its tracks. The weight (share) of a genre is the
+    fraction of the tagged tracks that have it; untagged tracks are not counted.
+    :param file_genres: An iterable of the genres of the tracks, multiple values separated by ', '
+    :param min_share: The smallest share of a genre to keep; if no genre reaches it, the most common ones are kept
+    :return: A list of (genre, share) tuples, by descending share, then by name
+    """
+    counts = Counter()
+    tagged_count = 0
+
+    for file_genre in file_genres:
+        values = {value for value in file_genre.split(', ') if value} if file_genre else set()
+
+        if values:
+            tagged_count += 1
+            counts.update(values)
+
+    if not tagged_count:
+        return []
+
+    weighted = [(genre, count / tagged_count) for genre, count in sorted(counts.items(), key=lambda i: (-i[1], i[0]))]
+    kept = [(genre, share) for genre, share in weighted if share >= min_share]
+
+    return kept if kept else [(genre, share) for genre, share in weighted if share == weighted[0][1]]
+
+
+class GenreAggregator:
+    """
+    This class derives the genre of an album directory from the tags of all its tracks, or of an evenly spread
+    sample of them, instead of the first track only. The genres of the files are cached in the scan cache (valid while
+    the size and the modification time of a file are unchanged) and the files not cached are read concurrently, so a
+    re-scan of a changed album only reads the tags of its changed files.
+    """
+
+    def __init__(self, read_file_genre, scan_cache=None, jobs=1, sample_size=0, min_share=0.0, stats=None):
+        """
+        :param read_file_genre: A function returning the genre of a media file
+        :param scan_cache: A ScanCache instance, None not to cache the genres of the files
+        :param jobs: The number of files to read concurrently
+        :param sample_size: The number of tracks of an album to read, 0 for all of them
+        :param min_share: The smallest share of the tracks a genre must have to be kept, see weigh_genres()
+        :param stats: A RunStats instance in which to count the cached genres, None not to count them
+        """
+        self._read_file_genre = read_file_genre
+        self._scan_cache = scan_cache
+        self._jobs = jobs
+        self._sample_size = sample_size
+        self._min_share = min_share
+        self._stats = stats
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @property
+    def mode_key(self):
+        """
+        A key identifying the way genres are aggregated, so cached directory genres are only used for the same way
+        :return: A string such as "all:0.2" or "sample:5:0.2"
+        """
+        if self._sample_size:
+            return f"sample:{self._sample_size}:{self._min_share}"
+
+        return f"all:{self._min_share}"
+
+    def _safe_read(self, file_path):
+        try:
+            return self._read_file_genre(file_path)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # A track that cannot be parsed must not fail the album, music_tag raises various exception types:
+            logger.debug("Cannot read the genre of %s: %s", file_path, e)
+            return ''
+
+    def _read_all(self, file_paths):
+        if self._jobs < 2 or len(file_paths) < 2:
+            return [self._safe_read(file_path) for file_path in file_paths]
+
+        # The albums can be aggregated on several threads (probing directories, scanning mounts):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self._jobs, thread_name_prefix="xspf-tags")
+
+            pool = self._pool
+
+        return list(pool.map(self._safe_read, file_paths))
+
+    def file_genres(self, dir_path, file_paths):
+        """
+        Get the genres of media files, from the cache for the files that have not changed, reading the others
+        :param dir_path: Absolute path to the album directory holding the files
+        :param file_paths: A list of the paths to the files
+        :return: A list of the genres of the files that exist
+        """
+        if not self._scan_cache:
+            return self._read_all(file_paths)
+
+        cached = self._scan_cache.lookup_files(dir_path)
+        rows = []
+        unread = []
+
+        for file_path in file_paths:
+            try:
+                file_stat = os.stat(file_path)
+            except OSError:
+                continue
+
+            entry = cached.get(file_path)
+
+            if entry and entry[:2] == (file_stat.st_size, file_stat.st_mtime_ns):
+                rows.append((file_path, file_stat.st_size, file_stat.st_mtime_ns, entry[2]))
+            else:
+                unread.append((file_path, file_stat))
+
+        if self._stats:
+            self._stats.count("tag_cache_hits", len(rows))
+
+        read_genres = self._read_all([file_path for file_path, _ in unread])
+        rows += [(file_path, file_stat.st_size, file_stat.st_mtime_ns, genre)
+                 for (file_path, file_stat), genre in zip(unread, read_genres)]
+
+        if unread or len(rows) != len(cached):
+            self._scan_cache.replace_files(dir_path, rows)
+
+        return [genre for _, _, _, genre in rows]
+
+    def aggregate(self, dir_path, media_paths):
+        """
+        Derive the genre of an album directory from its tracks. Only the genres kept and their order are returned, not
+        their shares: the playlists route a folder by the genres it has, whatever their share.
+        :param dir_path: Absolute path to the album directory
+        :param media_paths: A list of the paths to its media files, in walk order
+        :return: The genres kept, by descending share, separated by ', ', an empty string if no track is tagged
+        """
+        weighted = weigh_genres(self.file_genres(dir_path, sample_evenly(media_paths, self._sample_size)),
+                                self._min_share)
+
+        return ', '.join(genre for genre, _ in weighted)
+
+    def close(self):
+        """
+        Stop the threads reading files, a later aggregation starts new ones
+        :return: void
+        """
+        with self._lock:
+            pool, self._pool = self._pool, None
+
+        if pool is not None:
+            pool.shutdown()
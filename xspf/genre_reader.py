@@ -0,0 +1,449 @@
+"""
+This module contains a fast reader of the genre tag of media files. It reads only the bytes of the tag structures it
+needs and seeks over everything else (audio data, pictures), so obtaining the genre of an album costs a few KB of I/O
+instead of a full parse of the file by music_tag/mutagen.
+"""
+import re
+import struct
+import uuid
+
+# The longest single tag value read, longer values (e.g. embedded pictures) are skipped:
+MAX_VALUE_LEN = 64 * 1024
+
+FLAC_VORBIS_COMMENT = 4
+
+ASF_HEADER = uuid.UUID("75B22630-668E-11CF-A6D9-00AA0062CE6C").bytes_le
+ASF_EXT_CONTENT_DESC = uuid.UUID("D2D0A440-E307-11D2-97F0-00A0C95EA850").bytes_le
+ASF_HEADER_EXTENSION = uuid.UUID("5FBF03B5-A92E-11CF-8EE3-00C00C205365").bytes_le
+ASF_METADATA = uuid.UUID("C5F8CBEA-5BAF-4877-8467-AA8C44FA4CCA").bytes_le
+ASF_METADATA_LIBRARY = uuid.UUID("44231C94-9498-49D1-A141-1D134E457054").bytes_le
+
+# ID3v1 genre references such as "(17)" or "17" need the mutagen genre table, so they are left to music_tag:
+ID3_GENRE_REF = re.compile(r'^(\(\d+\)|\d+$)')
+
+
+class TagFormatError(Exception):
+    """
+    Raised when a tag structure is not what the reader expects; the caller falls back to music_tag.
+    """
+
+
+def _read_exact(f_in, size):
+    data = f_in.read(size)
+
+    if len(data) != size:
+        raise TagFormatError("Unexpected end of file")
+
+    return data
+
+
+def _join_values(values):
+    """
+    Join tag values the way music_tag presents a multi-value text tag
+    :param values: An iterable of strings
+    :return: A string with the non-empty values separated by ', '
+    """
+    return ', '.join(value for value in values if value)
+
+
+def _read_vorbis_comments(read, skip):
+    """
+    Find the genre in a Vorbis comment structure (used by FLAC and Ogg)
+    :param read: Function returning exactly the requested number of bytes
+    :param skip: Function skipping the requested number of bytes
+    :return: The genre, an empty string if the comments do not contain one
+    """
+    vendor_len = struct.unpack('<I', read(4))[0]
+    skip(vendor_len)
+    count = struct.unpack('<I', read(4))[0]
+    genres = []
+
+    for _ in range(count):
+        comment_len = struct.unpack('<I', read(4))[0]
+
+        if comment_len > MAX_VALUE_LEN:
+            skip(comment_len)
+            continue
+
+        key, _, value = read(comment_len).partition(b'=')
+
+        if key.upper() == b'GENRE':
+            genres.append(value.decode('UTF-8', errors='replace'))
+
+    return _join_values(genres)
+
+
+def _read_flac_genre(f_in):
+    _read_exact(f_in, 4)  # fLaC
+
+    while True:
+        block_type, size_hi, size_lo = struct.unpack('>BBH', _read_exact(f_in, 4))
+        block_len = (size_hi << 16) | size_lo
+
+        if block_type & 0x7f == FLAC_VORBIS_COMMENT:
+            return _read_vorbis_comments(
+                lambda size: _read_exact(f_in, size), lambda size: f_in.seek(size, 1)
+            )
+
+        if block_type & 0x80:  # last metadata block
+            return ''
+
+        f_in.seek(block_len, 1)
+
+
+def _unsync_int(data):
+    """
+    Decode a synchsafe integer (7 bits per byte) used by ID3v2
+    :param data: The bytes to decode
+    :return: The integer value
+    """
+    value = 0
+
+    for byte in data:
+        value = (value << 7) | (byte & 0x7f)
+
+    return value
+
+
+def _split_id3_text(text, width):
+    """
+    Split the values of an ID3 text frame on their terminator, one (latin-1, UTF-8) or two (UTF-16) null bytes on a
+    character boundary
+    :param text: The bytes of the values
+    :param width: The width of the terminator, 1 or 2
+    :return: A list of the bytes of the values, without their terminators
+    """
+    terminator = b'\x00' * width
+    values = []
+    pos = 0
+
+    while pos < len(text):
+        end = text.find(terminator, pos)
+
+        while end != -1 and (end - pos) % width:
+            end = text.find(terminator, end + 1)
+
+        if end == -1:
+            end = len(text)
+
+        values.append(text[pos:end])
+        pos = end + width
+
+    return values
+
+
+def _decode_utf16_values(raw_values, codec):
+    """
+    Decode UTF-16 ID3 values, each starting with its own byte order mark with encoding 1
+    :param raw_values: A list of the bytes of the values
+    :param codec: The codec of the values without a byte order mark
+    :return: A list of strings
+    """
+    values = []
+
+    for raw in raw_values:
+        if raw[:2] in (b'\xff\xfe', b'\xfe\xff'):
+            codec = 'UTF-16-LE' if raw[:2] == b'\xff\xfe' else 'UTF-16-BE'
+            raw = raw[2:]
+
+        values.append(raw.decode(codec))
+
+    return values
+
+
+def _decode_id3_text(data):
+    encoding, text = data[0], data[1:]
+
+    if encoding == 0:
+        values = [raw.decode('latin-1') for raw in _split_id3_text(text, 1)]
+    elif encoding in (1, 2):
+        values = _decode_utf16_values(_split_id3_text(text, 2), 'UTF-16-BE' if encoding == 2 else 'UTF-16-LE')
+    elif encoding == 3:
+        values = [raw.decode('UTF-8') for raw in _split_id3_text(text, 1)]
+    else:
+        raise TagFormatError(f"Unknown ID3 text encoding {encoding}")
+
+    values = [value.lstrip('\ufeff') for value in values]
+
+    if any(ID3_GENRE_REF.match(value) for value in values):
+        raise TagFormatError("ID3v1 genre reference")
+
+    return _join_values(values)
+
+
+def _id3_tag_end(header):
+    """
+    Find the end of an ID3v2 tag at the start of a file
+    :param header: The 10 bytes of the tag header
+    :return: The offset of the first byte after the tag, its footer included
+    """
+    return 10 + _unsync_int(header[6:10]) + (10 if header[3] == 4 and header[5] & 0x10 else 0)
+
+
+def _read_id3_genre(f_in):
+    header = _read_exact(f_in, 10)
+    version, flags = header[3], header[5]
+    tag_end = _id3_tag_end(header)
+
+    if version not in (2, 3, 4) or (flags & 0x80 and version < 4):
+        raise TagFormatError("Unsupported ID3v2 version or unsynchronised tag")
+
+    if flags & 0x40 and version == 3:
+        f_in.seek(struct.unpack('>I', _read_exact(f_in, 4))[0], 1)
+    elif flags & 0x40 and version == 4:
+        f_in.seek(_unsync_int(_read_exact(f_in, 4)) - 4, 1)
+
+    id_len, header_len, genre_id = (3, 6, b'TCO') if version == 2 else (4, 10, b'TCON')
+
+    while f_in.tell() + header_len <= tag_end:
+        frame_header = _read_exact(f_in, header_len)
+        frame_id = frame_header[:id_len]
+
+        if not frame_id.strip(b'\x00'):  # padding
+            return ''
+
+        if version == 2:
+            frame_len = int.from_bytes(frame_header[3:6], 'big')
+        elif version == 3:
+            frame_len = struct.unpack('>I', frame_header[4:8])[0]
+        else:
+            frame_len = _unsync_int(frame_header[4:8])
+
+        if frame_id != genre_id:
+            f_in.seek(frame_len, 1)
+            continue
+
+        # Compressed, encrypted or unsynchronised frames are left to mutagen:
+        if version > 2 and frame_header[9] & (0xe0 if version == 3 else 0x4f):
+            raise TagFormatError("Encoded TCON frame")
+
+        return _decode_id3_text(_read_exact(f_in, frame_len)) if frame_len else ''
+
+    return ''
+
+
+class _OggPacketReader:
+    """
+    This class reads the bytes of the Ogg packets of a stream, page by page, seeking over page payloads that are
+    skipped.
+    """
+
+    def __init__(self, f_in):
+        self._f_in = f_in
+        self._left = 0
+
+    def _next_page(self):
+        header = _read_exact(self._f_in, 27)
+
+        if header[:4] != b'OggS':
+            raise TagFormatError("Lost Ogg page sync")
+
+        segments = _read_exact(self._f_in, header[26])
+        self._left = sum(segments)
+
+    def read(self, size):  # pylint: disable=missing-function-docstring
+        chunks = []
+
+        while size:
+            if not self._left:
+                self._next_page()
+                continue
+
+            chunk = _read_exact(self._f_in, min(size, self._left))
+            chunks.append(chunk)
+            self._left -= len(chunk)
+            size -= len(chunk)
+
+        return b''.join(chunks)
+
+    def skip(self, size):  # pylint: disable=missing-function-docstring
+        while size:
+            if not self._left:
+                self._next_page()
+                continue
+
+            step = min(size, self._left)
+            self._f_in.seek(step, 1)
+            self._left -= step
+            size -= step
+
+    def skip_page(self):  # pylint: disable=missing-function-docstring
+        self.skip(self._left)
+
+
+def _read_ogg_genre(f_in):
+    packets = _OggPacketReader(f_in)
+    ident = packets.read(8)
+
+    # The identification header fills the first page, the comment header starts on the second page:
+    packets.skip_page()
+
+    if ident[:7] == b'\x01vorbis':
+        if packets.read(7) != b'\x03vorbis':
+            raise TagFormatError("Missing Vorbis comment header")
+    elif ident == b'OpusHead':
+        if packets.read(8) != b'OpusTags':
+            raise TagFormatError("Missing Opus tags header")
+    else:
+        raise TagFormatError("Unsupported Ogg codec")
+
+    return _read_vorbis_comments(packets.read, packets.skip)
+
+
+def _read_ape_genre(f_in):
+    f_in.seek(0, 2)
+    file_end = f_in.tell()
+
+    # An ID3v1 tag may follow the APEv2 tag:
+    for footer_end in (file_end, file_end - 128):
+        if footer_end < 32:
+            continue
+
+        f_in.seek(footer_end - 32)
+        footer = _read_exact(f_in, 32)
+
+        if footer[:8] == b'APETAGEX':
+            break
+    else:
+        raise TagFormatError("No APEv2 tag at the end of the file")
+
+    tag_len, item_count = struct.unpack('<II', footer[12:20])
+    f_in.seek(footer_end - tag_len)
+    genres = []
+
+    for _ in range(item_count):
+        value_len, item_flags = struct.unpack('<II', _read_exact(f_in, 8))
+        key = bytearray()
+
+        while (char := _read_exact(f_in, 1)) != b'\x00':
+            key += char
+
+        if key.lower() != b'genre' or item_flags & 0x06 or value_len > MAX_VALUE_LEN:
+            f_in.seek(value_len, 1)
+            continue
+
+        genres += _read_exact(f_in, value_len).decode('UTF-8', errors='replace').split('\x00')
+
+    return _join_values(genres)
+
+
+def _read_asf_records(data, record_count, read_record):
+    genres = []
+    pos = 0
+
+    for _ in range(record_count):
+        name, value_type, value, pos = read_record(data, pos)
+
+        if name == 'WM/Genre' and value_type == 0:
+            genres.append(value.decode('UTF-16-LE', errors='replace').rstrip('\x00'))
+
+    return genres
+
+
+def _asf_ext_content_record(data, pos):
+    name_len = struct.unpack_from('<H', data, pos)[0]
+    name = data[pos + 2:pos + 2 + name_len].decode('UTF-16-LE', errors='replace').rstrip('\x00')
+    pos += 2 + name_len
+    value_type, value_len = struct.unpack_from('<HH', data, pos)
+    pos += 4
+
+    return name, value_type, data[pos:pos + value_len], pos + value_len
+
+
+def _asf_metadata_record(data, pos):
+    name_len, value_type, value_len = struct.unpack_from('<HHI', data, pos + 4)
+    pos += 12
+    name = data[pos:pos + name_len].decode('UTF-16-LE', errors='replace').rstrip('\x00')
+    pos += name_len
+
+    return name, value_type, data[pos:pos + value_len], pos + value_len
+
+
+def _read_asf_objects(data, genres):
+    pos = 0
+
+    while pos + 24 <= len(data):
+        guid, obj_len = data[pos:pos + 16], struct.unpack_from('<Q', data, pos + 16)[0]
+
+        if obj_len < 24:
+            raise TagFormatError("Bad ASF object size")
+
+        body = data[pos + 24:pos + obj_len]
+
+        if guid == ASF_EXT_CONTENT_DESC:
+            genres += _read_asf_records(body[2:], struct.unpack_from('<H', body)[0], _asf_ext_content_record)
+        elif guid in (ASF_METADATA, ASF_METADATA_LIBRARY):
+            genres += _read_asf_records(body[2:], struct.unpack_from('<H', body)[0], _asf_metadata_record)
+        elif guid == ASF_HEADER_EXTENSION:
+            _read_asf_objects(body[22:], genres)
+
+        pos += obj_len
+
+
+def _read_asf_genre(f_in):
+    header = _read_exact(f_in, 30)
+    header_len = struct.unpack_from('<Q', header, 16)[0]
+
+    if header_len > 16 * MAX_VALUE_LEN:
+        raise TagFormatError("ASF header too large")
+
+    genres = []
+    _read_asf_objects(_read_exact(f_in, header_len - 30), genres)
+
+    return _join_values(genres)
+
+
+def _read_prefixed_genre(f_in, magic):
+    """
+    Read the genre of a file starting with an ID3v2 tag: an MP3 file, or a FLAC or Monkey's Audio file with an ID3v2
+    tag prepended, whose genre is in its own tag, as music_tag reads it
+    :param f_in: The file, at its start
+    :param magic: The first 16 bytes of the file
+    :return: The genre, an empty string if the tag has no genre
+    """
+    tag_end = _id3_tag_end(magic[:10])
+    f_in.seek(tag_end)
+    inner_magic = f_in.read(4)
+    f_in.seek(tag_end)
+
+    if inner_magic == b'fLaC':
+        return _read_flac_genre(f_in)
+
+    if inner_magic == b'MAC ':
+        return _read_ape_genre(f_in)
+
+    f_in.seek(0)
+
+    return _read_id3_genre(f_in)
+
+
+def read_genre(file_path):
+    """
+    Read the genre of a media file from its tag, without parsing the rest of the file.
+    :param file_path: Path to the media file
+    :return: The genre (multiple values separated by ', '), an empty string if the tag has no genre, or None if the
+    file or its tag is in a form this reader does not handle and a full parser (music_tag) should be used
+    """
+    try:
+        with open(file_path, 'rb') as f_in:
+            magic = f_in.read(16)
+            f_in.seek(0)
+
+            if magic[:4] == b'fLaC':
+                return _read_flac_genre(f_in)
+
+            if magic[:3] == b'ID3':
+                return _read_prefixed_genre(f_in, magic)
+
+            if magic[:4] == b'OggS':
+                return _read_ogg_genre(f_in)
+
+            if magic[:4] == b'MAC ':
+                return _read_ape_genre(f_in)
+
+            if magic == ASF_HEADER:
+                return _read_asf_genre(f_in)
+    except (OSError, TagFormatError, struct.error, UnicodeDecodeError):
+        return None
+
+    return None
@@ -5,24 +5,37 @@ import argparse
 import glob
 import json
 import logging
+import multiprocessing
 import os
 import re
+import sqlite3
 import sys
+import unicodedata
 from collections import OrderedDict
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack
 from datetime import datetime
 from enum import Enum, auto
+from itertools import chain, groupby
 from shutil import copyfile
 from typing import NamedTuple
 
-import music_tag
-import psycopg2
-from bs4 import BeautifulSoup, Tag
-from dbus_notifier.notifysender import NotifySender
-from psycopg2 import sql
-from ruamel.yaml import YAML
-from ruamel.yaml.comments import CommentedMap, CommentedSeq  # NOQA  # pylint: disable=unused-import
-from ruamel.yaml.parser import ParserError
-from ruamel.yaml.scanner import ScannerError
+# The third-party dependencies (music_tag, psycopg2, bs4, lxml, ruamel.yaml, dbus_notifier) are imported by the
+# methods that use them, so a run only pays for the code paths it takes; see startup_report.py.
+from atomic_output import AtomicOutput
+from config_cache import ConfigCache
+from db_snapshot import DbSnapshot
+from db_source import DbSource, DbUnavailable
+from dir_catalogue import DirCatalogue, DirItem
+from dir_walker import find_first_media, list_media_files, list_sub_dirs
+from genre_aggregator import GenreAggregator
+from genre_reader import read_genre
+from log_setup import DEFAULT_LOG_LEVEL, LOG_LEVELS, configure_logging, logging_configured
+from run_stats import RunStats, timed
+from scan_cache import ScanCache
+from watcher import InotifyWatcher, PollingWatcher, collect_changes, on_network_fs
+from xspf_writer import AlbumXspfWriter, XspfWriter, indent_xml
 
 __version__ = '0.2.0'
 
@@ -33,6 +46,39 @@ XSPF_HEAD = '<?xml version="1.0" encoding="UTF-8"?>'
 
 MEDIA_EXTENSIONS = ['ape', 'flac', 'mp3', 'ogg', 'wma']
 
+# Rows fetched per round trip from the server-side DB cursor:
+DB_BATCH_SIZE = 2000
+
+# How the genre of a folder is derived in multi mode: from its first media file, from all its media files, or from an
+# evenly spread sample of them:
+GENRE_MODES = ('first', 'all', 'sample')
+DEFAULT_GENRE_SAMPLE = 5
+DEFAULT_GENRE_MIN_SHARE = 0.2
+
+# Watch mode: seconds without events that end a burst, longest burst, and the polling interval used for network file
+# systems or when inotify is not available:
+WATCH_DEBOUNCE = 2.0
+WATCH_MAX_DELAY = 60.0
+DEFAULT_POLL_INTERVAL = 30.0
+
+# How large playlists are split into shards: consecutive runs of folders by count, or alphabetical ranges of the
+# initials of the folder names; the initials in shard order, '0' standing for the digits and '_' for anything else:
+SHARD_MODES = ('count', 'alpha')
+SHARD_INITIALS = '0abcdefghijklmnopqrstuvwxyz_'
+
+# How the processes rendering playlists are started: a fresh interpreter, rather than a fork of this process with
+# the threads and the log queue listener it may be running:
+RENDER_START_METHOD = 'spawn'
+
+# The cache files used when no path is given are written beside the genre list config, or in this directory if there
+# is no config file; their names by command line option:
+DEFAULT_CACHE_DIR = '~/scripts/xspf-gen'
+DEFAULT_CACHE_FILES = {'scan_cache': '.xspf-scan.db', 'db_snapshot': '.xspf-db-snapshot',
+                       'config_cache': '.xspf-config-cache.json'}
+
+# The levels of the log_it() messages, any other level name logs at debug level:
+LOG_IT_LEVELS = {"info": logging.INFO, "error": logging.ERROR, "warning": logging.WARNING}
+
 
 # DB table:
 Album = {
@@ -170,42 +216,121 @@ class ConfigGetter:
                 self.cfg[name.strip()] = re.sub(r'[\\\n]+$', '', var)
 
 
-class DirItem(NamedTuple):
+class MediaDirs(NamedTuple):
+    """
+    This class represents a media item.
+    """
+    parent: str
+    dirs: Sequence
+
+
+class TrackItem(NamedTuple):
     """
-    This class represents a single media directory
+    This class represents a single media file, for the track-level playlists
     """
-    name: str
+    album_path: str
+    album: str
+    location: str
+    title: str | None
+    creator: str | None
+    track_num: int | None
     genre: str
 
 
-class MediaDirs(NamedTuple):
+class RenderTask(NamedTuple):
     """
-    This class represents a media item.
+    This class represents a genre playlist to render in a worker process
     """
-    parent: str
-    dirs: list
+    playlist_name: str
+    locations: list
+    out_file: str
+    streaming: bool
+    pretty: bool
+    skip_unchanged: bool
+    index: bool = False  # The index playlist of shards, its entries (the shards) are not counted as items
 
 
-def log_it(level='info', src_name=None, text=None):
+def log_it(level='info', src_name=None, text=None, *args):  # pylint: disable=keyword-arg-before-vararg
     """
-    Logger function
+    Logger function, setting up the logging with the defaults if the program did not, see configure_logging()
     :param level: String specifying the log level
     :param src_name: String containing the name of the logging module
-    :param text: A string containing the log message
+    :param text: A string containing the log message, with %-style placeholders if args are given
+    :param args: The values of the placeholders, only formatted if the message is logged, e.g. for messages logged
+    per folder
     :return: void
     """
+    if not logging_configured():
+        configure_logging()
+
+    log_writer = logging.getLogger(src_name if src_name else __name__)
+    # The record gets the file and line of the caller, which the rate limit of the messages goes by:
+    log_writer.log(LOG_IT_LEVELS.get(level, logging.DEBUG), text, *args, stacklevel=2)
+
+
+def common_parent(dirs):
+    """
+    Find the deepest directory containing directories
+    :param dirs: A sequence of paths
+    :return: The absolute path of the directory, the directory itself if there is only one
+    """
+    return os.path.commonpath([os.path.abspath(a_dir) for a_dir in dirs])
+
+
+def folder_initial(name):
+    """
+    Find the initial of a folder for the alphabetical shards, see SHARD_INITIALS
+    :param name: The name of the folder, the last part of a path for a merged listing
+    :return: The first letter of the name without accents in lower case, '0' for a digit and '_' for anything else
+    """
+    initial = unicodedata.normalize('NFKD', os.path.basename(name)[:1])[:1].lower()
+
+    if 'a' <= initial <= 'z':
+        return initial
+
+    return '0' if initial.isdigit() else '_'
+
+
+def default_cache_path(file_name, config_file=None):
+    """
+    Find the path of a cache file in the directory of the genre list config file, or in DEFAULT_CACHE_DIR without a
+    config file, creating the directory if needed. The caches only save time, so if the directory cannot be created
+    the cache is not used, without a warning on every run.
+    :param file_name: The name of the cache file
+    :param config_file: The path to the genre list config file (-c)
+    :return: The path to the file, an empty string if the directory cannot be created
+    """
+    cache_dir = os.path.dirname(os.path.abspath(os.path.expanduser(config_file))) if config_file else \
+        os.path.expanduser(DEFAULT_CACHE_DIR)
 
-    logging.basicConfig(level=logging.DEBUG)
-    logger_name = src_name if src_name else __name__
-    log_writer = logging.getLogger(logger_name)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+    except OSError as e:  # NOQA
+        log_it("debug", __name__, f"Not using {file_name}, cannot create {cache_dir}: {e}")
+        return ''
 
-    do_log = {
-        "info": log_writer.info,
-        "error": log_writer.error,
-        "warning": log_writer.warning,
-    }
+    return os.path.join(cache_dir, file_name)
 
-    do_log.get(level, log_writer.debug)(text)
+
+def merge_media_dirs(listings):
+    """
+    Merge the listings of several source directories into one. The parent of the merged listing is the deepest
+    directory containing the source directories, and each folder is named by its path relative to it, e.g.
+    'nas1/music/Abba' for the folder Abba of /mnt/nas1/music merged with /mnt/nas2/music, so the name records the
+    source directory of the folder and folders of the same name in different source directories are kept apart.
+    :param listings: A list of MediaDirs instances
+    :return: A MediaDirs instance, the folders ordered by name
+    """
+    if len(listings) == 1:
+        return listings[0]
+
+    parent = common_parent([listing.parent for listing in listings])
+    folders = sorted(
+        (os.path.relpath(os.path.join(os.path.abspath(listing.parent), folder.name), parent), folder.genre)
+        for listing in listings for folder in listing.dirs
+    )
+
+    return MediaDirs(parent=parent, dirs=DirCatalogue(folders))
 
 
 class Result(Enum):
@@ -225,48 +350,135 @@ class PlaylistHandler:
     This class either creates a new XSPF playlist or extends an existing one
     by adding track files.
     """
-    def __init__(self, source_dir="~/temp", start_file="", out_file="", multi=False, list_cfg=None, env_cfg=None):
+    def __init__(self, source_dir="~/temp", start_file="", out_file="", multi=False, list_cfg=None, env_cfg=None,
+                 scan_cache=None, jobs=1, streaming=True, pretty=False, skip_unchanged=False, max_depth=None,
+                 genre_mode='first', genre_sample=DEFAULT_GENRE_SAMPLE, genre_min_share=DEFAULT_GENRE_MIN_SHARE,
+                 track_level=False, render_jobs=1, db_snapshot=None, shard_size=0, shard_by='count',
+                 config_cache=None):
         self._start_file = None
-        self._source_dir = None
+        self._source_dirs = ()
         self._directories = None
         self._out_file = self._out_dir = None
         self._notifier = None
         self._multi = False
+        self._scan_cache = None
+        self._jobs = 1
+        self._streaming = True
+        self._pretty = False
+        self._skip_unchanged = False
+        self._max_depth = None
+        self._genre_mode = 'first'
+        self._genre_aggregator = None
+        self._track_level = False
+        self._render_jobs = 1
+        self._db_snapshot = None
+        self._shard_size = 0
+        self._shard_by = 'count'
+        self._config_cache = None
+        self._stats = RunStats()
 
         self.source_dir = source_dir
         self.start_file = start_file
         self._genre_lists = OrderedDict()
+        self._genre_index = {}
 
         script_dir = os.path.dirname(os.path.realpath(__file__))
-        self.genre_lists = self.read_yaml(
+        self.config_cache = config_cache
+        self.genre_lists = list_cfg if isinstance(list_cfg, Mapping) else self.read_genre_lists(
             list_cfg if list_cfg else os.path.join(script_dir, '..', 'xspf-gen.yml')
         )
         self.out_file = os.path.basename(out_file)
         self.out_dir = os.path.dirname(out_file)
         self.directories = tuple()
+        self.db_listed_dir = None
         self.multi = multi
-        messages = {
+        self.scan_cache = scan_cache
+        self.jobs = jobs
+        self.streaming = streaming
+        self.pretty = pretty
+        self.skip_unchanged = skip_unchanged
+        self.max_depth = max_depth
+        self.genre_mode = genre_mode
+        self._genre_sample = genre_sample if genre_sample and genre_sample > 0 else DEFAULT_GENRE_SAMPLE
+        self._genre_min_share = genre_min_share
+        self.track_level = track_level
+        self.render_jobs = render_jobs
+        self.db_snapshot = db_snapshot
+        self.shard_size = shard_size
+        self.shard_by = shard_by
+        self._messages = {
             Result.PROCESSING: f"Processing  {repr(self.start_file)} to generate playlist ..." if self.start_file
             else "Starting to generate playlist ...",
             Result.PLAYLIST_GENERATED: "Playlist ready",
             Result.PROCESSED: f"Playlist saved in {self.out_dir}"
         }
 
-        self._conn = None
-        self._cursor = None
+        # The DB source and the notifier are created when they are first used:
+        self._db = None
+        self._env_cfg = env_cfg if env_cfg else '.env_db'
 
-        db_cfg = get_config(env_cfg if env_cfg else '.env_db')
-        self.conn = psycopg2.connect(
-            host=db_cfg.get('DB_HOST'),
-            port=int(db_cfg.get('DB_PORT')),
-            database=db_cfg.get('DB_NAME'),
-            user=db_cfg.get('DB_USER'),
-            password=db_cfg.get('DB_PASS')
-        )
+    @property
+    def db(self):
+        """
+        The DB source, created on first use with the settings from the environment config file; it connects when it
+        is first queried
+        :return: A DbSource instance
+        """
+        if self._db is None:
+            try:
+                db_cfg = get_config(self._env_cfg)
+            except OSError as e:  # NOQA
+                log_it("warning", __name__, f"Cannot read the DB configuration {self._env_cfg}: {e}")
+                db_cfg = {}
+
+            self._db = DbSource(db_cfg)
+
+        return self._db
+
+    @db.setter
+    def db(self, in_db):
+        self._db = in_db
+
+    @property
+    def conn(self):
+        """
+        The DB connection given to the handler
+        :return: A psycopg2 connection, None if the connections come from the pool of the DB source
+        """
+        return self.db.conn
 
-        self.cursor = self.conn.cursor()
+    @conn.setter
+    def conn(self, in_conn):
+        self._db = DbSource(conn=in_conn) if in_conn is not None else None
 
-        self.notifier = NotifySender(title="xspf-gen", messages=messages)
+    @property
+    def notifier(self):
+        """
+        The desktop notifier, connected to D-Bus on first use
+        :return: A NotifySender instance
+        """
+        if self._notifier is None:
+            from dbus_notifier.notifysender import NotifySender  # pylint: disable=import-outside-toplevel
+
+            self._notifier = NotifySender(title="xspf-gen", messages=self._messages)
+
+        return self._notifier
+
+    @notifier.setter
+    def notifier(self, in_notifier):
+        self._notifier = in_notifier
+
+    @property
+    def stats(self):
+        """
+        The statistics of the run: wall time and calls of each phase, and counters
+        :return: A RunStats instance
+        """
+        return self._stats
+
+    @stats.setter
+    def stats(self, in_stats):
+        self._stats = in_stats
 
     @property
     def start_file(self):  # pylint: disable=missing-function-docstring
@@ -291,6 +503,7 @@ class PlaylistHandler:
     @genre_lists.setter
     def genre_lists(self, in_lists):
         self._genre_lists = OrderedDict(in_lists)
+        self._genre_index = self.build_genre_index(self._genre_lists)
 
     @property
     def out_dir(self):  # pylint: disable=missing-function-docstring
@@ -301,12 +514,27 @@ class PlaylistHandler:
         self._out_dir = in_dir if in_dir else f"/home/{os.environ.get('USER')}/temp/"
 
     @property
-    def source_dir(self):  # pylint: disable=missing-function-docstring
-        return self._source_dir
+    def source_dir(self):
+        """
+        The source directory, the first one if there are several; the DB describes this one
+        :return: A path
+        """
+        return self._source_dirs[0] if self._source_dirs else None
 
     @source_dir.setter
     def source_dir(self, in_dir):
-        self._source_dir = in_dir
+        """
+        Set the source directory, or directories.
+        :param in_dir: A path, or a list of paths whose folders are merged into one set of playlists, see
+        merge_media_dirs()
+        :return: void
+        """
+        in_dirs = [in_dir] if isinstance(in_dir, str) or in_dir is None else in_dir
+        self._source_dirs = tuple(dict.fromkeys(in_dirs))
+
+    @property
+    def source_dirs(self):  # pylint: disable=missing-function-docstring
+        return self._source_dirs
 
     @property
     def directories(self):  # pylint: disable=missing-function-docstring
@@ -324,6 +552,171 @@ class PlaylistHandler:
     def multi(self, in_value):
         self._multi = in_value
 
+    @property
+    def scan_cache(self):  # pylint: disable=missing-function-docstring
+        return self._scan_cache
+
+    @scan_cache.setter
+    def scan_cache(self, in_cache):
+        """
+        Set the cache of directory scan results.
+        :param in_cache: An instance of ScanCache, the path of the cache file or None to scan without a cache
+        :return: void
+        """
+        if in_cache and not isinstance(in_cache, ScanCache):
+            try:
+                in_cache = ScanCache(in_cache)
+            except (sqlite3.Error, OSError) as e:  # NOQA
+                log_it("warning", __name__, f"Scan cache {in_cache} not available, scanning without it: {e}")
+                in_cache = None
+
+        self._scan_cache = in_cache if in_cache else None
+
+    @property
+    def config_cache(self):  # pylint: disable=missing-function-docstring
+        return self._config_cache
+
+    @config_cache.setter
+    def config_cache(self, in_cache):
+        """
+        Set the cache of the compiled genre list configuration.
+        :param in_cache: An instance of ConfigCache, the path of the cache file or None to parse the file each run
+        :return: void
+        """
+        if in_cache and not isinstance(in_cache, ConfigCache):
+            in_cache = ConfigCache(in_cache)
+
+        self._config_cache = in_cache if in_cache else None
+
+    @property
+    def shard_size(self):  # pylint: disable=missing-function-docstring
+        return self._shard_size
+
+    @shard_size.setter
+    def shard_size(self, in_size):
+        self._shard_size = in_size if in_size and in_size > 0 else 0
+
+    @property
+    def shard_by(self):  # pylint: disable=missing-function-docstring
+        return self._shard_by
+
+    @shard_by.setter
+    def shard_by(self, in_mode):
+        if in_mode not in SHARD_MODES:
+            raise ValueError(f"Unknown shard mode {in_mode}, expected one of {', '.join(SHARD_MODES)}")
+
+        self._shard_by = in_mode
+
+    @property
+    def db_snapshot(self):  # pylint: disable=missing-function-docstring
+        return self._db_snapshot
+
+    @db_snapshot.setter
+    def db_snapshot(self, in_snapshot):
+        """
+        Set the snapshot of the folders read from the DB.
+        :param in_snapshot: An instance of DbSnapshot, the path of the snapshot file or None to query the DB each run
+        :return: void
+        """
+        if in_snapshot and not isinstance(in_snapshot, DbSnapshot):
+            in_snapshot = DbSnapshot(in_snapshot)
+
+        self._db_snapshot = in_snapshot if in_snapshot else None
+
+    @property
+    def jobs(self):  # pylint: disable=missing-function-docstring
+        return self._jobs
+
+    @jobs.setter
+    def jobs(self, in_jobs):
+        self._jobs = max(1, int(in_jobs)) if in_jobs else 1
+
+    @property
+    def streaming(self):  # pylint: disable=missing-function-docstring
+        return self._streaming
+
+    @streaming.setter
+    def streaming(self, in_value):
+        self._streaming = bool(in_value)
+
+    @property
+    def pretty(self):  # pylint: disable=missing-function-docstring
+        return self._pretty
+
+    @pretty.setter
+    def pretty(self, in_value):
+        self._pretty = bool(in_value)
+
+    @property
+    def skip_unchanged(self):  # pylint: disable=missing-function-docstring
+        return self._skip_unchanged
+
+    @skip_unchanged.setter
+    def skip_unchanged(self, in_value):
+        self._skip_unchanged = bool(in_value)
+
+    @property
+    def max_depth(self):  # pylint: disable=missing-function-docstring
+        return self._max_depth
+
+    @max_depth.setter
+    def max_depth(self, in_depth):
+        self._max_depth = in_depth if in_depth is None or in_depth >= 0 else None
+
+    @property
+    def genre_mode(self):  # pylint: disable=missing-function-docstring
+        return self._genre_mode
+
+    @genre_mode.setter
+    def genre_mode(self, in_mode):
+        self._genre_mode = in_mode if in_mode in GENRE_MODES else 'first'
+        self._genre_aggregator = None
+
+    @property
+    def track_level(self):  # pylint: disable=missing-function-docstring
+        return self._track_level
+
+    @track_level.setter
+    def track_level(self, in_value):
+        self._track_level = bool(in_value)
+
+    @property
+    def render_jobs(self):  # pylint: disable=missing-function-docstring
+        return self._render_jobs
+
+    @render_jobs.setter
+    def render_jobs(self, in_jobs):
+        """
+        Set the number of processes rendering the genre playlists.
+        :param in_jobs: The number of processes, 0 for one per CPU, 1 to render the playlists in this process
+        :return: void
+        """
+        self._render_jobs = max(1, int(in_jobs)) if in_jobs != 0 else os.cpu_count() or 1
+
+    @property
+    def genre_aggregator(self):
+        """
+        The aggregator of the genres of the tracks of a folder, for the 'all' and 'sample' genre modes, created on first
+        use with the scan cache and the number of jobs of the handler
+        :return: A GenreAggregator instance, None in the 'first' genre mode
+        """
+        if self._genre_aggregator is None and self.genre_mode != 'first':
+            self._genre_aggregator = GenreAggregator(
+                self.read_tag_genre, scan_cache=self.scan_cache, jobs=self.jobs,
+                sample_size=self._genre_sample if self.genre_mode == 'sample' else 0,
+                min_share=self._genre_min_share, stats=self.stats
+            )
+
+        return self._genre_aggregator
+
+    @property
+    def genre_mode_key(self):
+        """
+        The key of the genre mode stored with the scan cache entries, so entries are only used in the same mode
+        :return: A string, empty in the 'first' genre mode
+        """
+        return self.genre_aggregator.mode_key if self.genre_aggregator else ''
+
     @staticmethod
     def is_subset(in_a, in_b):
         """
@@ -337,6 +730,38 @@ class PlaylistHandler:
 
         return set_a.issubset(set_b) or set_b.issubset(set_a)
 
+    def read_genre_lists(self, f_path):
+        """
+        Read the genre playlist configuration, from the config cache if the file has not changed since it was cached,
+        so the YAML parser is only imported and run when the file changed
+        :param f_path: Path to the YAML file
+        :return: A list of [playlist name, list of genres] pairs, in the order of the file
+        """
+        if self.config_cache:
+            return self.config_cache.get(f_path, 'genre_lists', self.compile_genre_lists) or []
+
+        return self.compile_genre_lists(f_path) or []
+
+    @staticmethod
+    def compile_genre_lists(f_path):
+        """
+        Read the genre playlist configuration into plain data: the names of the playlists and their genres as strings,
+        a single genre given as a scalar rather than a set being taken as a set of one
+        :param f_path: Path to the YAML file
+        :return: A list of [playlist name, list of genres] pairs, in the order of the file, None if the file does not
+        hold a mapping
+        """
+        f_contents = PlaylistHandler.read_yaml(f_path)
+
+        if not f_contents or not hasattr(f_contents, 'items'):
+            return None
+
+        return [
+            [str(list_name), [str(list_genres)] if isinstance(list_genres, str) else
+             list(dict.fromkeys(str(genre) for genre in list_genres)) if list_genres else []]
+            for list_name, list_genres in f_contents.items()
+        ]
+
     @staticmethod
     def read_yaml(f_path):
         """
@@ -344,6 +769,11 @@ class PlaylistHandler:
         :param f_path: Path to file to read
         :return: File content as a dict
         """
+        # pylint: disable=import-outside-toplevel
+        from ruamel.yaml import YAML
+        from ruamel.yaml.parser import ParserError
+        from ruamel.yaml.scanner import ScannerError
+
         f_contents = {}
         yaml = YAML()
 
@@ -357,29 +787,143 @@ class PlaylistHandler:
 
         return f_contents
 
+    @timed("read_dir_genres_from_db")
     def read_dir_genres_from_db(self):
         """
-        This method reads a row from the named DB table
-        :return: A dictionary of data read from the DB
+        Read the top-level album folders and their genres from the DB. The server extracts the folder names,
+        aggregates the genres of each folder and orders the folders, so a single row per folder is transferred, and
+        the rows are fetched in batches through a named (server-side) cursor, so the client memory used is bounded.
+        The connection is kept open for later queries.
+        :return: A generator of (folder name, genres) tuples in folder order, the genres separated by ', '
+        :raise DbUnavailable: If the DB cannot be queried
+        """
+        from psycopg2 import sql  # pylint: disable=import-outside-toplevel
+
+        q_obj = sql.SQL(
+            "SELECT split_part(album.path, '/', 1) COLLATE \"C\" AS folder, "
+            "coalesce(string_agg(DISTINCT nullif(song.genre, ''), ', ' ORDER BY nullif(song.genre, '')), '') "
+            "FROM public.album LEFT JOIN public.song ON public.album.id = public.song.album_id "
+            "WHERE split_part(album.path, '/', 1) <> '' "
+            "GROUP BY folder ORDER BY folder"
+        )
+
+        for fetch_results in self.db.query("xspf_dir_genres", q_obj, DB_BATCH_SIZE):
+            self.stats.count("db_rows", len(fetch_results))
+            yield from fetch_results
+
+    @timed("read_db_signature")
+    def read_db_signature(self):
+        """
+        Read a signature of the album and song tables that is cheap to compute and changes when albums are imported,
+        removed or re-tagged: the row counts and the highest IDs of the tables, and the number of rows inserted,
+        updated and deleted in them according to the statistics collector (a few hundred milliseconds behind the
+        transactions), along with the identity of the DB
+        :return: A list of values that can be saved as JSON
+        :raise DbUnavailable: If the DB cannot be queried
         """
-        q_obj = sql.SQL("SELECT DISTINCT album.path, song.genre from public.album FULL OUTER JOIN public.song ON "
-                        "public.album.id = public.song.album_id")
+        from psycopg2 import sql  # pylint: disable=import-outside-toplevel
+
+        q_obj = sql.SQL(
+            "SELECT current_database(), host(inet_server_addr()), inet_server_port(), "
+            "(SELECT count(*) FROM public.album), (SELECT coalesce(max(id), 0) FROM public.album), "
+            "(SELECT count(*) FROM public.song), (SELECT coalesce(max(id), 0) FROM public.song), "
+            "(SELECT coalesce(sum(n_tup_ins + n_tup_upd + n_tup_del), 0)::bigint FROM pg_stat_user_tables "
+            "WHERE schemaname = 'public' AND relname IN ('album', 'song'))"
+        )
 
-        self.cursor.execute(q_obj)
-        fetch_results = self.cursor.fetchall()
+        rows = [row for fetch_results in self.db.query("xspf_db_signature", q_obj, 1) for row in fetch_results]
 
-        self.conn.close()
+        return list(rows[0]) if rows else []
 
-        if not fetch_results:
-            return []
+    def fetch_db_catalogue(self):
+        """
+        Read the album folders and their genres from the DB, see read_dir_genres_from_db()
+        :return: A DirCatalogue instance
+        :raise DbUnavailable: If the DB cannot be queried
+        """
+        return DirCatalogue(
+            (a_dir_name, a_dir_genre if a_dir_name != 'Various' else 'Pop')
+            for a_dir_name, a_dir_genre in self.read_dir_genres_from_db()
+        )
+
+    def read_db_catalogue(self):
+        """
+        Read the album folders and their genres from the DB snapshot if the signature of the DB has not changed since
+        the snapshot was saved, otherwise from the DB, saving a new snapshot. If the DB cannot be queried, the last
+        snapshot is used whatever its signature, which is much faster than scanning the directory.
+        :return: A DirCatalogue instance
+        :raise DbUnavailable: If the DB cannot be queried and there is no snapshot to use
+        """
+        if not self.db_snapshot or not self.db.configured:
+            return self.fetch_db_catalogue()
+
+        try:
+            signature = self.read_db_signature()
 
-        return sorted(fetch_results)
+            with self.stats.phase("load_db_snapshot"):
+                snapshot = self.db_snapshot.load(signature)
+
+            if snapshot:
+                self.stats.count("db_snapshot_hits")
+                return snapshot.catalogue
+
+            catalogue = self.fetch_db_catalogue()
+        except DbUnavailable as e:  # NOQA
+            snapshot = self.db_snapshot.load()
+
+            if not snapshot:
+                raise
+
+            log_it("warning", __name__, f"DB not available, using the DB snapshot saved {snapshot.saved}: {e}")
+            self.stats.count("db_snapshot_stale")
+            return snapshot.catalogue
+
+        self.db_snapshot.save(signature, catalogue)
+
+        return catalogue
+
+    @timed("read_tracks_from_db")
+    def read_tracks_from_db(self):
+        """
+        Read the songs of the albums in the top-level folders from the DB, ordered by album path and track number, so
+        the songs of an album are contiguous. The rows are fetched in batches through a named (server-side) cursor,
+        so the client memory used does not depend on the number of songs.
+        :return: A generator of TrackItem instances
+        :raise DbUnavailable: If the DB cannot be queried
+        """
+        from psycopg2 import sql  # pylint: disable=import-outside-toplevel
+
+        q_obj = sql.SQL(
+            "SELECT album.path COLLATE \"C\" AS album_path, album.title, album.artist, song.file, song.title, "
+            "song.artist, song.track_id, coalesce(song.genre, '') "
+            "FROM public.album JOIN public.song ON public.album.id = public.song.album_id "
+            "WHERE split_part(album.path, '/', 1) <> '' "
+            "ORDER BY album_path, album.id, song.track_id, song.file COLLATE \"C\""
+        )
 
-    def has_media(self, abs_parent, dir_name):
+        for fetch_results in self.db.query("xspf_tracks", q_obj, DB_BATCH_SIZE):
+            self.stats.count("db_rows", len(fetch_results))
+
+            for album_path, album, album_artist, file_name, title, artist, track_id, genre in fetch_results:
+                location = os.path.join(self.source_dir, album_path, file_name)
+                yield TrackItem(
+                    album_path=album_path, album=album if album else os.path.basename(album_path),
+                    location=location.replace(']', '%5D').replace('[', '%5B'), title=title,
+                    creator=artist if artist else album_artist,
+                    track_num=track_id if track_id and track_id > 0 else None,
+                    genre='Pop' if album_path.split('/', 1)[0] == 'Various' else genre
+                )
+
+    @timed("has_media")
+    def has_media(self, abs_parent, dir_name, deps=None):
         """
-        Check if a directory contains media files.
+        Check if a directory contains media files, searching it down to self.max_depth levels with a walker that stops
+        at the first media file, see dir_walker.find_first_media(). In multi mode with the 'all' and 'sample' genre
+        modes, all the media files are listed and the genre is aggregated from their tags, see aggregate_dir_genre().
         :param abs_parent: Absolute to parent directory
         :param dir_name: Name of the directory to check
+        :param deps: A list to which to add what the result depends on below the directory (the subdirectories walked
+        and the media file the genre was read from), see ScanCache.store(); None not to stat them
         :return: True if the directory contains media files, otherwise False, and the genre (str) of the first media
         file
         """
@@ -391,77 +935,307 @@ class PlaylistHandler:
 
         dir_path = str(os.path.join(abs_parent, dir_name))
 
-        for curr_dir, sub_dirs, files in os.walk(dir_path):
-            _ = curr_dir
-            _ = sub_dirs
+        if self.multi and self.genre_aggregator:
+            return self.aggregate_dir_genre(dir_path, deps)
 
-            if not files:
-                continue
+        dir_mtimes = {} if deps is not None else None
+        first_media = find_first_media(dir_path, MEDIA_EXTENSIONS, self.max_depth, dir_mtimes)
+        self.stats.count("dirs_walked", first_media.dirs_scanned)
+        self.stats.count("dir_entries_examined", first_media.entries_examined)
 
-            media_files = [name for name in files if str(name).rsplit(".", maxsplit=1)[-1] in MEDIA_EXTENSIONS]
-            first_file = next(iter(media_files), None)
-            if not first_file:
-                continue
+        if deps is not None:
+            deps += [(path, None, mtime_ns) for path, mtime_ns in dir_mtimes.items()]
+
+        if first_media.path is None:
+            return False, ''
+
+        if not self.multi:
+            return True, ''
+
+        # The file is stat'ed before its tag is read, so a re-tag while it is read makes the entry invalid:
+        if deps is not None:
+            deps.append(self.file_dep(first_media.path))
+
+        return True, self.read_tag_genre(first_media.path)
+
+    @staticmethod
+    def file_dep(file_path):
+        """
+        Build the scan cache dependency of a media file, see ScanCache.store()
+        :param file_path: Path to the file
+        :return: A tuple (path, size, mtime_ns), with None values if the file cannot be stat'ed, which never match
+        """
+        try:
+            file_stat = os.stat(file_path)
+        except OSError:
+            return file_path, None, None
+
+        return file_path, file_stat.st_size, file_stat.st_mtime_ns
+
+    def aggregate_dir_genre(self, dir_path, deps=None):
+        """
+        Check if a directory contains media files and aggregate the genres of all of them, or of a sample of them, into
+        a weighted genre set, see genre_aggregator.weigh_genres()
+        :param dir_path: Path to the directory
+        :param deps: A list to which to add the subdirectories walked, see has_media()
+        :return: True if the directory contains media files, otherwise False, and the genres of the directory by
+        descending weight, separated by ', '
+        """
+        dir_mtimes = {} if deps is not None else None
+        media_files = list_media_files(dir_path, MEDIA_EXTENSIONS, self.max_depth, dir_mtimes)
+
+        if deps is not None:
+            deps += [(path, None, mtime_ns) for path, mtime_ns in dir_mtimes.items()]
+
+        self.stats.count("dirs_walked", media_files.dirs_scanned)
+        self.stats.count("dir_entries_examined", media_files.entries_examined)
+
+        if not media_files.paths:
+            return False, ''
+
+        return True, self.genre_aggregator.aggregate(dir_path, media_files.paths)
+
+    def read_tag_genre(self, media_path):
+        """
+        Read the genre tag of a media file, with the fast reader, falling back to music_tag for the files the fast
+        reader does not understand
+        :param media_path: Path to the media file
+        :return: The genre, multiple values separated by ', '
+        """
+        file_genre = read_genre(media_path)
+        self.stats.count("tags_read")
 
-            if not self.multi:
-                return True, ''
+        # Only files the fast reader does not understand are parsed in full:
+        if file_genre is None:
+            import music_tag  # pylint: disable=import-outside-toplevel
 
-            file_obj = music_tag.load_file(os.path.join(curr_dir, first_file))
+            self.stats.count("tags_read_music_tag")
+            file_obj = music_tag.load_file(media_path)
             file_genre = file_obj['genre'].value
 
-            return True, file_genre
+        return file_genre
+
+    def probe_dir(self, abs_parent, dir_name, refresh=False):
+        """
+        Check if a directory contains media files, using the scan cache entry of the directory if it has not changed
+        since the previous scan.
+        :param abs_parent: Absolute to parent directory
+        :param dir_name: Name of the directory to check
+        :param refresh: True to ignore the cache entry, e.g. when a file in the directory is known to have changed
+        :return: True if the directory contains media files, otherwise False, and the genre (str) of the directory
+        """
+        if not self.scan_cache or dir_name.startswith('.'):
+            return self.has_media(abs_parent, dir_name)
+
+        dir_path = str(os.path.join(abs_parent, dir_name))
+
+        try:
+            dir_stat = os.stat(dir_path)
+        except OSError as e:  # NOQA
+            log_it("debug", __name__, "Cannot stat %s: %s", dir_path, e)
+            return False, ''
 
-        return False, ''
+        cached = None if refresh else self.scan_cache.lookup(dir_path, dir_stat, tagged=self.multi,
+                                                             genre_mode=self.genre_mode_key,
+                                                             check_files=bool(self.multi and self.genre_aggregator))
+        if cached is not None:
+            self.stats.count("scan_cache_hits")
+            return cached
 
+        self.stats.count("scan_cache_misses")
+        deps = []
+        has_media, media_genre = self.has_media(abs_parent, dir_name, deps)
+        self.scan_cache.store(dir_path, dir_stat, has_media, media_genre, tagged=self.multi,
+                              genre_mode=self.genre_mode_key, deps=deps)
+
+        return has_media, media_genre
+
+    @timed("list_directories")
     def list_directories(self, in_dir=None):
         """
-        List directories with media files in them
+        List directories with media files in them. Without in_dir, the folders of all the source directories are
+        listed: those of the first one from the DB, and those of the others (of all of them if the DB lists no
+        folders) by scanning them concurrently, see scan_roots(); the listings are merged, see merge_media_dirs().
         :param in_dir: Directory for which to produce the listing
         :return: An instance of MediaItems listing the directory and the media files in it
         """
+        other_dirs = () if in_dir else self.source_dirs[1:]
+
         if not in_dir:
             in_dir = self.source_dir
 
-        work_dirs = []
-        out_subdirectories = []
+        try:
+            out_subdirectories = self.read_db_catalogue()
+        except DbUnavailable as e:  # NOQA
+            log_it("warning", __name__, f"DB not available, scanning {in_dir}: {e}")
+            out_subdirectories = DirCatalogue()
+
+        self.db_listed_dir = in_dir if out_subdirectories else None
 
-        db_dirs = self.read_dir_genres_from_db()
+        if not other_dirs:
+            if out_subdirectories:
+                return MediaDirs(parent=in_dir, dirs=out_subdirectories)
 
-        if db_dirs:
-            for a_dir in db_dirs:
-                a_dir_name = next(iter(a_dir[0].split('/')), '')
-                dir_to_add = DirItem(name=a_dir_name, genre=a_dir[1] if a_dir_name != 'Various' else 'Pop')
-                if a_dir_name and dir_to_add not in out_subdirectories:
-                    out_subdirectories.append(dir_to_add)
+            return self.scan_directories(in_dir)
 
-            return MediaDirs(parent=in_dir, dirs=out_subdirectories)
+        if out_subdirectories:
+            return merge_media_dirs([MediaDirs(parent=in_dir, dirs=out_subdirectories)] + self.scan_roots(other_dirs))
 
-        for curr_dir, sub_dirs, files in os.walk(in_dir):
-            if curr_dir != in_dir:
-                break
+        return merge_media_dirs(self.scan_roots((in_dir,) + other_dirs))
 
-            work_dirs += list(sub_dirs)
-            # Get media files, but only from the top directory
-            work_files = [s_file for s_file in files if s_file.split(".")[-1] in MEDIA_EXTENSIONS]
-            if not work_files:
-                continue
+    def scan_tracks(self, *in_dirs):
+        """
+        List the media files of the directories with media files by scanning the file system, used when the DB is not
+        available. The files of each directory are grouped by the subdirectory (e.g. the disc) they are in, and have
+        the genre of their top-level directory; their titles are not read.
+        :param in_dirs: The directories for which to produce the listing, merged if there are several
+        :return: A generator of TrackItem instances
+        """
+        media_dirs = self.scan_directories(in_dirs[0]) if len(in_dirs) == 1 else \
+            merge_media_dirs(self.scan_roots(in_dirs))
+
+        for folder in media_dirs.dirs:
+            media_files = list_media_files(os.path.join(media_dirs.parent, folder.name), MEDIA_EXTENSIONS,
+                                           self.max_depth)
+            self.stats.count("dirs_walked", media_files.dirs_scanned)
+            self.stats.count("dir_entries_examined", media_files.entries_examined)
+
+            for media_path in media_files.paths:
+                album_path = os.path.relpath(os.path.dirname(media_path), media_dirs.parent)
+                yield TrackItem(album_path=album_path, album=album_path,
+                                location=media_path.replace(']', '%5D').replace('[', '%5B'), title=None,
+                                creator=None, track_num=None, genre=folder.genre)
+
+    def list_tracks(self, in_dir=None):
+        """
+        List the media files of the directories with media files, from the DB, or from the file system if the DB has
+        no songs. Without in_dir, the media files of all the source directories are listed: those of the first one
+        from the DB, followed by those of the others, scanned
+        :param in_dir: Directory for which to produce the listing
+        :return: An iterator of TrackItem instances, the tracks of an album are contiguous
+        """
+        other_dirs = () if in_dir else self.source_dirs[1:]
+
+        if not in_dir:
+            in_dir = self.source_dir
+
+        tracks = self.read_tracks_from_db()
+
+        try:
+            first_track = next(tracks, None)
+        except DbUnavailable as e:  # NOQA
+            log_it("warning", __name__, f"DB not available, scanning {in_dir}: {e}")
+            first_track = None
+
+        if first_track is None:
+            return self.scan_tracks(in_dir, *other_dirs)
+
+        if other_dirs:
+            return chain((first_track,), tracks, self.scan_tracks(*other_dirs))
+
+        return chain((first_track,), tracks)
 
-        for work_dir in sorted(list(work_dirs)):
-            has_media, media_genre = self.has_media(in_dir, work_dir)
+    def probe_dirs(self, abs_parent, dir_names, refresh=False):
+        """
+        Check which of the directories contain media files. With more than one job the directories are probed
+        concurrently on a bounded thread pool, which hides the latency of network file systems.
+        :param abs_parent: Absolute to parent directory
+        :param dir_names: Names of the directories to check
+        :param refresh: True to ignore the scan cache entries of the directories
+        :return: A list of tuples (directory name, (has media, genre)), in the order of dir_names
+        """
+        if self.jobs < 2 or len(dir_names) < 2:
+            return [(dir_name, self.probe_dir(abs_parent, dir_name, refresh)) for dir_name in dir_names]
+
+        with ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix="xspf-probe") as pool:
+            results = pool.map(lambda dir_name: self.probe_dir(abs_parent, dir_name, refresh), dir_names)
 
-            if has_media:
-                out_subdirectories.append(DirItem(name=work_dir, genre=media_genre))
+            return list(zip(dir_names, results))
+
+    @timed("scan_directories")
+    def scan_directories(self, in_dir):
+        """
+        List directories with media files in them by scanning the file system, used when the DB is not available
+        :param in_dir: Directory for which to produce the listing
+        :return: An instance of MediaItems listing the directory and the media files in it
+        """
+        out_subdirectories = self.scan_root(in_dir)
+        self.end_scan()
 
         return MediaDirs(parent=in_dir, dirs=out_subdirectories)
 
+    @timed("scan_roots")
+    def scan_roots(self, in_dirs):
+        """
+        Scan several source directories by mount (file system): the directories of different mounts are scanned
+        concurrently, each mount by a worker of its own probing its folders on a pool of self.jobs threads of its
+        own, so a slow network share does not hold up a fast local disk; the directories of the same mount are
+        scanned one after another
+        :param in_dirs: The directories for which to produce the listings
+        :return: A list of MediaDirs instances, in the order of in_dirs
+        """
+        mounts = {}
+
+        for in_dir in in_dirs:
+            try:
+                mount_key = os.stat(in_dir).st_dev
+            except OSError:
+                mount_key = in_dir
+
+            mounts.setdefault(mount_key, []).append(in_dir)
+
+        def scan_mount(mount_dirs):
+            return [(in_dir, self.scan_root(in_dir)) for in_dir in mount_dirs]
+
+        with ThreadPoolExecutor(max_workers=len(mounts), thread_name_prefix="xspf-mount") as pool:
+            listings = dict(chain.from_iterable(pool.map(scan_mount, mounts.values())))
+
+        self.end_scan()
+
+        return [MediaDirs(parent=in_dir, dirs=listings[in_dir]) for in_dir in in_dirs]
+
+    def scan_root(self, in_dir):
+        """
+        List the directories with media files of a source directory by scanning it, without ending the scan, see
+        end_scan()
+        :param in_dir: Directory for which to produce the listing
+        :return: A DirCatalogue instance
+        """
+        work_dirs, entries_examined = list_sub_dirs(in_dir)
+        self.stats.count("dir_entries_examined", entries_examined)
+        out_subdirectories = DirCatalogue(
+            (work_dir, media_genre)
+            for work_dir, (has_media, media_genre) in self.probe_dirs(in_dir, sorted(list(work_dirs))) if has_media
+        )
+
+        if self.scan_cache:
+            self.scan_cache.prune(in_dir, work_dirs)
+
+        return out_subdirectories
+
+    def end_scan(self):
+        """
+        Stop the threads reading tags and save the scan cache, once the directories are probed
+        :return: void
+        """
+        if self.genre_aggregator:
+            self.genre_aggregator.close()
+
+        if self.scan_cache:
+            self.scan_cache.commit()
+
     @staticmethod
-    def write_file(filename, file_data, dest_dir=None):
+    def write_file(filename, file_data, dest_dir=None, pretty=False, skip_unchanged=False, stats=None):
         """
-        Write file to disk.
+        Write file to disk. The data is written to a temporary file that then replaces the file, so the file is never
+        seen partly written.
         :param filename: Name of the file to use
         :param file_data: The file contents to use
         :param dest_dir: Directory where to put the file
-        :return: Always True
+        :param pretty: True to indent XML (str) contents before writing them
+        :param skip_unchanged: True to leave the file untouched if it already has the same contents
+        :param stats: A RunStats instance in which to count the file, None not to count it
+        :return: True if the file was written, False if it was left unchanged
         """
         cur_dir = os.getcwd()
 
@@ -474,16 +1248,20 @@ class PlaylistHandler:
         filepath = os.path.join(dest_dir, filename)
 
         if isinstance(file_data, dict):
-            with open(filepath, 'w', encoding="UTF-8") as out:
-                out.write(json.dumps(file_data, indent=4, sort_keys=True, ensure_ascii=False))
-        elif isinstance(file_data, str):
-            with open(filepath, 'w', encoding="UTF-8") as out:
-                out.write(file_data)
-        else:
-            with open(filepath, 'wb', encoding="UTF-8") as out:
-                out.write(file_data)
+            file_data = json.dumps(file_data, indent=4, sort_keys=True, ensure_ascii=False)
+        elif isinstance(file_data, str) and pretty:
+            file_data = indent_xml(file_data)
+
+        with AtomicOutput(filepath, skip_unchanged=skip_unchanged) as out:
+            out.write(file_data)
+
+        if stats:
+            stats.count_output(out)
 
-        return True
+        if not out.changed:
+            log_it("debug", __name__, "Unchanged, not written: %s", filepath)
+
+        return out.changed
 
     @staticmethod
     def read_file(filepath):
@@ -501,6 +1279,8 @@ class PlaylistHandler:
 
     @staticmethod
     def make_soup(in_title='All'):   # pylint: disable=missing-function-docstring
+        from bs4 import BeautifulSoup  # pylint: disable=import-outside-toplevel
+
         soup = BeautifulSoup(XSPF_HEAD, "xml")
         playlist_tag = soup.new_tag(name="playlist")
         playlist_tag['xmlns'] = "http://xspf.org/ns/0/"
@@ -518,18 +1298,23 @@ class PlaylistHandler:
         if not self.start_file or name != 'All':
             return self.make_soup(name)
 
+        from bs4 import BeautifulSoup  # pylint: disable=import-outside-toplevel
+
         return BeautifulSoup(self.read_file(self.start_file), "xml")
 
-    def get_vlc_node(self, in_soup, node_name='music'):  # pylint: disable=missing-function-docstring
+    @staticmethod
+    def get_vlc_node(in_soup, node_name='music'):  # pylint: disable=missing-function-docstring
         music_node = next(iter(in_soup.find_all(name="vlc:node", recursive=True, title="music")), None)
 
         if not music_node:
-            return self.create_vlc_node(in_soup, node_title=node_name)
+            return PlaylistHandler.create_vlc_node(in_soup, node_title=node_name)
 
         return music_node
 
     @staticmethod
     def create_vlc_node(now_soup, node_title='music'):  # pylint: disable=missing-function-docstring
+        from bs4 import Tag  # pylint: disable=import-outside-toplevel
+
         result = now_soup.find_all(name="extension", recursive=True)
         result_tags = [res for res in result if isinstance(res, Tag)]
 
@@ -564,6 +1349,8 @@ class PlaylistHandler:
 
     @staticmethod
     def get_last_id(in_soup):  # pylint: disable=missing-function-docstring
+        from bs4 import Tag  # pylint: disable=import-outside-toplevel
+
         tracklist = next(iter(in_soup.find_all(name="trackList", recursive=True, limit=1)), None)
 
         if not tracklist.contents:
@@ -573,93 +1360,571 @@ class PlaylistHandler:
             int(tag.text) for tag in in_soup.find_all(name="vlc:id", recursive=True) if isinstance(tag, Tag)
         )
 
-    def build_flat_playlist(self, playlist_name='All', use_directories=None):
+    def can_stream(self, playlist_name):
         """
-        Build one flat xspf playlist.
+        Check if a playlist can be streamed to its file, i.e. it is a new playlist rather than the start file extended
         :param playlist_name: A string containing the name of the playlist
-        :param use_directories:
-        :return: the last id from the playlist (count of items)
+        :return: True if the playlist can be written by XspfWriter, False if it must be built as a soup
+        """
+        return self.streaming and (not self.start_file or playlist_name != 'All')
+
+    @timed("stream_playlist")
+    def stream_playlist(self, playlist_name, locations, out_file):
+        """
+        Write a new xspf playlist to a file track by track, without building it in memory first.
+        :param playlist_name: A string containing the name (title) of the playlist
+        :param locations: An iterable of the paths of the playlist tracks
+        :param out_file: The path and name of the file to write
+        :return: the last id from the playlist
+        """
+        if not os.path.isdir(self.out_dir):
+            os.mkdir(self.out_dir)
+
+        last_id = self.write_stream(playlist_name, locations, out_file, pretty=self.pretty,
+                                    skip_unchanged=self.skip_unchanged, stats=self.stats)
+        self.notifier.notify(select_key=Result.PROCESSED)
+
+        return last_id
+
+    @staticmethod
+    def write_stream(playlist_name, locations, out_file, pretty=False, skip_unchanged=False, stats=None):
+        """
+        Write a new xspf playlist to a file with XspfWriter, see stream_playlist()
+        :param playlist_name: A string containing the name (title) of the playlist
+        :param locations: An iterable of the paths of the playlist tracks
+        :param out_file: The path and name of the file to write
+        :param pretty: True to write the playlist indented
+        :param skip_unchanged: True to leave the file untouched if it already has the same contents
+        :param stats: A RunStats instance in which to count the file, None not to count it
+        :return: the last id from the playlist
+        """
+        with AtomicOutput(out_file, skip_unchanged=skip_unchanged) as out:
+            last_id = PlaylistHandler.stream_tracks(out, playlist_name, locations, pretty=pretty)
+
+        if stats:
+            stats.count_output(out)
+
+        if not out.changed:
+            log_it("debug", __name__, "Unchanged, not written: %s", out_file)
+
+        return last_id
+
+    @staticmethod
+    def stream_tracks(out, playlist_name, locations, pretty=False):
+        """
+        Write a new xspf playlist to an output with XspfWriter, see write_stream()
+        :param out: A text file object, or an AtomicOutput instance, to write to
+        :param playlist_name: A string containing the name (title) of the playlist
+        :param locations: An iterable of the paths of the playlist tracks
+        :param pretty: True to write the playlist indented
+        :return: the last id from the playlist
+        """
+        writer = XspfWriter(out, title=playlist_name, pretty=pretty)
+
+        for location in locations:
+            writer.add_track("file:///" + location)
+
+        return writer.close()
+
+    def extend_start_file(self, locations, out_file):
+        """
+        Extend the start file with new tracks and save it. The start file is read in a single lxml pass instead of
+        being parsed into a soup and searched for the track list, the music node and the last id.
+        :param locations: An iterable of the paths of the tracks to add
+        :param out_file: The path and name of the file to write
+        :return: the last id from the playlist
+        """
+        from start_playlist import StartPlaylist  # pylint: disable=import-outside-toplevel
+
+        start_playlist = StartPlaylist(self.start_file)
+
+        for location in locations:
+            start_playlist.add_track("file:///" + location)
+
+        if self.pretty:
+            start_playlist.indent()
+
+        self.save_playlist(start_playlist, use_out_file=out_file, pretty=False)
+
+        return start_playlist.last_id
+
+    def build_soup_playlist(self, playlist_name, locations, out_file):
+        """
+        Build an xspf playlist as a soup, extending the start file if there is one, and save it.
+        :param playlist_name: A string containing the name (title) of the playlist
+        :param locations: An iterable of the paths of the playlist tracks
+        :param out_file: The path and name of the file to write
+        :return: the last id from the playlist
         """
         soup = self.get_soup(playlist_name)
+        last_id = self.add_soup_tracks(soup, locations)
+        self.save_playlist(soup, use_out_file=out_file)
+
+        return last_id
+
+    @staticmethod
+    def add_soup_tracks(soup, locations):
+        """
+        Add tracks to the track list of a playlist soup and reference them from its music node
+        :param soup: A BeautifulSoup instance holding a playlist
+        :param locations: An iterable of the paths of the tracks to add
+        :return: the last id from the playlist
+        """
+        from bs4 import Tag  # pylint: disable=import-outside-toplevel
+
         tracklist = next(iter(soup.find_all(name="trackList", recursive=True, limit=1)), Tag)
-        last_id = self.get_last_id(soup)
-        music_node = self.get_vlc_node(soup)
-        use_directories = use_directories if use_directories else self.directories
+        last_id = PlaylistHandler.get_last_id(soup)
+        music_node = PlaylistHandler.get_vlc_node(soup)
 
-        for folder in use_directories.dirs:
-            encoded_dir = folder.name.replace(']', '%5D').replace('[', '%5B')
-            new_track, last_id = self.build_track(soup, os.path.join(self.directories.parent, encoded_dir), last_id)
+        for location in locations:
+            new_track, last_id = PlaylistHandler.build_track(soup, location, last_id)
             tracklist.append(new_track)
             music_node.append(soup.new_tag(name="vlc:item", tid=f"{last_id}"))
 
-        self.save_playlist(soup, use_out_file=os.path.join(self.out_dir, f"{playlist_name.lower()}.xspf"))
+        return last_id
+
+    @timed("build_flat_playlist")
+    def build_flat_playlist(self, playlist_name='All', use_directories=None):
+        """
+        Build one flat xspf playlist.
+        :param playlist_name: A string containing the name of the playlist
+        :param use_directories:
+        :return: the last id from the playlist (count of items)
+        """
+        use_directories = use_directories if use_directories else self.directories
+
+        if self.can_shard(playlist_name):
+            shards = self.shard_folders(use_directories.dirs)
+            self.remove_stale_shards(playlist_name, shards)
+
+            if shards:
+                return self.run_render_tasks(self.playlist_tasks(playlist_name, use_directories.dirs, shards))
+
+        locations = self.folder_locations(use_directories.dirs)
+        out_file = os.path.join(self.out_dir, f"{playlist_name.lower()}.xspf")
+
+        if self.can_stream(playlist_name):
+            last_id = self.stream_playlist(playlist_name, locations, out_file)
+        elif self.streaming:
+            last_id = self.extend_start_file(locations, out_file)
+        else:
+            last_id = self.build_soup_playlist(playlist_name, locations, out_file)
+
+        self.stats.count("playlist_tracks", last_id + 1)
 
         # self.notifier.notify(select_key=Result.PLAYLIST_GENERATED)
         return last_id + 1  # id's start at 0
 
+    def can_shard(self, playlist_name):
+        """
+        Check if a playlist is split into shards when it is too large, i.e. sharding is on and it is a new playlist
+        rather than the start file extended
+        :param playlist_name: A string containing the name of the playlist
+        :return: True if the playlist can be sharded
+        """
+        return bool(self.shard_size) and (not self.start_file or playlist_name != 'All')
+
+    def shard_folders(self, folders):
+        """
+        Split the folders of a playlist into shards of at most self.shard_size folders: consecutive runs of folders,
+        or, with self.shard_by 'alpha', alphabetical ranges of the initials of the folder names, see folder_initial().
+        The folders of consecutive initials are grouped while they fit in a shard, and all the folders of an initial
+        are in the same shard, however many they are, so a folder added or removed only changes its own shard unless
+        the ranges move. With shards by count, a folder added or removed shifts the folders of the following shards.
+        :param folders: A sequence of DirItem instances, or a DirCatalogue instance
+        :return: A list of tuples (shard key, list of DirItem), empty if the folders fit in one playlist
+        """
+        if not self.shard_size or len(folders) <= self.shard_size:
+            return []
+
+        if self.shard_by == 'count':
+            width = max(3, len(str(len(folders) // self.shard_size + 1)))
+
+            return [(f"{number + 1:0{width}d}", folders[start:start + self.shard_size])
+                    for number, start in enumerate(range(0, len(folders), self.shard_size))]
+
+        by_initial = {}
+
+        for folder in folders:
+            by_initial.setdefault(folder_initial(folder.name), []).append(folder)
+
+        shards = []
+
+        for initial in sorted(by_initial, key=SHARD_INITIALS.index):
+            if shards and len(shards[-1][2]) + len(by_initial[initial]) <= self.shard_size:
+                shards[-1][1] = initial
+                shards[-1][2] += by_initial[initial]
+            else:
+                shards.append([initial, initial, by_initial[initial]])
+
+        return [(first if first == last else f"{first}-{last}", shard) for first, last, shard in shards]
+
+    def playlist_tasks(self, playlist_name, folders, shards):
+        """
+        Plan the writing of a playlist: one task, or, if it is split into shards, one task per shard, written to
+        <name>.<shard key>.xspf, followed by the task of the index playlist <name>.xspf referencing the shards, as the
+        parent playlist references the genre playlists. The shards and their index are only written if their contents
+        changed, so a change to a folder only rewrites the shard holding it.
+        :param playlist_name: A string containing the name of the playlist
+        :param folders: A sequence of DirItem instances, or a DirCatalogue instance
+        :param shards: The shards of the folders, see shard_folders(), empty to write the playlist in one file
+        :return: A list of RenderTask instances
+        """
+        stem = playlist_name.lower()
+
+        if not shards:
+            return [RenderTask(playlist_name=playlist_name, locations=list(self.folder_locations(folders)),
+                               out_file=os.path.join(self.out_dir, f"{stem}.xspf"), streaming=self.streaming,
+                               pretty=self.pretty, skip_unchanged=self.skip_unchanged)]
+
+        shard_files = self.shard_files(playlist_name, shards)
+        tasks = [
+            RenderTask(playlist_name=f"{playlist_name} {key}", locations=list(self.folder_locations(shard)),
+                       out_file=os.path.join(self.out_dir, shard_file), streaming=self.streaming, pretty=self.pretty,
+                       skip_unchanged=True)
+            for (key, shard), shard_file in zip(shards, shard_files)
+        ]
+        tasks.append(RenderTask(
+            playlist_name=playlist_name,
+            locations=[os.path.join(self.out_dir, shard_file.replace(']', '%5D').replace('[', '%5B'))
+                       for shard_file in shard_files],
+            out_file=os.path.join(self.out_dir, f"{stem}.xspf"), streaming=self.streaming, pretty=self.pretty,
+            skip_unchanged=True, index=True
+        ))
+
+        return tasks
+
+    @staticmethod
+    def shard_files(playlist_name, shards):
+        """
+        Name the files of the shards of a playlist
+        :param playlist_name: A string containing the name of the playlist
+        :param shards: The shards of the playlist, see shard_folders()
+        :return: A list of the file names, <name>.<shard key>.xspf, in the order of the shards
+        """
+        return [f"{playlist_name.lower()}.{key}.xspf" for key, _ in shards]
+
+    def remove_stale_shards(self, playlist_name, shards):
+        """
+        Remove the shards of a playlist written by an earlier run that are not written any longer, e.g. when the
+        playlist got smaller or the alphabetical ranges moved
+        :param playlist_name: A string containing the name of the playlist
+        :param shards: The shards of the playlist written by this run, see shard_folders(), empty if it is not split
+        :return: void
+        """
+        shard_re = re.compile(rf"^{re.escape(playlist_name.lower())}\.(\d{{3,}}|[0a-z_](-[0a-z_])?)\.xspf$")
+        keep_files = set(self.shard_files(playlist_name, shards))
+
+        try:
+            file_names = os.listdir(self.out_dir)
+        except OSError:
+            return
+
+        for file_name in file_names:
+            if shard_re.match(file_name) and file_name not in keep_files:
+                log_it("debug", __name__, "Removing the stale shard %s", file_name)
+                os.unlink(os.path.join(self.out_dir, file_name))
+
+    def folder_locations(self, folders):
+        """
+        Build the paths of the playlist entries of folders
+        :param folders: An iterable of DirItem instances, or a DirCatalogue instance
+        :return: A generator of the paths, with the square brackets of the folder names escaped
+        """
+        names = folders.names() if isinstance(folders, DirCatalogue) else (folder.name for folder in folders)
+
+        return (
+            os.path.join(self.directories.parent, name.replace(']', '%5D').replace('[', '%5B'))
+            for name in names
+        )
+
+    @timed("build_parent_playlist")
     def build_parent_playlist(self, playlist_name='all'):
         """
         Build the parent xspf playlist that references radio.xspf and other, created playlists.
         :param playlist_name: A string containing the name of the playlist
         :return: the last id from the parent playlist
         """
-        soup = self.get_soup(playlist_name)
-        tracklist = next(iter(soup.find_all(name="trackList", recursive=True, limit=1)), Tag)
-        last_id = self.get_last_id(soup)
-        music_node = self.get_vlc_node(soup)
-
-        playlists = (['radio.xspf'] if self.start_file else []) + [f"{key}.xspf" for key in self.genre_lists]
+        locations = self.parent_locations()
+        out_file = os.path.join(self.out_dir, f"{playlist_name}.xspf")
 
-        for play_list in playlists:
-            encoded_name = play_list.replace(']', '%5D').replace('[', '%5B')
-            new_track, last_id = self.build_track(soup, os.path.join(self.out_dir, encoded_name.lower()), last_id)
-            tracklist.append(new_track)
-            music_node.append(soup.new_tag(name="vlc:item", tid=f"{last_id}"))
-
-        self.save_playlist(soup, use_out_file=os.path.join(self.out_dir, f"{playlist_name}.xspf"))
+        if self.can_stream(playlist_name):
+            last_id = self.stream_playlist(playlist_name, locations, out_file)
+        else:
+            last_id = self.build_soup_playlist(playlist_name, locations, out_file)
 
         # self.notifier.notify(select_key=Result.PLAYLIST_GENERATED)
         return last_id
 
-    def build_genre_playlists(self):  # pylint: disable=missing-function-docstring
-        item_count = 0
+    def parent_locations(self):
+        """
+        Build the paths of the playlist entries of the parent playlist: the start file copied to the output
+        directory, if any, and the genre playlists
+        :return: A generator of the paths, with the square brackets of the playlist names escaped
+        """
+        playlists = (['radio.xspf'] if self.start_file else []) + [f"{key}.xspf" for key in self.genre_lists]
 
-        if self.start_file:
-            copyfile(self.start_file, os.path.join(self.out_dir, os.path.basename(self.start_file)))
+        return (
+            os.path.join(self.out_dir, play_list.replace(']', '%5D').replace('[', '%5B').lower())
+            for play_list in playlists
+        )
+
+    @staticmethod
+    def build_genre_index(genre_lists):
+        """
+        Build the inverted index of the genre playlist configuration. The genres of the 'Jazz' playlist only go to the
+        playlists with 'Jazz' in their name, whichever other playlists include them, so a folder with Jazz and Rock
+        tracks goes to the Jazz playlists for its Jazz genre and to the Rock playlists for its Rock genre.
+        :param genre_lists: A dict of playlist name -> set of genres
+        :return: A dict of genre -> tuple of the names of the playlists the genre goes to, in configuration order
+        """
+        genre_index = {}
+        jazz_genres = frozenset(genre_lists.get('Jazz', ()))
 
-        for list_name, list_genres in self.genre_lists.items():
-            selected_dirs = []
-            folder_genres = set()
+        for list_name, list_genres in genre_lists.items():
+            for genre in list_genres:
+                genre_index.setdefault(genre, ())
 
-            for folder in self.directories.dirs:
-                try:
-                    folder_genres = set(folder.genre.split(', '))
-                except AttributeError:
-                    log_it('error', __name__, f"{repr(folder)}")
-                    sys.exit(111)
+                if genre not in jazz_genres or 'Jazz' in list_name:
+                    genre_index[genre] += (list_name,)
 
-                if 'Jazz' not in list_name and folder_genres.intersection(self.genre_lists['Jazz']):
-                    continue
+        return genre_index
 
-                if not folder_genres.intersection(list_genres):
-                    continue
+    def route_folders(self, folders):
+        """
+        Assign folders to the genre playlists including any of their genres, in a single pass over the folders.
+        Folders with a Jazz genre only go to playlists with 'Jazz' in their name, and a folder appears at most once
+        in a playlist.
+        :param folders: An iterable of DirItem instances, or a DirCatalogue instance, see route_catalogue()
+        :return: An OrderedDict of playlist name -> list of DirItem (DirCatalogue view for a DirCatalogue), with an
+        entry for every configured playlist
+        """
+        if isinstance(folders, DirCatalogue):
+            return self.route_catalogue(folders)
+
+        routed = OrderedDict((list_name, []) for list_name in self.genre_lists)
+        selected_names = {list_name: set() for list_name in self.genre_lists}
 
+        for folder in folders:
+            for list_name in self.folder_lists(folder):
                 # No duplicate folder entries:
-                if folder.name in list({s_dir.name for s_dir in selected_dirs}):
+                if folder.name in selected_names[list_name]:
                     continue
 
-                selected_dirs.append(folder)
+                selected_names[list_name].add(folder.name)
+                routed[list_name].append(folder)
+
+        return routed
 
+    def route_catalogue(self, catalogue):
+        """
+        Assign the folders of a catalogue to the genre playlists, like route_folders(). The playlists of each distinct
+        genre string are found once, then the folders are assigned by the ID of their genre string, and the folders of
+        each playlist are returned as a view of the catalogue. The folders of a catalogue are unique.
+        :param catalogue: A DirCatalogue instance
+        :return: An OrderedDict of playlist name -> DirCatalogue view, with an entry for every configured playlist
+        """
+        string_lists = [self.folder_lists(DirItem(name='', genre=genre)) for genre in catalogue.genre_strings]
+
+        return OrderedDict(
+            (list_name, catalogue.take_genre_strings(
+                string_id for string_id, list_names in enumerate(string_lists) if list_name in list_names
+            ))
+            for list_name in self.genre_lists
+        )
+
+    def folder_lists(self, folder):
+        """
+        Find the genre playlists a folder goes to: the playlists each of its genres goes to, see build_genre_index()
+        :param folder: A DirItem instance
+        :return: A set of playlist names
+        """
+        try:
+            folder_genres = set(folder.genre.split(', '))
+        except AttributeError:
+            log_it('error', __name__, f"{repr(folder)}")
+            sys.exit(111)
+
+        return {list_name for genre in folder_genres for list_name in self._genre_index.get(genre, ())}
+
+    def write_genre_playlists(self, routed):
+        """
+        Write genre playlists, one after another, or concurrently in self.render_jobs processes, see
+        render_genre_playlists()
+        :param routed: An OrderedDict of playlist name -> list of DirItem, see route_folders()
+        :return: The number of items in the playlists
+        """
+        if self.render_jobs > 1 and len(routed) > 1:
+            return self.render_genre_playlists(routed)
+
+        item_count = 0
+
+        for list_name, selected_dirs in routed.items():
             item_count += self.build_flat_playlist(
                 list_name,
                 MediaDirs(parent=self.directories.parent, dirs=selected_dirs)
             )
 
+        return item_count
+
+    @timed("render_genre_playlists")
+    def render_genre_playlists(self, routed):
+        """
+        Render and write genre playlists concurrently on a pool of processes, one playlist (or shard) per task, so
+        building and serialising many playlists (BeautifulSoup in particular) is not bound to one core. The playlists
+        are the same as those written by build_flat_playlist(), and the results are collected in the order of the
+        playlists, so the run is deterministic.
+        :param routed: An OrderedDict of playlist name -> list of DirItem, see route_folders()
+        :return: The number of items in the playlists
+        """
+        tasks = []
+
+        for list_name, selected_dirs in routed.items():
+            shards = self.shard_folders(selected_dirs) if self.can_shard(list_name) else []
+            tasks += self.playlist_tasks(list_name, selected_dirs, shards)
+
+            if self.shard_size:
+                self.remove_stale_shards(list_name, shards)
+
+        return self.run_render_tasks(tasks, self.render_jobs)
+
+    def run_render_tasks(self, tasks, jobs=1):
+        """
+        Render and write playlists in this process, or concurrently on a pool of processes started afresh (see
+        RENDER_START_METHOD), which log as this process does, see render_playlist() and init_render_worker()
+        :param tasks: A list of RenderTask instances
+        :param jobs: The number of processes, 1 to render the playlists in this process
+        :return: The number of items in the playlists, the entries of index playlists not counted
+        """
+        if not os.path.isdir(self.out_dir):
+            os.mkdir(self.out_dir)
+
+        item_count = 0
+
+        with ExitStack() as stack:
+            if jobs > 1 and len(tasks) > 1:
+                pool = stack.enter_context(ProcessPoolExecutor(
+                    max_workers=min(jobs, len(tasks)), mp_context=multiprocessing.get_context(RENDER_START_METHOD),
+                    initializer=init_render_worker, initargs=(logging.getLogger().getEffectiveLevel(),)
+                ))
+                results = pool.map(render_playlist, tasks)
+            else:
+                results = map(render_playlist, tasks)
+
+            for task, (last_id, counters) in zip(tasks, results):
+                for name, value in counters.items():
+                    self.stats.count(name, value)
+
+                self.notifier.notify(select_key=Result.PROCESSED)
+
+                if not task.index:
+                    self.stats.count("playlist_tracks", last_id + 1)
+                    item_count += last_id + 1
+
+        return item_count
+
+    def copy_start_file(self):
+        """
+        Copy the start file beside the genre playlists, which reference it; in pretty mode it is indented like them
+        :return: void
+        """
+        file_name = os.path.basename(self.start_file)
+
+        if not self.pretty:
+            if not os.path.isdir(self.out_dir):
+                os.mkdir(self.out_dir)
+
+            copyfile(self.start_file, os.path.join(self.out_dir, file_name))
+            return
+
+        self.write_file(file_name, self.read_file(self.start_file), self.out_dir, pretty=True,
+                        skip_unchanged=self.skip_unchanged, stats=self.stats)
+
+    @timed("build_genre_playlists")
+    def build_genre_playlists(self):  # pylint: disable=missing-function-docstring
+        if self.start_file:
+            self.copy_start_file()
+
+        item_count = self.write_genre_playlists(self.route_folders(self.directories.dirs))
+
+        # The parent playlist is written once all the genre playlists are:
         _ = self.build_parent_playlist()
 
         # self.notifier.notify(select_key=Result.PLAYLIST_GENERATED)
         return item_count
 
+    @timed("build_track_playlists")
+    def build_track_playlists(self):
+        """
+        Build playlists of individual tracks, grouped by album: one flat playlist if `self.multi` is False, otherwise
+        one per genre playlist and the parent playlist. The tracks are read in a single pass and written to all the
+        playlists at once, an album going to the playlists of the genres of its songs, so only the tracks of one album
+        are held in memory.
+        :return: The number of tracks written
+        """
+        list_names = list(self.genre_lists) if self.multi else ['All']
+
+        if self.start_file:
+            log_it("warning", __name__, f"Track playlists are always new, {self.start_file} is not extended")
+
+        if not os.path.isdir(self.out_dir):
+            os.mkdir(self.out_dir)
+
+        with ExitStack() as stack:
+            outputs = {}
+            writers = {}
+
+            for list_name in list_names:
+                outputs[list_name] = stack.enter_context(AtomicOutput(
+                    os.path.join(self.out_dir, f"{list_name.lower()}.xspf"), skip_unchanged=self.skip_unchanged
+                ))
+                writers[list_name] = AlbumXspfWriter(outputs[list_name], title=list_name, pretty=self.pretty)
+
+            track_count = self.write_albums(self.list_tracks(), writers)
+
+            for list_name in list_names:
+                writers[list_name].close()
+
+        for list_name in list_names:
+            self.stats.count_output(outputs[list_name])
+            self.notifier.notify(select_key=Result.PROCESSED)
+
+        self.stats.count("playlist_tracks", track_count)
+
+        if self.multi:
+            if self.start_file:
+                copyfile(self.start_file, os.path.join(self.out_dir, os.path.basename(self.start_file)))
+
+            self.build_parent_playlist()
+
+        return track_count
+
+    def write_albums(self, tracks, writers):
+        """
+        Write tracks to the track-level playlists, album by album
+        :param tracks: An iterable of TrackItem instances, the tracks of an album contiguous
+        :param writers: A dict of playlist name -> AlbumXspfWriter, with the single entry 'All' if `self.multi` is False
+        :return: The number of tracks written, a track written to two playlists counting twice
+        """
+        track_count = 0
+
+        for (album_path, album), album_tracks in groupby(tracks, lambda track: (track.album_path, track.album)):
+            album_tracks = list(album_tracks)
+            album_genres = sorted({genre for track in album_tracks for genre in track.genre.split(', ') if genre})
+            album_lists = (self.folder_lists(DirItem(name=album_path, genre=', '.join(album_genres)))
+                           if self.multi else writers)
+
+            for list_name in album_lists:
+                writers[list_name].start_album(album)
+
+                for track in album_tracks:
+                    writers[list_name].add_track("file:///" + track.location, title=track.title, creator=track.creator,
+                                                 album=album, track_num=track.track_num)
+
+            track_count += len(album_tracks) * len(album_lists)
+
+        return track_count
+
     def make_playlists(self):
         """
         Top-level method to create playlists: one flat one if `self.multi` is False, otherwise multiple playlists,
@@ -667,6 +1932,10 @@ class PlaylistHandler:
         :return:
         """
         self.notifier.notify(select_key=Result.PROCESSING)
+
+        if self.track_level:
+            return self.build_track_playlists()
+
         self.directories = self.list_directories()
 
         if self.multi:
@@ -674,11 +1943,246 @@ class PlaylistHandler:
 
         return self.build_flat_playlist()
 
-    def save_playlist(self, in_soup, use_out_file=''):  # pylint: disable=missing-function-docstring
-        self.write_file(self.out_file if not use_out_file else use_out_file, str(in_soup), self.out_dir)
+    @timed("update_playlists")
+    def update_playlists(self, folder_names):
+        """
+        Bring the playlists up to date after changes to some of the top-level folders of the source directory. The
+        folders are probed again on the file system, and only the playlists that list a folder added, removed or
+        re-tagged, before or after the change, are written again. The folders listed from the DB keep the genres the
+        DB gives them, see db_folder_genres(). The parent playlist (all.xspf in multi mode) references the same genre
+        playlists as before, so it is left as it is.
+        :param folder_names: An iterable of the names of the top-level folders that changed
+        :return: A list of the names of the playlists written
+        """
+        folders = {folder.name: folder for folder in self.directories.dirs}
+        db_genres = self.db_folder_genres(folder_names, folders)
+        changed_folders = []
+
+        for name, (has_media, genre) in self.probe_folders(folder_names):
+            old_folder = folders.pop(name, None)
+            new_folder = DirItem(name=name, genre=db_genres.get(name, genre)) if has_media else None
+
+            if new_folder:
+                folders[name] = new_folder
+
+            if old_folder != new_folder:
+                changed_folders += [folder for folder in (old_folder, new_folder) if folder]
+
+        self.end_scan()
+
+        if not changed_folders:
+            return []
+
+        self.directories = MediaDirs(parent=self.directories.parent,
+                                     dirs=DirCatalogue(sorted(folders.values(), key=lambda folder: folder.name)))
+
+        if not self.multi:
+            self.build_flat_playlist()
+            return ['All']
+
+        affected_lists = {list_name for list_name, dirs in self.route_folders(changed_folders).items() if dirs}
+        routed = OrderedDict((list_name, selected_dirs)
+                             for list_name, selected_dirs in self.route_folders(self.directories.dirs).items()
+                             if list_name in affected_lists)
+        self.write_genre_playlists(routed)
+
+        return list(routed)
+
+    def db_folder_genres(self, folder_names, folders):
+        """
+        Find the genres of the changed folders of the source directory listed from the DB: the genres of all the songs
+        of a folder as the DB lists them now, or as it listed them before if the DB does not list the folder (yet) or
+        cannot be queried. A new folder the DB does not list yet is not in the result, so it gets the genre probed on
+        the file system until the DB catches up.
+        :param folder_names: An iterable of the names of the folders in self.directories that changed
+        :param folders: A dictionary of the folders of self.directories by name, before the change
+        :return: A dictionary of genres by folder name
+        """
+        if not self.db_listed_dir:
+            return {}
+
+        db_dir = os.path.abspath(self.db_listed_dir)
+        db_names = {name: os.path.basename(name) for name in folder_names
+                    if os.path.abspath(os.path.join(self.directories.parent, os.path.dirname(name))) == db_dir}
+
+        if not db_names:
+            return {}
+
+        try:
+            catalogue = self.read_db_catalogue()
+        except DbUnavailable as e:  # NOQA
+            log_it("warning", __name__, f"DB not available, keeping the genres it listed before: {e}")
+            catalogue = DirCatalogue()
+
+        db_genres = {name: folders[name].genre for name in db_names if name in folders}
+
+        for name, db_name in db_names.items():
+            db_folder = catalogue.get(db_name)
+
+            if db_folder:
+                db_genres[name] = db_folder.genre
+
+        return db_genres
+
+    def probe_folders(self, folder_names):
+        """
+        Probe folders of the listed directories again, ignoring their scan cache entries. The folders of merged
+        listings are probed in their source directories, see merge_media_dirs().
+        :param folder_names: An iterable of the names of the folders in self.directories
+        :return: A list of tuples (folder name, (has media, genre)), by folder name
+        """
+        by_source_dir = {}
+
+        for name in sorted(folder_names):
+            by_source_dir.setdefault(os.path.dirname(name), []).append(os.path.basename(name))
+
+        return sorted(
+            (os.path.join(prefix, dir_name), result)
+            for prefix, dir_names in by_source_dir.items()
+            for dir_name, result in self.probe_dirs(
+                os.path.join(self.directories.parent, prefix) if prefix else self.directories.parent, dir_names,
+                refresh=True
+            )
+        )
+
+    def make_watcher(self, poll_interval=0.0):
+        """
+        Create the watcher of the source directories, naming the folders as the merged listing of several source
+        directories does, see merge_media_dirs()
+        :param poll_interval: Seconds between scans of the directory, 0 to use inotify, falling back to scans every
+        DEFAULT_POLL_INTERVAL seconds if a source directory is on a network file system, on which inotify does not see
+        the changes made by other hosts, or if inotify cannot watch the directory
+        :return: An InotifyWatcher or PollingWatcher instance
+        """
+        base = common_parent(self.source_dirs)
+        dirs_str = ', '.join(self.source_dirs)
+
+        if poll_interval > 0:
+            return PollingWatcher(self.source_dirs, poll_interval, base)
+
+        network_dirs = [source_dir for source_dir in self.source_dirs if on_network_fs(source_dir)]
+
+        if network_dirs:
+            log_it("info", __name__, f"{', '.join(network_dirs)} on a network file system, scanning "
+                                     f"{dirs_str} every {DEFAULT_POLL_INTERVAL} s")
+            return PollingWatcher(self.source_dirs, DEFAULT_POLL_INTERVAL, base)
+
+        try:
+            return InotifyWatcher(self.source_dirs, base)
+        except OSError as e:  # NOQA
+            log_it("warning", __name__, f"Cannot watch {dirs_str} with inotify ({e}), scanning it every "
+                                        f"{DEFAULT_POLL_INTERVAL} s instead")
+
+        return PollingWatcher(self.source_dirs, DEFAULT_POLL_INTERVAL, base)
+
+    def watch(self, debounce=WATCH_DEBOUNCE, poll_interval=0.0):
+        """
+        Generate the playlists, then keep them up to date as folders are added to, removed from or changed in the
+        source directory, until interrupted. Bursts of changes are handled once they are over, see collect_changes().
+        Folder changes are read from the file system, so they are seen before the DB is updated. Track-level playlists
+        are all generated again after each burst of changes.
+        :param debounce: The quiet period in seconds that ends a burst of changes
+        :param poll_interval: Seconds between scans of the directory, 0 to use inotify
+        :return: The number of playlist updates
+        """
+        watcher = self.make_watcher(poll_interval)
+        update_count = 0
+        self.make_playlists()
+        log_it("info", __name__, f"Watching {', '.join(self.source_dirs)} for changes")
+
+        try:
+            while True:
+                folder_names = collect_changes(watcher, debounce, WATCH_MAX_DELAY)
+
+                if folder_names is None or self.track_level:
+                    reason = "Lost track of the changes" if folder_names is None else \
+                        f"Changed {', '.join(sorted(folder_names))}"
+                    log_it("info", __name__, f"{reason}, generating all playlists")
+                    self.make_playlists()
+                    update_count += 1
+                    continue
+
+                written_lists = self.update_playlists(folder_names)
+
+                if written_lists:
+                    log_it("info", __name__, f"Changed {', '.join(sorted(folder_names))}, "
+                                             f"updated {', '.join(written_lists)}")
+                    update_count += 1
+        except KeyboardInterrupt:
+            log_it("info", __name__, f"Stopped watching {', '.join(self.source_dirs)}")
+        finally:
+            watcher.close()
+
+        return update_count
+
+    def close(self):
+        """
+        Close the DB connections kept open by the handler
+        :return: void
+        """
+        if self._db is not None:
+            self._db.close()
+
+    @timed("save_playlist")
+    def save_playlist(self, in_soup, use_out_file='', pretty=None):  # pylint: disable=missing-function-docstring
+        self.write_file(self.out_file if not use_out_file else use_out_file, str(in_soup), self.out_dir,
+                        pretty=self.pretty if pretty is None else pretty, skip_unchanged=self.skip_unchanged,
+                        stats=self.stats)
         self.notifier.notify(select_key=Result.PROCESSED)
 
 
+def init_render_worker(log_level):
+    """
+    Set up a worker process of PlaylistHandler.run_render_tasks(): it logs to stderr itself, at the level of the
+    process that started it, see configure_logging()
+    :param log_level: The logging level number of the parent process
+    :return: void
+    """
+    configure_logging(log_level)
+
+
+def render_playlist(task):
+    """
+    Render a genre playlist and write it to its file, in a worker process of
+    PlaylistHandler.render_genre_playlists()
+    :param task: A RenderTask instance
+    :return: A tuple (last id from the playlist, dict of the counters of the written file)
+    """
+    stats = RunStats()
+
+    if task.streaming:
+        last_id = PlaylistHandler.write_stream(task.playlist_name, task.locations, task.out_file, pretty=task.pretty,
+                                               skip_unchanged=task.skip_unchanged, stats=stats)
+    else:
+        soup = PlaylistHandler.make_soup(task.playlist_name)
+        last_id = PlaylistHandler.add_soup_tracks(soup, task.locations)
+        PlaylistHandler.write_file(os.path.basename(task.out_file), str(soup), os.path.dirname(task.out_file),
+                                   pretty=task.pretty, skip_unchanged=task.skip_unchanged, stats=stats)
+
+    return last_id, stats.as_dict()["counters"]
+
+
+def write_stats(stats, args, **results):
+    """
+    Log the phases of the run and write the run report if the --stats_json option is set
+    :param stats: The RunStats instance of the run
+    :param args: The parsed command-line arguments
+    :param results: The results of the run to include in the report, e.g. the number of playlist items
+    :return: void
+    """
+    report = stats.as_dict()
+    log_it("debug", __name__, ", ".join(f"{name}: {phase['calls']} calls, {phase['seconds']:.3f} s"
+                                        for name, phase in report["phases"].items()))
+
+    if not args.stats_json:
+        return
+
+    try:
+        stats.write_json(args.stats_json, version=__version__, options=vars(args), **results)
+    except OSError as e:  # NOQA
+        log_it("error", __name__, f"Cannot write the run statistics to {args.stats_json}: {e}")
+
+
 def main():  # pylint: disable=missing-function-docstring
     start_time = datetime.now()
     parser = argparse.ArgumentParser(description="This program generates or updates an XSPF playlist by scanning a"
@@ -689,8 +2193,10 @@ def main():  # pylint: disable=missing-function-docstring
                         dest='config',
                         default=f'{os.environ['HOME']}/scripts/xspf-gen/xspf-gen.yml',
                         required=False)
-    parser.add_argument("-d", "--directory", help="Full path to the directory from which to add tracks.",
+    parser.add_argument("-d", "--directory", help="Full path to the directory from which to add tracks, or several "
+                        "directories whose folders are merged into one set of playlists.",
                         type=str,
+                        nargs='+',
                         dest='source_dir',
                         default=f'{os.environ['HOME']}/lanmount/music',
                         required=False)
@@ -716,16 +2222,167 @@ def main():  # pylint: disable=missing-function-docstring
                         type=str,
                         dest='out_file',
                         required=False)
+    parser.add_argument("-s", "--scan_cache", help="Full path to the file caching the results of scanning the "
+                        "directory when the DB is not available, an empty string disables the cache; defaults to "
+                        f"{DEFAULT_CACHE_FILES['scan_cache']} beside the genre list config (-c).",
+                        type=str,
+                        dest='scan_cache',
+                        default=None,
+                        required=False)
+    parser.add_argument("--db_snapshot", help="Full path to the file keeping the folders and genres last read from "
+                        "the DB, used while the DB has not changed or when it is not available, an empty string "
+                        "disables the snapshot; defaults to "
+                        f"{DEFAULT_CACHE_FILES['db_snapshot']} beside the genre list config (-c).",
+                        type=str,
+                        dest='db_snapshot',
+                        default=None,
+                        required=False)
+    parser.add_argument("--config_cache", help="Full path to the file keeping the genre list config file compiled, "
+                        "so it is only parsed again when it changes, an empty string disables the cache; defaults to "
+                        f"{DEFAULT_CACHE_FILES['config_cache']} beside the genre list config (-c).",
+                        type=str,
+                        dest='config_cache',
+                        default=None,
+                        required=False)
+    parser.add_argument("-j", "--jobs", help="The number of directories to probe concurrently when scanning the "
+                        "directory.",
+                        type=int,
+                        dest='jobs',
+                        default=1,
+                        required=False)
+    parser.add_argument("--render_jobs", help="The number of processes rendering the genre playlists concurrently, 0 "
+                        "for one per CPU.",
+                        type=int,
+                        dest='render_jobs',
+                        default=1,
+                        required=False)
+
+    parser.add_argument("--max_depth", help="The deepest directory level below an album directory searched for "
+                        "media files, 0 for the album directory itself (defaults to no limit).",
+                        type=int,
+                        dest='max_depth',
+                        default=None,
+                        required=False)
+
+    parser.add_argument("-g", "--genre_mode", help="How the genre of a folder is derived in multi mode: from its first "
+                        "media file (first), from all its media files (all) or from an evenly spread sample of them "
+                        "(sample), keeping the genres of at least --genre_min_share of the tracks, by descending "
+                        "share; the folder goes to the playlist of each genre kept alike.",
+                        type=str,
+                        choices=GENRE_MODES,
+                        dest='genre_mode',
+                        default='first',
+                        required=False)
+    parser.add_argument("--genre_sample", help="The number of tracks read per folder in the sample genre mode.",
+                        type=int,
+                        dest='genre_sample',
+                        default=DEFAULT_GENRE_SAMPLE,
+                        required=False)
+    parser.add_argument("--genre_min_share", help="The smallest share of the tracks of a folder a genre must have to "
+                        "be kept in the all and sample genre modes.",
+                        type=float,
+                        dest='genre_min_share',
+                        default=DEFAULT_GENRE_MIN_SHARE,
+                        required=False)
+
+    parser.add_argument("--tracks", help="List the individual tracks in the playlists, grouped by album, instead of "
+                        "one entry per folder.",
+                        action='store_true',
+                        dest='tracks',
+                        required=False)
+    parser.add_argument("--shard_size", help="Split the playlists of more folders than this into shards of at most "
+                        "this number of folders, referenced by an index playlist; 0 for no shards.",
+                        type=int,
+                        dest='shard_size',
+                        default=0,
+                        required=False)
+    parser.add_argument("--shard_by", help="How the playlists are split into shards: consecutive runs of folders "
+                        "(count) or alphabetical ranges of the initials of the folder names (alpha).",
+                        type=str,
+                        choices=SHARD_MODES,
+                        dest='shard_by',
+                        default='count',
+                        required=False)
+    parser.add_argument("--pretty", help="Write the playlists indented, one element per line.",
+                        action='store_true',
+                        dest='pretty',
+                        required=False)
+    parser.add_argument("--skip_unchanged", help="Leave playlist files whose contents would not change untouched.",
+                        action='store_true',
+                        dest='skip_unchanged',
+                        required=False)
+    parser.add_argument("--soup", help="Build the playlists as BeautifulSoup documents instead of streaming them "
+                        "to the output files.",
+                        action='store_true',
+                        dest='soup',
+                        required=False)
+    parser.add_argument("--stats_json", "--stats-json", help="The path and name of a JSON file to which to write the "
+                        "statistics of the run: wall time and calls of each phase, and counters.",
+                        type=str,
+                        dest='stats_json',
+                        default="",
+                        required=False)
+    parser.add_argument("-w", "--watch", help="Keep running and update the playlists affected by changes to the "
+                        "directory.",
+                        action='store_true',
+                        dest='watch',
+                        required=False)
+    parser.add_argument("--debounce", help="Seconds without changes after which a burst of changes is handled, in "
+                        "watch mode.",
+                        type=float,
+                        dest='debounce',
+                        default=WATCH_DEBOUNCE,
+                        required=False)
+    parser.add_argument("--poll_interval", help="Seconds between scans of the directory in watch mode, for network "
+                        "mounts on which inotify does not see changes; 0 uses inotify, or scans every "
+                        f"{DEFAULT_POLL_INTERVAL:g} s if the directory is on a network file system.",
+                        type=float,
+                        dest='poll_interval',
+                        default=0.0,
+                        required=False)
+
+    parser.add_argument("--log_level", help="The lowest level of the messages logged.",
+                        type=str,
+                        dest='log_level',
+                        choices=LOG_LEVELS,
+                        default=DEFAULT_LOG_LEVEL,
+                        required=False)
+    parser.add_argument("--log_queue", help="Write the log messages from a background thread, so logging never "
+                        "blocks the scan.",
+                        action='store_true',
+                        dest='log_queue',
+                        required=False)
 
     args = parser.parse_args()
+    configure_logging(args.log_level, use_queue=args.log_queue)
+
+    for dest, file_name in DEFAULT_CACHE_FILES.items():
+        if getattr(args, dest) is None:
+            setattr(args, dest, default_cache_path(file_name, args.config))
 
     ph = PlaylistHandler(source_dir=args.source_dir, start_file=args.in_file, out_file=args.out_file,
-                         multi=eval_bool_str(args.multiple), list_cfg=args.config, env_cfg=args.env_config)
+                         multi=eval_bool_str(args.multiple), list_cfg=args.config, env_cfg=args.env_config,
+                         scan_cache=args.scan_cache, jobs=args.jobs, streaming=not args.soup,
+                         pretty=args.pretty, skip_unchanged=args.skip_unchanged, max_depth=args.max_depth,
+                         genre_mode=args.genre_mode, genre_sample=args.genre_sample,
+                         genre_min_share=args.genre_min_share, track_level=args.tracks,
+                         render_jobs=args.render_jobs, db_snapshot=args.db_snapshot,
+                         shard_size=args.shard_size, shard_by=args.shard_by, config_cache=args.config_cache)
+
+    if args.watch:
+        count = ph.watch(debounce=args.debounce, poll_interval=args.poll_interval)
+        ph.close()
+        log_it(level="info", text=f"Made {count} playlist updates, run time={str(datetime.now() - start_time)}")
+        write_stats(ph.stats, args, updates=count)
+        sys.exit(0)
+
     count = ph.make_playlists()
+    ph.close()
+    write_stats(ph.stats, args, items=count)
 
     input_file_str = f"file {args.in_file}, " if args.in_file else ""
     log_it(level="info",
-           text=f"Generated a playlist with {count} items from {input_file_str}directory {args.source_dir}, "
+           text=f"Generated a playlist with {count} items from {input_file_str}directory {', '.join(ph.source_dirs)}, "
            f"run time={str(datetime.now() - start_time)}")
 
     sys.exit(0)
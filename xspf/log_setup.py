@@ -0,0 +1,128 @@
+"""
+This module contains the set-up of the logging of the playlist generator, done once per process
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = '%(levelname)s:%(name)s:%(message)s'
+LOG_LEVELS = ('debug', 'info', 'warning', 'error')
+DEFAULT_LOG_LEVEL = 'info'
+
+# A call site logs at most LOG_RATE_BURST records per LOG_RATE_INTERVAL seconds, the others are counted and dropped:
+LOG_RATE_BURST = 20
+LOG_RATE_INTERVAL = 10.0
+
+_lock = threading.Lock()
+_configured = False
+_listener = None
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    This class limits the records logged from the same place in the code (logger, file and line, level), so a message
+    logged per folder (e.g. a directory that cannot be read) does not flood the log during a scan: the first burst
+    records are logged, then the others are dropped until interval seconds have passed since the first one, and the
+    next record logged from the place tells how many were dropped. Errors and above are never dropped.
+    """
+
+    def __init__(self, burst=LOG_RATE_BURST, interval=LOG_RATE_INTERVAL):
+        super().__init__()
+        self._burst = burst
+        self._interval = interval
+        self._lock = threading.Lock()
+        # (window start, records logged, records dropped) by call site:
+        self._sites = {}
+
+    def filter(self, record):
+        if self._burst <= 0 or record.levelno >= logging.ERROR:
+            return True
+
+        site = (record.name, record.pathname, record.lineno, record.levelno)
+        now = time.monotonic()
+
+        with self._lock:
+            start, logged, dropped = self._sites.get(site, (now, 0, 0))
+
+            if now - start >= self._interval:
+                start, logged = now, 0
+
+            if logged >= self._burst:
+                self._sites[site] = (start, logged, dropped + 1)
+                return False
+
+            self._sites[site] = (start, logged + 1, 0)
+
+        if dropped:
+            record.msg = f"{record.getMessage()} ({dropped} similar messages dropped)"
+            record.args = None
+
+        return True
+
+
+def configure_logging(level=DEFAULT_LOG_LEVEL, use_queue=False, burst=LOG_RATE_BURST, interval=LOG_RATE_INTERVAL,
+                      handler=None):
+    """
+    Set up the logging of the process, once: the root logger gets a handler writing to stderr at the level, with
+    the rate limit; the later calls do nothing. The libraries (psycopg2, bs4, music_tag...) log at the same level.
+    As with logging.basicConfig(), a root logger that already has handlers (e.g. set up by the program embedding the
+    handler) is left as it is, unless a handler is given.
+    :param level: The name of the lowest level logged, see LOG_LEVELS, or a logging level number
+    :param use_queue: Hand the records to a background thread writing them, so logging never blocks the threads
+    scanning the directories on a slow terminal or file
+    :param burst: The number of records logged from a call site per interval, 0 for no limit
+    :param interval: The length of the rate limit window, in seconds
+    :param handler: The handler writing the records, a StreamHandler on stderr if None
+    :return: True if the logging was set up by this call
+    """
+    global _configured, _listener  # pylint: disable=global-statement
+
+    with _lock:
+        if _configured:
+            return False
+
+        _configured = True
+        root = logging.getLogger()
+
+        if root.handlers and handler is None:
+            return False
+
+        out_handler = handler if handler else logging.StreamHandler()
+        out_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        out_handler.addFilter(RateLimitFilter(burst, interval))
+        root.setLevel(level.upper() if isinstance(level, str) else level)
+
+        if use_queue:
+            records = queue.SimpleQueue()
+            _listener = QueueListener(records, out_handler, respect_handler_level=True)
+            _listener.start()
+            atexit.register(stop_logging)
+            out_handler = QueueHandler(records)
+
+        root.addHandler(out_handler)
+
+    return True
+
+
+def logging_configured():
+    """
+    Check if the logging was set up
+    :return: True if configure_logging() was called
+    """
+    return _configured
+
+
+def stop_logging():
+    """
+    Write the records left in the queue and stop the background thread, if any
+    :return: void
+    """
+    global _listener  # pylint: disable=global-statement
+
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
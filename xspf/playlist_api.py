@@ -0,0 +1,276 @@
+"""
+This module contains the API to generate the playlists in-process, e.g. from a media server on each library refresh:
+the playlists are returned as bytes instead of being written to files, without desktop notifications, and the
+folders come from a pluggable source
+"""
+import io
+import logging
+import os
+from collections import OrderedDict
+
+from db_snapshot import DbSnapshot
+from db_source import DbUnavailable
+from dir_catalogue import DirCatalogue
+from handler import MediaDirs, PlaylistHandler, Result, merge_media_dirs
+
+logger = logging.getLogger(__name__)
+
+
+class SourceUnavailable(Exception):
+    """
+    This exception is raised when a source cannot list the album folders, e.g. a DB snapshot that was never saved
+    """
+
+
+class NullNotifier:
+    """
+    This class is a notifier that does nothing, used instead of the desktop notifier when the generator is embedded
+    """
+
+    def notify(self, select_key=None):  # pylint: disable=missing-function-docstring
+        pass
+
+
+class CatalogueSource:
+    """
+    This class is a source of the album folders built by the caller
+    """
+
+    def __init__(self, parent, folders):
+        """
+        :param parent: The directory the folders are in
+        :param folders: A DirCatalogue instance, or an iterable of DirItem instances or (name, genre) tuples
+        """
+        self._media_dirs = MediaDirs(parent=parent,
+                                     dirs=folders if isinstance(folders, DirCatalogue) else DirCatalogue(folders))
+
+    def media_dirs(self, handler):  # pylint: disable=unused-argument
+        """
+        List the album folders
+        :param handler: The PlaylistHandler instance of the generator
+        :return: A MediaDirs instance
+        """
+        return self._media_dirs
+
+
+class DbFolderSource:
+    """
+    This class is a source of the album folders read from the DB, through the DB source of the generator (its pool,
+    or the connection given to it), and its DB snapshot if it has one, see PlaylistHandler.read_db_catalogue()
+    """
+
+    def __init__(self, parent):
+        """
+        :param parent: The directory the album paths of the DB are relative to
+        """
+        self._parent = parent
+
+    def media_dirs(self, handler):
+        """
+        List the album folders
+        :param handler: The PlaylistHandler instance of the generator
+        :return: A MediaDirs instance
+        :raise DbUnavailable: If the DB cannot be queried and there is no snapshot to use
+        """
+        return MediaDirs(parent=self._parent, dirs=handler.read_db_catalogue())
+
+
+class SnapshotSource:
+    """
+    This class is a source of the album folders last read from the DB, kept in a DB snapshot file, whatever the DB
+    holds now
+    """
+
+    def __init__(self, parent, snapshot):
+        """
+        :param parent: The directory the album paths of the DB are relative to
+        :param snapshot: A DbSnapshot instance or the path of the snapshot file
+        """
+        self._parent = parent
+        self._snapshot = snapshot if isinstance(snapshot, DbSnapshot) else DbSnapshot(snapshot)
+
+    def media_dirs(self, handler):  # pylint: disable=unused-argument
+        """
+        List the album folders
+        :param handler: The PlaylistHandler instance of the generator
+        :return: A MediaDirs instance
+        :raise SourceUnavailable: If there is no valid snapshot
+        """
+        snapshot = self._snapshot.load()
+
+        if not snapshot:
+            raise SourceUnavailable(f"No DB snapshot in {self._snapshot.file_path}")
+
+        return MediaDirs(parent=self._parent, dirs=snapshot.catalogue)
+
+
+class ScanSource:
+    """
+    This class is a source of the album folders found by scanning source directories, with the scan cache, jobs and
+    genre mode of the generator; the folders of several directories are merged, see merge_media_dirs()
+    """
+
+    def __init__(self, *in_dirs):
+        """
+        :param in_dirs: The directories to scan
+        """
+        if not in_dirs:
+            raise ValueError("No directory to scan")
+
+        self._in_dirs = tuple(os.path.expanduser(in_dir) for in_dir in in_dirs)
+
+    def media_dirs(self, handler):
+        """
+        List the album folders
+        :param handler: The PlaylistHandler instance of the generator
+        :return: A MediaDirs instance
+        """
+        if len(self._in_dirs) == 1:
+            return handler.scan_directories(self._in_dirs[0])
+
+        return merge_media_dirs(handler.scan_roots(self._in_dirs))
+
+
+class FallbackSource:
+    """
+    This class is a source trying other sources in turn, e.g. the DB, then its snapshot, then a scan, until one lists
+    album folders
+    """
+
+    def __init__(self, *sources):
+        """
+        :param sources: The sources, in the order to try them
+        """
+        self._sources = sources
+
+    def media_dirs(self, handler):
+        """
+        List the album folders of the first source that can list some
+        :param handler: The PlaylistHandler instance of the generator
+        :return: A MediaDirs instance, the listing of the last source if none lists folders
+        :raise SourceUnavailable: If none of the sources can list the folders
+        """
+        media_dirs = None
+
+        for source in self._sources:
+            try:
+                media_dirs = source.media_dirs(handler)
+            except (DbUnavailable, SourceUnavailable) as e:
+                logger.warning("%s not available, trying the next source: %s", type(source).__name__, e)
+                continue
+
+            if media_dirs.dirs:
+                return media_dirs
+
+        if media_dirs is None:
+            raise SourceUnavailable("No source available")
+
+        return media_dirs
+
+
+class PlaylistGenerator:
+    """
+    This class generates the playlists in memory: the same documents as the playlist files written by
+    PlaylistHandler.make_playlists() (new playlists, not sharded), returned as bytes. It is meant to be created once
+    and called on each library refresh, so the DB connections (of its pool or given to it), the notifier and the
+    caches are reused across calls. The calls of an instance must not overlap.
+    """
+
+    def __init__(self, genre_lists=None, out_dir='', multi=True, pretty=False, conn=None, db=None, notifier=None,
+                 **handler_options):
+        """
+        :param genre_lists: A dict of playlist name -> genres, or the path of the genre list YAML file, None for the
+        xspf-gen.yml file of the package
+        :param out_dir: The directory the playlists are served from, for the entries of the parent playlist; required
+        with multi
+        :param multi: True to generate the genre playlists and the parent playlist, False for a single flat playlist
+        :param pretty: True to render the playlists indented
+        :param conn: An open psycopg2 connection to read the DB through, left open; None to use the DB source
+        :param db: A DbSource instance, e.g. shared by several generators; None for a pool configured by the
+        env_cfg option
+        :param notifier: An object with a notify(select_key) method, told of the progress with Result values; None
+        for no notifications
+        :param handler_options: Other options of PlaylistHandler, e.g. env_cfg, scan_cache, jobs, genre_mode,
+        db_snapshot, config_cache
+        :raise ValueError: If multi is True and out_dir is not given
+        """
+        # The parent playlist references the genre playlists by their full path, there is no sensible default:
+        if multi and not out_dir:
+            raise ValueError("The directory the playlists are served from (out_dir) is required with multi")
+
+        self._handler = PlaylistHandler(out_file=os.path.join(out_dir, 'all.xspf') if out_dir else '', multi=multi,
+                                        list_cfg=genre_lists, pretty=pretty, **handler_options)
+        self._handler.notifier = notifier if notifier else NullNotifier()
+        self._owns_db = db is None
+
+        if db is not None:
+            self._handler.db = db
+        elif conn is not None:
+            self._handler.conn = conn
+
+    @property
+    def handler(self):  # pylint: disable=missing-function-docstring
+        return self._handler
+
+    @property
+    def stats(self):  # pylint: disable=missing-function-docstring
+        return self._handler.stats
+
+    def render(self, playlist_name, locations):
+        """
+        Render a playlist
+        :param playlist_name: A string containing the name (title) of the playlist
+        :param locations: An iterable of the paths of the playlist tracks
+        :return: A tuple (file name, playlist document as UTF-8 bytes)
+        """
+        out = io.StringIO()
+        last_id = PlaylistHandler.stream_tracks(out, playlist_name, locations, pretty=self._handler.pretty)
+        data = out.getvalue().encode('UTF-8')
+        self.stats.count("bytes_rendered", len(data))
+        self.stats.count("playlist_tracks", last_id + 1)
+        self._handler.notifier.notify(select_key=Result.PLAYLIST_GENERATED)
+
+        return f"{playlist_name.lower()}.xspf", data
+
+    def iter_playlists(self, source=None):
+        """
+        Generate the playlists one at a time, so only one is held in memory: the flat playlist, or the genre
+        playlists followed by the parent playlist
+        :param source: The source of the album folders, an object with a media_dirs(handler) method returning a
+        MediaDirs instance (e.g. CatalogueSource, DbFolderSource, ScanSource, FallbackSource); None to list the
+        source_dir option as make_playlists() does, from the DB or by scanning it
+        :return: A generator of tuples (file name, playlist document as UTF-8 bytes)
+        """
+        handler = self._handler
+        handler.notifier.notify(select_key=Result.PROCESSING)
+
+        if source:
+            with self.stats.phase("list_directories"):
+                handler.directories = source.media_dirs(handler)
+        else:
+            handler.directories = handler.list_directories()
+
+        if not handler.multi:
+            yield self.render('All', handler.folder_locations(handler.directories.dirs))
+            return
+
+        for list_name, selected_dirs in handler.route_folders(handler.directories.dirs).items():
+            yield self.render(list_name, handler.folder_locations(selected_dirs))
+
+        yield self.render('all', handler.parent_locations())
+
+    def generate(self, source=None):
+        """
+        Generate all the playlists, see iter_playlists()
+        :param source: The source of the album folders
+        :return: An OrderedDict of file name -> playlist document as UTF-8 bytes, in the order they are generated
+        """
+        return OrderedDict(self.iter_playlists(source))
+
+    def close(self):
+        """
+        Close the DB connections of the pool of the generator; a DB source or a connection given to it is left open
+        :return: void
+        """
+        if self._owns_db:
+            self._handler.close()
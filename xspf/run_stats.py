@@ -0,0 +1,141 @@
+"""
+This module contains the instrumentation of a playlist run: per-phase wall time and call counts, and counters
+"""
+import functools
+import inspect
+import json
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+from atomic_output import AtomicOutput
+
+
+class RunStats:
+    """
+    This class records the wall time and the number of calls of each phase of a run, and counters such as the bytes
+    written or the tags read. It can be shared by the threads probing directories: the time of a phase is the sum of
+    the time of its calls, so a phase run on several threads can take longer than the run itself. Phases nest (e.g.
+    has_media inside list_directories), the time of each phase includes the time of the phases it calls.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = datetime.now()
+        self._start = time.perf_counter()
+        self._phases = {}
+        self._counters = Counter()
+
+    def add_phase_time(self, name, seconds, calls=1):
+        """
+        Add time and calls to a phase
+        :param name: The name of the phase
+        :param seconds: The wall time to add
+        :param calls: The number of calls to add
+        :return: void
+        """
+        with self._lock:
+            phase_calls, phase_seconds = self._phases.get(name, (0, 0.0))
+            self._phases[name] = (phase_calls + calls, phase_seconds + seconds)
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time a block of code as one call of a phase
+        :param name: The name of the phase
+        :return: A context manager
+        """
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.add_phase_time(name, time.perf_counter() - start)
+
+    def count(self, name, value=1):
+        """
+        Add to a counter
+        :param name: The name of the counter
+        :param value: The value to add
+        :return: void
+        """
+        with self._lock:
+            self._counters[name] += value
+
+    def count_output(self, out):
+        """
+        Count a closed output file: the bytes generated, and whether the file was replaced or left unchanged
+        :param out: An AtomicOutput instance
+        :return: void
+        """
+        self.count("bytes_written", out.bytes_written)
+        self.count("files_written" if out.changed else "files_unchanged")
+
+    def as_dict(self):
+        """
+        Build the run report
+        :return: A dict with the start time, the run time in seconds, the phases (calls and seconds) and the counters
+        """
+        with self._lock:
+            return {
+                "started": self._started.isoformat(timespec='seconds'),
+                "run_time": round(time.perf_counter() - self._start, 6),
+                "phases": {name: {"calls": calls, "seconds": round(seconds, 6)}
+                           for name, (calls, seconds) in self._phases.items()},
+                "counters": dict(sorted(self._counters.items())),
+            }
+
+    def write_json(self, file_path, **extra):
+        """
+        Write the run report to a JSON file, replacing the file atomically so a scraper never reads it half written
+        :param file_path: Path to the file
+        :param extra: Further top-level items of the report, e.g. the version and the options of the run
+        :return: void
+        """
+        with AtomicOutput(file_path) as out:
+            out.write(json.dumps(dict(extra, **self.as_dict()), indent=4) + '\n')
+
+
+def timed(phase_name):
+    """
+    Decorate a method of a class that has a `stats` property (a RunStats instance) to record each call as a call of a
+    phase. The time of a generator method is the time spent producing its items, not the time its caller spends
+    between them.
+    :param phase_name: The name of the phase
+    :return: The decorator
+    """
+    def decorator(method):
+        if inspect.isgeneratorfunction(method):
+            @functools.wraps(method)
+            def generator_wrapper(self, *args, **kwargs):
+                items = method(self, *args, **kwargs)
+                seconds = 0.0
+
+                try:
+                    while True:
+                        start = time.perf_counter()
+
+                        try:
+                            item = next(items)
+                        except StopIteration:
+                            return
+                        finally:
+                            seconds += time.perf_counter() - start
+
+                        yield item
+                finally:
+                    items.close()
+                    self.stats.add_phase_time(phase_name, seconds)
+
+            return generator_wrapper
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.stats.phase(phase_name):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,217 @@
+"""
+This module contains the persistent scan cache used when the media directories are read from the file system
+"""
+import json
+import os
+import sqlite3
+import threading
+
+
+class ScanCache:
+    """
+    This class keeps the result of probing each media directory (whether it contains media files and its genre) in a
+    SQLite file. An entry is only valid while the inode and the modification time of its directory are unchanged, and
+    so are the things its result depends on below the directory: the modification time of each subdirectory walked
+    (so media copied into Artist/Album/CD1 is seen) and the size and modification time of the media file its genre
+    was read from (so a re-tagged track is seen). Only the directories that changed since the previous run need to be
+    walked and their tags read again.
+    For the aggregated genre modes, the genre of each media file read is also kept, valid while the size and the
+    modification time of the file are unchanged, so a changed album only costs the tag reads of its changed files;
+    the entry of the directory is only valid while these files are unchanged too.
+    The cache can be shared by the threads probing directories concurrently.
+    """
+
+    def __init__(self, db_path):
+        self._db_path = os.path.abspath(os.path.expanduser(db_path))
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self._db_path), exist_ok=True)
+        self._conn = sqlite3.connect(self._db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS dirs ("
+            "path TEXT PRIMARY KEY, "
+            "parent TEXT NOT NULL, "
+            "inode INTEGER NOT NULL, "
+            "mtime_ns INTEGER NOT NULL, "
+            "has_media INTEGER NOT NULL, "
+            "genre TEXT NOT NULL, "
+            "tagged INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent)")
+
+        # Added with the aggregated genre modes, to cache files written by earlier versions:
+        if 'genre_mode' not in {row[1] for row in self._conn.execute("PRAGMA table_info(dirs)")}:
+            self._conn.execute("ALTER TABLE dirs ADD COLUMN genre_mode TEXT NOT NULL DEFAULT ''")
+
+        # Added with the dependencies below the directory, the entries written before have none and are not trusted:
+        if 'deps' not in {row[1] for row in self._conn.execute("PRAGMA table_info(dirs)")}:
+            self._conn.execute("ALTER TABLE dirs ADD COLUMN deps TEXT NOT NULL DEFAULT ''")
+
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, "
+            "dir TEXT NOT NULL, "
+            "size INTEGER NOT NULL, "
+            "mtime_ns INTEGER NOT NULL, "
+            "genre TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS files_dir ON files (dir)")
+
+    @property
+    def db_path(self):  # pylint: disable=missing-function-docstring
+        return self._db_path
+
+    @staticmethod
+    def deps_unchanged(dir_path, deps):
+        """
+        Check the things the scan result of a directory depends on below it, see store()
+        :param dir_path: Absolute path to the directory
+        :param deps: A list of [path relative to the directory, size or None for a directory, mtime_ns] lists
+        :return: True if all of them still have the same size and modification time
+        """
+        for rel_path, size, mtime_ns in deps:
+            try:
+                dep_stat = os.stat(os.path.join(dir_path, rel_path))
+            except OSError:
+                return False
+
+            if dep_stat.st_mtime_ns != mtime_ns or (size is not None and dep_stat.st_size != size):
+                return False
+
+        return True
+
+    def files_unchanged(self, dir_path):
+        """
+        Check the media files whose genres are cached for a directory, see lookup_files()
+        :param dir_path: Absolute path to the (top-level) directory
+        :return: True if all of them still have the same size and modification time
+        """
+        for file_path, (size, mtime_ns, _) in self.lookup_files(dir_path).items():
+            try:
+                file_stat = os.stat(file_path)
+            except OSError:
+                return False
+
+            if (file_stat.st_size, file_stat.st_mtime_ns) != (size, mtime_ns):
+                return False
+
+        return True
+
+    def lookup(self, dir_path, dir_stat, tagged=False, genre_mode='', check_files=False):
+        """
+        Look up the cached scan result of a directory.
+        :param dir_path: Absolute path to the directory
+        :param dir_stat: The os.stat_result of the directory
+        :param tagged: True if the caller needs the genre of the directory, i.e. the tags must have been read
+        :param genre_mode: The way the genre of the directory is derived from its tags, see
+        PlaylistHandler.genre_mode_key, an entry is only valid for the same mode
+        :param check_files: True if the genre is aggregated from the cached genres of the media files, so the entry is
+        only valid while none of these files changed, see files_unchanged()
+        :return: A tuple (has_media, genre) if a valid entry exists, otherwise None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT inode, mtime_ns, has_media, genre, tagged, genre_mode, deps FROM dirs WHERE path = ?",
+                (os.path.normpath(dir_path),)
+            ).fetchone()
+
+        if not row:
+            return None
+
+        inode, mtime_ns, has_media, genre, was_tagged, was_genre_mode, deps = row
+
+        if inode != dir_stat.st_ino or mtime_ns != dir_stat.st_mtime_ns or not deps:
+            return None
+
+        # An entry written by a run that did not read tags has no genre to offer:
+        if tagged and has_media and (not was_tagged or was_genre_mode != genre_mode):
+            return None
+
+        if not self.deps_unchanged(dir_path, json.loads(deps)):
+            return None
+
+        if check_files and not self.files_unchanged(dir_path):
+            return None
+
+        return bool(has_media), genre
+
+    def store(self, dir_path, dir_stat, has_media, genre, tagged=False, genre_mode='', deps=()):
+        """
+        Store the scan result of a directory, replacing any previous entry.
+        :param dir_path: Absolute path to the directory
+        :param dir_stat: The os.stat_result of the directory
+        :param has_media: True if the directory contains media files
+        :param genre: The genre of the directory, an empty string if not known
+        :param tagged: True if the genre was read from the media file tags
+        :param genre_mode: The way the genre was derived from the tags
+        :param deps: The things the result depends on below the directory, taken before they were read: an iterable
+        of tuples (absolute path, size or None for a directory, mtime_ns)
+        :return: void
+        """
+        dir_path = os.path.normpath(dir_path)
+        deps_json = json.dumps([[os.path.relpath(path, dir_path), size, mtime_ns] for path, size, mtime_ns in deps])
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO dirs (path, parent, inode, mtime_ns, has_media, genre, tagged, genre_mode, "
+                "deps) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (dir_path, os.path.dirname(dir_path), dir_stat.st_ino, dir_stat.st_mtime_ns, int(bool(has_media)),
+                 genre if genre else '', int(bool(tagged)), genre_mode if tagged else '', deps_json)
+            )
+
+    def lookup_files(self, dir_path):
+        """
+        Read the cached genres of the media files of a directory, in one query.
+        :param dir_path: Absolute path to the (top-level) directory
+        :return: A dict of file path -> tuple (size, mtime_ns, genre)
+        """
+        with self._lock:
+            return {
+                path: (size, mtime_ns, genre) for path, size, mtime_ns, genre in self._conn.execute(
+                    "SELECT path, size, mtime_ns, genre FROM files WHERE dir = ?", (os.path.normpath(dir_path),)
+                )
+            }
+
+    def replace_files(self, dir_path, file_rows):
+        """
+        Replace the cached genres of the media files of a directory.
+        :param dir_path: Absolute path to the (top-level) directory
+        :param file_rows: An iterable of tuples (file path, size, mtime_ns, genre)
+        :return: void
+        """
+        dir_path = os.path.normpath(dir_path)
+
+        with self._lock:
+            self._conn.execute("DELETE FROM files WHERE dir = ?", (dir_path,))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO files (path, dir, size, mtime_ns, genre) VALUES (?, ?, ?, ?, ?)",
+                ((path, dir_path, size, mtime_ns, genre if genre else '') for path, size, mtime_ns, genre in file_rows)
+            )
+
+    def prune(self, parent, keep_names):
+        """
+        Remove the entries of directories that no longer exist in a parent directory.
+        :param parent: Absolute path to the parent directory
+        :param keep_names: Names of the directories that still exist in the parent directory
+        :return: The number of entries removed
+        """
+        parent = os.path.normpath(parent)
+        keep_paths = {os.path.join(parent, name) for name in keep_names}
+
+        with self._lock:
+            stale = [
+                (path,) for (path,) in self._conn.execute("SELECT path FROM dirs WHERE parent = ?", (parent,))
+                if path not in keep_paths
+            ]
+            self._conn.executemany("DELETE FROM dirs WHERE path = ?", stale)
+            self._conn.executemany("DELETE FROM files WHERE dir = ?", stale)
+
+        return len(stale)
+
+    def commit(self):  # pylint: disable=missing-function-docstring
+        with self._lock:
+            self._conn.commit()
+
+    def close(self):  # pylint: disable=missing-function-docstring
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
@@ -0,0 +1,106 @@
+"""
+This module contains the lxml-based reader of the start (-f) playlist, the playlist extended with new tracks
+"""
+from lxml import etree
+
+from xspf_writer import INDENT, VLC_APPLICATION, XML_DECLARATION
+
+VLC_NS = "http://www.videolan.org/vlc/playlist/ns/0/"
+
+
+class StartPlaylist:
+    """
+    This class parses an existing XSPF playlist with lxml.etree.iterparse and, during that single pass, collects
+    everything needed to extend it: the highest vlc:id, the <trackList> element, the <vlc:node title="music">
+    element and the last <extension> element (the parent of a new music node). Tracks are then appended directly,
+    without searching the tree again.
+    """
+
+    def __init__(self, file_path):
+        self._track_list = None
+        self._music_node = None
+        self._extension = None
+        self._last_id = -1
+        self._indented = False
+        self._root = self._scan(file_path)
+
+    @property
+    def last_id(self):  # pylint: disable=missing-function-docstring
+        return self._last_id
+
+    def _scan(self, file_path):
+        root = None
+
+        for event, elem in etree.iterparse(file_path, events=('start', 'end')):
+            if not isinstance(elem.tag, str):  # comments and processing instructions
+                continue
+
+            q_name = etree.QName(elem)
+
+            if event == 'end':
+                if q_name.localname == 'id' and q_name.namespace == VLC_NS and elem.text:
+                    self._last_id = max(self._last_id, int(elem.text))
+                continue
+
+            if root is None:
+                root = elem
+            elif q_name.localname == 'trackList' and self._track_list is None:
+                self._track_list = elem
+            elif q_name.localname == 'extension':
+                self._extension = elem
+            elif (q_name.localname == 'node' and q_name.namespace == VLC_NS and elem.get('title') == 'music'
+                  and self._music_node is None):
+                self._music_node = elem
+
+        return root
+
+    def _sub_element(self, parent, local_name, namespace=None, **attrs):
+        namespace = namespace if namespace else etree.QName(self._root).namespace
+        tag = f"{{{namespace}}}{local_name}" if namespace else local_name
+
+        return etree.SubElement(parent, tag, attrs)
+
+    def _get_track_list(self):
+        if self._track_list is None:
+            self._track_list = self._sub_element(self._root, 'trackList')
+
+        return self._track_list
+
+    def _get_music_node(self):
+        # A missing music node is created the way PlaylistHandler.create_vlc_node creates it:
+        if self._music_node is None:
+            if self._extension is None:
+                self._extension = self._sub_element(self._root, 'extension', application=VLC_APPLICATION)
+
+            self._music_node = etree.SubElement(self._extension, 'vlc_node', title='music')
+
+        return self._music_node
+
+    def add_track(self, location):
+        """
+        Append a <track> to the track list and reference it from the music node.
+        :param location: The location of the track, a file:// URL
+        :return: The VLC id of the track
+        """
+        self._last_id += 1
+        track = self._sub_element(self._get_track_list(), 'track')
+        self._sub_element(track, 'location').text = location
+        extension = self._sub_element(track, 'extension', application=VLC_APPLICATION)
+        self._sub_element(extension, 'id', namespace=VLC_NS).text = str(self._last_id)
+        self._sub_element(self._get_music_node(), 'item', namespace=VLC_NS, tid=str(self._last_id))
+
+        return self._last_id
+
+    def indent(self, indent=INDENT):
+        """
+        Re-indent the whole playlist, replacing the whitespace of the start file, as xspf_writer.indent_xml() does
+        :param indent: The string used for one level of indentation
+        :return: void
+        """
+        etree.indent(self._root, space=indent)
+        self._indented = True
+
+    def __str__(self):
+        tail = '\n' if self._indented else ''
+
+        return XML_DECLARATION + etree.tostring(self._root.getroottree(), encoding='unicode') + tail
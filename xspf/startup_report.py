@@ -0,0 +1,101 @@
+"""
+This module reports the startup (import) cost of the playlist generator, from `python -X importtime` measurements
+taken in fresh interpreters. It shows the time to import the handler module, its most expensive imports and the
+cost of each heavy dependency that the handler only imports on the code path using it.
+
+Usage: python xspf/startup_report.py [--top N]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+PKG_DIR = os.path.dirname(os.path.realpath(__file__))
+
+# Dependencies imported on demand by handler.py, with the code path that needs them:
+DEFERRED_MODULES = {
+    "music_tag": "genre of files the fast tag reader does not handle",
+    "psycopg2": "reading directories and genres from the DB",
+    "bs4": "--soup playlists",
+    "lxml.etree": "-f start file, --pretty",
+    "ruamel.yaml": "genre list config, when not cached (--config_cache)",
+    "dbus_notifier.notifysender": "desktop notifications",
+}
+
+
+def measure_imports(statement):
+    """
+    Run a statement in a fresh interpreter with -X importtime
+    :param statement: The Python statement to run, e.g. "import handler"
+    :return: A list of (cumulative us, self us, nesting level, module name) tuples in import order, None if the
+    statement failed
+    """
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], capture_output=True, text=True,
+                          cwd=PKG_DIR, check=False)
+
+    if proc.returncode:
+        return None
+
+    rows = []
+
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((int(cumulative_us), int(self_us), level, name.strip()))
+
+    return rows
+
+
+def loaded_modules(statement, modules):
+    """
+    Find which of the modules are in sys.modules after running a statement in a fresh interpreter
+    :param statement: The Python statement to run
+    :param modules: An iterable of module names
+    :return: A list of the loaded module names
+    """
+    check = f"{statement}; import sys; print(' '.join(m for m in {list(modules)!r} if m in sys.modules))"
+    proc = subprocess.run([sys.executable, '-c', check], capture_output=True, text=True, cwd=PKG_DIR, check=False)
+
+    return proc.stdout.split()
+
+
+def main():  # pylint: disable=missing-function-docstring
+    parser = argparse.ArgumentParser(description="Report the import time of the xspf playlist generator.")
+    parser.add_argument("-t", "--top", help="The number of most expensive imports to list.",
+                        type=int,
+                        dest='top',
+                        default=10,
+                        required=False)
+    args = parser.parse_args()
+
+    rows = measure_imports("import handler")
+
+    if rows is None:
+        print("Importing handler failed")
+        sys.exit(1)
+
+    total_us = next(cumulative for cumulative, _, _, name in rows if name == 'handler')
+    print(f"import handler: {total_us / 1000:.1f} ms")
+    print("\nMost expensive imports (cumulative ms, module):")
+
+    for cumulative_us, _, level, name in sorted(rows, reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:10.1f}  {'  ' * level}{name}")
+
+    eager = loaded_modules("import handler", DEFERRED_MODULES)
+    print(f"\nDeferred dependencies loaded by 'import handler': {', '.join(eager) if eager else 'none'}")
+    print("\nDeferred dependencies (cumulative ms when imported, code path):")
+
+    for module, code_path in DEFERRED_MODULES.items():
+        module_rows = measure_imports(f"import {module}")
+        cost = "not installed" if module_rows is None else \
+            f"{next(c for c, _, _, name in module_rows if name == module) / 1000:.1f}"
+        print(f"{cost:>14}  {module} ({code_path})")
+
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,363 @@
+"""
+This module contains the watchers used by the watch mode to find the top-level media folders that changed
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import re
+import select
+import struct
+import time
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+# Files are reported once they are complete (IN_CLOSE_WRITE), not on every write:
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ONLYDIR
+
+EVENT_HEADER = struct.Struct('iIII')
+
+READ_SIZE = 64 * 1024
+
+# File systems on which inotify does not see the changes made by other hosts (/proc/mounts names):
+NETWORK_FS_TYPES = frozenset(('nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'ncpfs', 'afs', '9p', 'ceph', 'glusterfs',
+                              'fuse.sshfs', 'fuse.rclone', 'fuse.glusterfs', 'fuse.ceph', 'davfs', 'fuse.davfs2'))
+
+MOUNTS_FILE = '/proc/mounts'
+
+
+def _abs_paths(root):
+    return tuple(os.path.abspath(root_path) for root_path in ([root] if isinstance(root, str) else root))
+
+
+def _folder_of(roots, base, path):
+    """
+    Find the top-level folder of a watched tree a path is in
+    :param roots: The absolute paths to the roots of the trees
+    :param base: The absolute path the name of the folder is relative to
+    :param path: An absolute path
+    :return: The path to the folder relative to base, None if the path is not in a folder of a tree
+    """
+    for root_path in roots:
+        rel_path = os.path.relpath(path, root_path)
+
+        if rel_path == os.curdir or rel_path.startswith(os.pardir):
+            continue
+
+        return os.path.relpath(os.path.join(root_path, rel_path.split(os.sep, maxsplit=1)[0]), base)
+
+    return None
+
+
+def _unescape_mount_field(field):
+    # Spaces, tabs, newlines and backslashes are written as octal escapes, e.g. '\040' for a space
+    return re.sub(r'\\([0-7]{3})', lambda match: chr(int(match.group(1), 8)), field)
+
+
+def fs_type(path, mounts_file=MOUNTS_FILE):
+    """
+    Find the type of the file system a path is on, from the mount point that is its longest prefix
+    :param path: A path
+    :param mounts_file: The table of the mounted file systems, in the format of /proc/mounts
+    :return: The file system type, e.g. 'ext4' or 'nfs4', None if it cannot be found
+    """
+    real_path = os.path.realpath(path)
+    found_point, found_type = '', None
+
+    try:
+        with open(mounts_file, encoding='UTF-8') as f_in:
+            mounts = [line.split() for line in f_in]
+    except OSError:
+        return None
+
+    for fields in mounts:
+        if len(fields) < 3:
+            continue
+
+        mount_point = _unescape_mount_field(fields[1])
+
+        if (real_path == mount_point or real_path.startswith(mount_point.rstrip(os.sep) + os.sep)) and \
+                len(mount_point) >= len(found_point):
+            found_point, found_type = mount_point, fields[2]
+
+    return found_type
+
+
+def on_network_fs(path, mounts_file=MOUNTS_FILE):
+    """
+    Tell whether a path is on a network file system, see NETWORK_FS_TYPES
+    :param path: A path
+    :param mounts_file: The table of the mounted file systems, in the format of /proc/mounts
+    :return: True if it is
+    """
+    return fs_type(path, mounts_file) in NETWORK_FS_TYPES
+
+
+class InotifyWatcher:
+    """
+    This class watches a directory tree with Linux inotify, called through ctypes, and reports the names of the
+    top-level folders in which files or directories were created, written, moved or deleted. Every directory of the
+    tree is watched, and directories created or moved into the tree are added as they appear.
+    Changes made by other hosts to a network file system are not reported; use PollingWatcher for those.
+    Several trees can be watched at once, the folders being then named by their path relative to a base directory.
+    """
+
+    def __init__(self, root, base=None):
+        """
+        :param root: The path to the directory to watch, or a list of paths
+        :param base: The directory the names of the folders reported are relative to, defaults to the (first) root
+        """
+        self._roots = _abs_paths(root)
+        self._root = self._roots[0]
+        self._base = os.path.abspath(base) if base else self._root
+        self._wd_paths = {}
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+
+        self._fd = self._libc.inotify_init1(IN_CLOEXEC)
+
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+        try:
+            for root_path in self._roots:
+                self._add_tree(root_path)
+        except OSError:
+            self.close()
+            raise
+
+    @property
+    def root(self):  # pylint: disable=missing-function-docstring
+        return self._root
+
+    @property
+    def roots(self):  # pylint: disable=missing-function-docstring
+        return self._roots
+
+    @property
+    def watch_count(self):  # pylint: disable=missing-function-docstring
+        return len(self._wd_paths)
+
+    def _add_watch(self, dir_path):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dir_path), WATCH_MASK)
+
+        if wd < 0:
+            err = ctypes.get_errno()
+
+            # The directory disappeared or is not a directory (any longer):
+            if err in (errno.ENOENT, errno.ENOTDIR):
+                return
+
+            raise OSError(err, os.strerror(err), dir_path)
+
+        self._wd_paths[wd] = dir_path
+
+    def _add_tree(self, dir_path):
+        """
+        Watch a directory and all the directories below it. A directory watched already (e.g. moved within the tree)
+        keeps its watch descriptor, only its path is updated.
+        :param dir_path: Absolute path to the directory
+        :return: void
+        """
+        for curr_dir, _, _ in os.walk(dir_path):
+            self._add_watch(curr_dir)
+
+    def _folder_of(self, path):
+        return _folder_of(self._roots, self._base, path)
+
+    def read_changes(self, timeout=None):
+        """
+        Wait for filesystem events and read those available.
+        :param timeout: The longest wait in seconds, None to wait until there is an event
+        :return: A set of the names of the top-level folders changed, empty if nothing changed before the timeout, or
+        None if the kernel event queue overflowed and any folder may have changed
+        """
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+
+        if not ready:
+            return set()
+
+        data = os.read(self._fd, READ_SIZE)
+        changes = set()
+        pos = 0
+
+        while pos + EVENT_HEADER.size <= len(data):
+            wd, mask, _, name_len = EVENT_HEADER.unpack_from(data, pos)
+            name = os.fsdecode(data[pos + EVENT_HEADER.size:pos + EVENT_HEADER.size + name_len].rstrip(b'\x00'))
+            pos += EVENT_HEADER.size + name_len
+
+            if mask & IN_Q_OVERFLOW:
+                return None
+
+            if mask & IN_IGNORED:
+                self._wd_paths.pop(wd, None)
+                continue
+
+            if wd not in self._wd_paths:
+                continue
+
+            path = os.path.join(self._wd_paths[wd], name)
+
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                self._add_tree(path)
+
+            folder = self._folder_of(path)
+
+            if folder:
+                changes.add(folder)
+
+        return changes
+
+    def close(self):
+        """
+        Stop watching; the kernel removes the watches when the inotify descriptor is closed
+        :return: void
+        """
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+        self._wd_paths.clear()
+
+
+class PollingWatcher:
+    """
+    This class finds the top-level folders that changed by scanning the directory tree at regular intervals and
+    comparing a signature of each folder (the number of entries below it and their latest modification time). It is
+    meant for network file systems, on which inotify does not see the changes made by other hosts.
+    """
+
+    def __init__(self, root, interval, base=None):
+        """
+        :param root: The path to the directory to watch, or a list of paths
+        :param interval: Seconds between scans
+        :param base: The directory the names of the folders reported are relative to, defaults to the (first) root
+        """
+        self._roots = _abs_paths(root)
+        self._root = self._roots[0]
+        self._base = os.path.abspath(base) if base else self._root
+        self._interval = interval
+        self._signatures = self._scan()
+
+    @property
+    def root(self):  # pylint: disable=missing-function-docstring
+        return self._root
+
+    @property
+    def roots(self):  # pylint: disable=missing-function-docstring
+        return self._roots
+
+    @property
+    def interval(self):  # pylint: disable=missing-function-docstring
+        return self._interval
+
+    @staticmethod
+    def _tree_signature(dir_path):
+        """
+        Compute the signature of a directory tree
+        :param dir_path: Path to the directory
+        :return: A tuple (number of entries, latest st_mtime_ns), (0, 0) if the directory cannot be read
+        """
+        count = 0
+        latest = 0
+        pending = [dir_path]
+
+        while pending:
+            try:
+                with os.scandir(pending.pop()) as entries:
+                    for entry in entries:
+                        try:
+                            entry_stat = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+
+                        count += 1
+                        latest = max(latest, entry_stat.st_mtime_ns)
+
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+            except OSError:
+                continue
+
+        return count, latest
+
+    def _scan(self):
+        signatures = {}
+
+        for root_path in self._roots:
+            try:
+                with os.scandir(root_path) as entries:
+                    folders = [entry for entry in entries if entry.is_dir()]
+            except OSError:
+                continue
+
+            signatures.update({
+                os.path.relpath(entry.path, self._base): (entry.stat().st_mtime_ns,) + self._tree_signature(entry.path)
+                for entry in folders
+            })
+
+        return signatures
+
+    def read_changes(self, timeout=None):
+        """
+        Wait for the next scan and compare it with the previous one. The interval is the resolution of this watcher,
+        so a shorter timeout also waits for the next scan.
+        :param timeout: Not used, present for compatibility with InotifyWatcher.read_changes
+        :return: A set of the names of the top-level folders added, removed or changed since the previous scan
+        """
+        _ = timeout
+        time.sleep(self._interval)
+        signatures = self._scan()
+        changes = {name for name in signatures.keys() | self._signatures.keys()
+                   if signatures.get(name) != self._signatures.get(name)}
+        self._signatures = signatures
+
+        return changes
+
+    def close(self):  # pylint: disable=missing-function-docstring
+        self._signatures = {}
+
+
+def collect_changes(watcher, debounce, max_delay):
+    """
+    Wait for changes and collect them until the watcher has been quiet for the debounce period, so a burst of events
+    (e.g. an album being copied) is handled once.
+    :param watcher: An InotifyWatcher or PollingWatcher instance
+    :param debounce: The quiet period in seconds that ends a burst
+    :param max_delay: The longest time in seconds to keep collecting a burst that does not end
+    :return: A non-empty set of the names of the top-level folders changed, or None if any folder may have changed
+    """
+    changes = set()
+
+    while not changes:
+        changes = watcher.read_changes()
+
+        if changes is None:
+            return None
+
+    deadline = time.monotonic() + max_delay
+
+    while (remaining := deadline - time.monotonic()) > 0:
+        more_changes = watcher.read_changes(min(debounce, remaining))
+
+        if more_changes is None:
+            return None
+
+        if not more_changes:
+            break
+
+        changes |= more_changes
+
+    return changes
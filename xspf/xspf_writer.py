@@ -0,0 +1,211 @@
+"""
+This module contains a writer that streams an XSPF playlist to a file, one track at a time
+"""
+import tempfile
+from xml.sax.saxutils import escape
+
+XML_DECLARATION = '<?xml version="1.0" encoding="utf-8"?>\n'
+
+PLAYLIST_START = ('<playlist version="1" xmlns="http://xspf.org/ns/0/" '
+                  'xmlns:vlc="http://www.videolan.org/vlc/playlist/ns/0/">')
+
+# Namespace declarations first, the way libxml2 (xmllint, lxml) serialises the playlist element:
+PRETTY_PLAYLIST_START = ('<playlist xmlns="http://xspf.org/ns/0/" '
+                         'xmlns:vlc="http://www.videolan.org/vlc/playlist/ns/0/" version="1">')
+
+VLC_APPLICATION = "http://www.videolan.org/vlc/playlist/0"
+
+INDENT = "    "
+
+# Bytes of album nodes AlbumXspfWriter keeps in memory before spooling them to a temporary file:
+NODE_SPOOL_SIZE = 1 << 20
+
+
+def indent_xml(xml_text, indent=INDENT):
+    """
+    Indent an XML document the way `xmllint -format` does with XMLLINT_INDENT set to the same indent
+    :param xml_text: A string containing the XML document
+    :param indent: The string used for one level of indentation
+    :return: A string containing the indented document
+    """
+    from lxml import etree  # pylint: disable=import-outside-toplevel
+
+    root = etree.fromstring(xml_text.encode('UTF-8'), etree.XMLParser(remove_blank_text=True))
+    etree.indent(root, space=indent)
+
+    return XML_DECLARATION + etree.tostring(root.getroottree(), encoding='unicode') + '\n'
+
+
+class XspfWriter:
+    """
+    This class writes the same XSPF document as serialising the BeautifulSoup tree built by
+    PlaylistHandler.make_soup/build_track, but element by element as tracks are added, so the memory used does not
+    depend on the number of tracks. The <vlc:item> elements that follow the track list are generated from the range
+    of track ids, so nothing needs to be kept per track. Like PlaylistHandler.create_vlc_node, the node element is
+    written as <vlc_node>. In pretty mode, the document is indented exactly as indent_xml() would indent it.
+    """
+
+    def __init__(self, out, title='All', node_title='music', first_id=0, pretty=False):
+        """
+        Start the playlist document.
+        :param out: A text file object to write to
+        :param title: The title of the playlist
+        :param node_title: The title of the VLC node referencing the tracks
+        :param first_id: The VLC id of the first track
+        :param pretty: True to write one element per line, indented
+        """
+        self._out = out
+        self._node_title = node_title
+        self._first_id = first_id
+        self._last_id = first_id - 1
+        self._nl, self._ind = ("\n", INDENT) if pretty else ("", "")
+
+        playlist_start = PRETTY_PLAYLIST_START if pretty else PLAYLIST_START
+        self._out.write(f"{XML_DECLARATION}{playlist_start}{self._nl}{self._ind}<title>{escape(title)}</title>"
+                        f"{self._nl}")
+
+    @property
+    def last_id(self):  # pylint: disable=missing-function-docstring
+        return self._last_id
+
+    def add_track(self, location, title=None, creator=None, album=None, track_num=None, duration=None):
+        """
+        Write one <track> element.
+        :param location: The location of the track, a file:// URL
+        :param title: The title of the track, None to leave it out
+        :param creator: The artist of the track, None to leave it out
+        :param album: The title of the album of the track, None to leave it out
+        :param track_num: The number of the track on the album, None to leave it out
+        :param duration: The duration of the track in milliseconds, None to leave it out
+        :return: The VLC id of the track
+        """
+        nl, ind = self._nl, self._ind
+
+        if self._last_id < self._first_id:
+            self._out.write(f"{ind}<trackList>{nl}")
+
+        self._last_id += 1
+        self._out.write(
+            f'{ind * 2}<track>{nl}'
+            f'{ind * 3}<location>{escape(location)}</location>{nl}'
+            f'{self._track_meta(title, creator, album, track_num, duration)}'
+            f'{ind * 3}<extension application="{VLC_APPLICATION}">{nl}'
+            f'{ind * 4}<vlc:id>{self._last_id}</vlc:id>{nl}'
+            f'{ind * 3}</extension>{nl}'
+            f'{ind * 2}</track>{nl}'
+        )
+
+        return self._last_id
+
+    def _track_meta(self, title, creator, album, track_num, duration):
+        """
+        Build the metadata elements of a track, in the order of the XSPF schema
+        :return: A string, empty if there is no metadata
+        """
+        elements = (('title', title), ('creator', creator), ('album', album), ('trackNum', track_num),
+                    ('duration', duration))
+
+        return ''.join(f'{self._ind * 3}<{name}>{escape(str(value))}</{name}>{self._nl}'
+                       for name, value in elements if value is not None and value != '')
+
+    def close(self):
+        """
+        Finish the track list and write the VLC extension referencing every track.
+        :return: The VLC id of the last track, first_id - 1 if no track was written
+        """
+        nl, ind = self._nl, self._ind
+
+        if self._last_id < self._first_id:
+            self._out.write(f'{ind}<trackList/>{nl}'
+                            f'{ind}<extension application="{VLC_APPLICATION}">{nl}'
+                            f'{ind * 2}<vlc_node title="{self._node_title}"/>{nl}'
+                            f'{ind}</extension>{nl}'
+                            f'</playlist>{nl}')
+            return self._last_id
+
+        self._out.write(f'{ind}</trackList>{nl}'
+                        f'{ind}<extension application="{VLC_APPLICATION}">{nl}'
+                        f'{ind * 2}<vlc_node title="{self._node_title}">{nl}')
+
+        for track_id in range(self._first_id, self._last_id + 1):
+            self._out.write(f'{ind * 3}<vlc:item tid="{track_id}"/>{nl}')
+
+        self._out.write(f'{ind * 2}</vlc_node>{nl}'
+                        f'{ind}</extension>{nl}'
+                        f'</playlist>{nl}')
+
+        return self._last_id
+
+
+class AlbumXspfWriter(XspfWriter):
+    """
+    This class writes a playlist of individual tracks grouped by album: the <vlc:item> elements of the tracks of each
+    album are wrapped in a <vlc:node> titled after the album, directly in the VLC extension. The tracks of an album
+    must be added together, after start_album(). The album nodes are built as the albums end and spooled to a
+    temporary file once they outgrow NODE_SPOOL_SIZE, so the memory used does not depend on the number of tracks or
+    albums either.
+    """
+
+    def __init__(self, out, title='All', first_id=0, pretty=False):
+        """
+        Start the playlist document.
+        :param out: A text file object to write to
+        :param title: The title of the playlist
+        :param first_id: The VLC id of the first track
+        :param pretty: True to write one element per line, indented
+        """
+        super().__init__(out, title=title, first_id=first_id, pretty=pretty)
+        self._nodes = tempfile.SpooledTemporaryFile(max_size=NODE_SPOOL_SIZE, mode='w+', encoding='UTF-8')
+        self._album = None
+        self._album_first_id = first_id
+
+    def start_album(self, title):
+        """
+        Start a new album, the tracks added next are referenced by its node
+        :param title: The title of the album node
+        :return: void
+        """
+        self._end_album()
+        self._album = title
+        self._album_first_id = self._last_id + 1
+
+    def _end_album(self):
+        nl, ind = self._nl, self._ind
+
+        if self._album is None or self._last_id < self._album_first_id:
+            return
+
+        self._nodes.write(f'{ind * 2}<vlc:node title="{escape(self._album, {'"': '&quot;'})}">{nl}')
+
+        for track_id in range(self._album_first_id, self._last_id + 1):
+            self._nodes.write(f'{ind * 3}<vlc:item tid="{track_id}"/>{nl}')
+
+        self._nodes.write(f'{ind * 2}</vlc:node>{nl}')
+        self._album = None
+
+    def close(self):
+        """
+        Finish the track list and write the VLC extension with the album nodes.
+        :return: The VLC id of the last track, first_id - 1 if no track was written
+        """
+        nl, ind = self._nl, self._ind
+        self._end_album()
+
+        if self._last_id < self._first_id:
+            self._out.write(f'{ind}<trackList/>{nl}'
+                            f'{ind}<extension application="{VLC_APPLICATION}"/>{nl}'
+                            f'</playlist>{nl}')
+        else:
+            self._out.write(f'{ind}</trackList>{nl}'
+                            f'{ind}<extension application="{VLC_APPLICATION}">{nl}')
+            self._nodes.seek(0)
+
+            while chunk := self._nodes.read(NODE_SPOOL_SIZE):
+                self._out.write(chunk)
+
+            self._out.write(f'{ind}</extension>{nl}'
+                            f'</playlist>{nl}')
+
+        self._nodes.close()
+
+        return self._last_id